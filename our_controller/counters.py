@@ -0,0 +1,33 @@
+# Copyright (c) 2013 Felician Nemeth
+#
+# This file is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This file is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with POX.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Helpers for the counters of OpenFlow statistics.
+"""
+
+COUNTER_MOD              = 2 ** 64
+
+def counter_delta (current, previous):
+  """
+  Increment of a 64-bit counter.
+
+  A wrap around is taken into account.  A huge increment rather means
+  that the counter has been reset (e.g., the flow entries have been
+  reinstalled), then the current value is the increment.  Not for
+  sums over flow entries, which shrink when entries are deleted.
+  """
+  delta = (current - previous) % COUNTER_MOD
+  if delta >= COUNTER_MOD / 2:
+    return current
+  return delta
@@ -0,0 +1,209 @@
+# Copyright (c) 2013 Felician Nemeth
+#
+# This file is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This file is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with POX.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Watches a file and calls back when its content has changed.
+
+On Linux, the directory of the file is watched with inotify, elsewhere
+the file is polled.  Bursts of writes are debounced: the callback is
+called when the file has been quiet for 'debounce' seconds.  A
+'validate' function can reject half-written content, e.g.:
+
+  FileWatcher('topo.json', load, validate=valid_json).start()
+"""
+
+import os
+import json
+import struct
+import ctypes
+import ctypes.util
+
+from pox.core import core
+from pox.lib.recoco import Task, Select
+import pox.lib.util
+
+log = core.getLogger()
+
+IN_MODIFY      = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_NONBLOCK    = 0x00000800
+IN_CLOEXEC     = 0x00080000
+IN_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+def _load_libc ():
+  try:
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    libc.inotify_init1
+    libc.inotify_add_watch
+    libc.inotify_rm_watch
+    return libc
+  except (OSError, AttributeError):
+    return None
+
+_libc = _load_libc()
+
+def valid_json (filename):
+  "True iff filename contains valid json"
+  try:
+    with open(filename) as f:
+      json.load(f)
+    return True
+  except (IOError, ValueError) as e:
+    log.warn('%s: %s' % (filename, e))
+    return False
+
+class FileWatcher (Task):
+  def __init__ (self, filename, callback, validate = None,
+                debounce = 0.05, poll_interval = 1):
+    """
+    callback is called with the filename on the cooperative thread.
+    If validate(filename) returns False, the change is ignored.
+    """
+    Task.__init__(self)
+    self.callback = callback
+    self.validate = validate
+    self.debounce = debounce
+    self.poll_interval = poll_interval
+    self._fd = None
+    self._wd = None
+    self._stat = None
+    self._pending = False
+    self._running = True
+    self._started = False
+    self._pinger = pox.lib.util.makePinger() # wakes the task to stop
+    self._init_inotify()
+    self.set_filename(filename)
+
+  def _init_inotify (self):
+    if _libc is None:
+      log.debug('inotify is not available, polling')
+      return
+    fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+      log.warn('inotify_init1: %s' % os.strerror(ctypes.get_errno()))
+      return
+    self._fd = fd
+
+  def set_filename (self, filename):
+    "Start watching filename instead of the previous file"
+    self.filename = filename
+    self._stat = self._get_stat()
+    self._pending = False
+    if self._fd is None:
+      return
+    dirname = os.path.dirname(os.path.abspath(filename))
+    wd = _libc.inotify_add_watch(self._fd, dirname, IN_MASK)
+    if wd < 0:
+      log.warn('inotify_add_watch(%s): %s' %
+               (dirname, os.strerror(ctypes.get_errno())))
+      os.close(self._fd)
+      self._fd = None
+      return
+    # The same directory keeps its watch descriptor
+    if self._wd is not None and self._wd != wd:
+      _libc.inotify_rm_watch(self._fd, self._wd)
+    self._wd = wd
+
+  def start (self, *args, **kw):
+    self._started = True
+    Task.start(self, *args, **kw)
+
+  def stop (self):
+    """
+    Stop watching.  The task is woken up and closes the inotify fd, so
+    the fd is not closed while the scheduler selects on it.
+    """
+    self._running = False
+    if self._started:
+      self._pinger.ping()
+    else:
+      self._close()
+
+  def _close (self):
+    if self._fd is not None:
+      os.close(self._fd)
+      self._fd = None
+      self._wd = None
+
+  def _get_stat (self):
+    try:
+      st = os.stat(self.filename)
+      return (st.st_mtime, st.st_size, st.st_ino)
+    except OSError:
+      return None
+
+  def _read_events (self):
+    "True iff an event concerns our file"
+    try:
+      buf = os.read(self._fd, 64 * 1024)
+    except OSError:
+      return False
+    name = os.path.basename(self.filename)
+    changed = False
+    offset = 0
+    while offset + _EVENT_HEADER.size <= len(buf):
+      wd, mask, cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+      offset += _EVENT_HEADER.size
+      ev_name = buf[offset:offset + length].rstrip('\0')
+      offset += length
+      if wd == self._wd and ev_name == name:
+        changed = True
+    return changed
+
+  def _poll (self):
+    stat = self._get_stat()
+    if stat == self._stat:
+      return False
+    self._stat = stat
+    return True
+
+  def _fire (self):
+    self._pending = False
+    if not os.path.exists(self.filename):
+      return
+    if self.validate and not self.validate(self.filename):
+      log.warn('ignoring invalid content of %s' % self.filename)
+      return
+    self.callback(self.filename)
+
+  def run (self):
+    try:
+      while self._running:
+        if self._pending:
+          timeout = self.debounce
+        elif self._fd is None:
+          timeout = self.poll_interval
+        else:
+          timeout = None
+        rlist = [self._pinger]
+        if self._fd is not None:
+          rlist.append(self._fd)
+        rl, wl, xl = yield Select(rlist, [], [], timeout)
+        if not self._running:
+          break
+        if self._fd is not None and self._fd in rl:
+          if self._read_events():
+            self._pending = True
+        elif self._fd is None and self._poll():
+          self._pending = True
+        elif self._pending:
+          self._fire()
+    finally:
+      self._close()
@@ -18,26 +18,49 @@ turned into a special port statistics module that estimates the TCP
 traffic towards hosts on switch-host links.
 
 It assumes that flow entries corresponding to port #n has priority of
-OFP_DEFAULT_PRIORITY + n
+OFP_DEFAULT_PRIORITY + 1 + n
+
+The switches are polled by stats_poller, which timestamps a sample at
+the midpoint of its request and reply.  A full flow-stats dump tells
+whether the entries of port #n are exactly the entries that output to
+port #n.  If this holds for every port, the switch is polled with one
+aggregate-stats request per port (filtered by out_port) instead, and
+a full dump is only repeated every 'full_every' polls.  The poll
+period of a switch doubles (up to 'max_poll_period') while it carries
+no traffic.
 """
 
 from collections import defaultdict
 from pox.core import core
 from pox.lib.revent import *
-from pox.lib.recoco import Timer
 import pox.openflow.libopenflow_01 as of
-import time
+import stats_poller
+from stats_poller import AGGREGATE, FLOW_STATS
 
 DEFAULT_POLL_PERIOD      = 1 # seconds
+DEFAULT_MAX_POLL_PERIOD  = 8 # seconds
+DEFAULT_FULL_EVERY       = 10 # polls
+MAX_PORT_PRIORITY        = 50
 
 log = core.getLogger()
 
 class FlowStatEvent (Event):
-  def __init__ (self, dpid, port, bw):
+  def __init__ (self, dpid, port, bw, when):
     Event.__init__(self)
     self.dpid = dpid
     self.port = port
     self.bw = bw
+    self.when = when            # time of the sample
+
+class SwitchStats (object):
+  "Polling state of a switch"
+  def __init__ (self, dpid, poll_period):
+    self.dpid = dpid
+    self.period = poll_period
+    self.agg_ports = None       # ports polled by aggregate requests
+    self.polls = 0              # polls since the last full dump
+    self.counters = {}          # port -> (bytes, time of sample)
+    self.active = False         # traffic seen since the previous poll
 
 class FlowStat (EventMixin):
   """
@@ -47,70 +70,122 @@ class FlowStat (EventMixin):
     FlowStatEvent,
   ])
 
-  def __init__ (self, poll_period = DEFAULT_POLL_PERIOD):
+  def __init__ (self, poll_period = DEFAULT_POLL_PERIOD,
+                max_poll_period = DEFAULT_MAX_POLL_PERIOD,
+                full_every = DEFAULT_FULL_EVERY):
     core.listen_to_dependencies(self, ['openflow'])
     self.poll_period = poll_period
+    self.max_poll_period = max(max_poll_period, poll_period)
+    self.full_every = full_every
     self.switches = {}
     core.openflow.addListeners(self)
+    self._sub = core.StatsPoller.subscribe(poll_period, self._requests,
+                                           self._handle_stats)
     log.info("poll_period: %s", self.poll_period)
 
   def __str__ (self):
     return "poll_period:%s" % (self.poll_period, )
 
-  def _handle_timer (self, dpid):
+  def rtt (self, dpid):
+    "Smoothed round-trip time of stats requests to dpid (or None)"
+    return core.StatsPoller.rtt(dpid)
+
+  def _adapt_period (self, sw):
+    if sw.active:
+      sw.period = self.poll_period
+    else:
+      sw.period = min(sw.period * 2, self.max_poll_period)
+    sw.active = False
+    self._sub.set_period(sw.dpid, sw.period)
+
+  def _requests (self, dpid):
     sw = self.switches.get(dpid)
     if sw is None:
+      sw = self.switches[dpid] = SwitchStats(dpid, self.poll_period)
+    if sw.polls:
+      self._adapt_period(sw)
+    sw.polls += 1
+
+    if sw.agg_ports is None or sw.polls > self.full_every:
+      sw.polls = 1
+      # stats can't be requested based on priority, hence the full dump
+      return [FLOW_STATS]
+    return [(AGGREGATE, port) for port in sw.agg_ports]
+
+  def _update_counter (self, sw, port, byte_count, sample_time):
+    prev = sw.counters.get(port)
+    sw.counters[port] = (byte_count, sample_time)
+    if prev is None:
       return
-
-    # send stat request
-    body = of.ofp_flow_stats_request()
-    ## DAMN! stats can't be requested based on priority.
-    #body.priority = of.OFP_DEFAULT_PRIORITY + 1
-    msg = of.ofp_stats_request(body=body)
-    core.openflow.sendToDPID(dpid, msg.pack())
-
-    core.callDelayed(self.poll_period, self._handle_timer, dpid)
-
-  def _handle_FlowStatsReceived (self, event): 
-    dpid = event.connection.dpid
+    prev_bytes, prev_time = prev
+    delta_t = sample_time - prev_time
+    if delta_t <= 0:
+      return
+    # The bytes of a port are summed over its flow entries, so they
+    # decrease when some of the entries are deleted or reinstalled.
+    # That is not traffic.
+    delta_bytes = max(byte_count - prev_bytes, 0)
+    if delta_bytes:
+      sw.active = True
+    bw = delta_bytes / delta_t
+    self.raiseEvent(FlowStatEvent, sw.dpid, port, bw, sample_time)
+    log.debug('%s %s:%s %s' % (sample_time, sw.dpid, port, bw))
+
+  @staticmethod
+  def _port_of_priority (priority):
+    if (priority > of.OFP_DEFAULT_PRIORITY and
+        priority < of.OFP_DEFAULT_PRIORITY + MAX_PORT_PRIORITY):
+      return priority - of.OFP_DEFAULT_PRIORITY - 1
+    return None
+
+  def _aggregatable_ports (self, stats):
+    """
+    Ports whose bytes can be queried by an aggregate request, or None
+    if there is a port that cannot.
+    """
+    ports = set()
+    mismatch = set()
+    for entry in stats:
+      port = self._port_of_priority(entry.priority)
+      outputs = set(a.port for a in entry.actions
+                    if isinstance(a, of.ofp_action_output))
+      if port is not None:
+        ports.add(port)
+        if outputs != set([port]):
+          mismatch.add(port)
+      mismatch.update(p for p in outputs if p != port)
+    if ports & mismatch:
+      return None
+    return sorted(ports)
+
+  def _handle_stats (self, dpid, key, stats, sample_time):
     sw = self.switches.get(dpid)
     if sw is None:
-      return # we can be more clever here
-    now = time.time()
+      return
+    if key[0] == AGGREGATE:
+      self._update_counter(sw, key[1], stats.byte_count, sample_time)
+      return
     bytes = defaultdict(int)
-    for stats in event.stats:
-      if (stats.priority > of.OFP_DEFAULT_PRIORITY and
-          stats.priority < of.OFP_DEFAULT_PRIORITY + 50):
-        port = stats.priority - of.OFP_DEFAULT_PRIORITY - 1
-        bytes[port] += stats.byte_count
-    for port in bytes.keys():
-      if len(sw) == 2:
-        if port in sw['bytes']:
-          delta_t = now - sw['time']
-          delta_bytes = bytes[port] - sw['bytes'][port]
-          if delta_bytes < 0:
-            #counter overflow, 
-            delta_bytes = 0 # FIXME: += MAX
-          bw = delta_bytes / delta_t
-          self.raiseEvent(FlowStatEvent, dpid, port, bw)
-          log.debug('%s %s:%s %s' % (now, dpid, port, bw))
-      else:
-        sw['bytes'] = defaultdict(int)
-      sw['bytes'][port] = bytes[port]
-    sw['time'] = now
-
-  def _handle_ConnectionUp (self, event):
-    sw = self.switches.get(event.dpid)
-    if sw is None:
-      # New switch
-      self.switches[event.dpid] = {}
-      core.callDelayed(1, self._handle_timer, event.dpid)
+    for entry in stats:
+      port = self._port_of_priority(entry.priority)
+      if port is not None:
+        bytes[port] += entry.byte_count
+    for port, byte_count in bytes.iteritems():
+      self._update_counter(sw, port, byte_count, sample_time)
+    # if the entries of the ports are the entries that output to the
+    # ports, aggregates and full dumps give the same byte counts
+    sw.agg_ports = self._aggregatable_ports(stats)
 
   def _handle_ConnectionDown (self, event):
     try:
       self.switches.pop(event.dpid)
     except KeyError:
       pass
-
-def launch ():
-  core.registerNew(FlowStat)
+    self._sub.set_period(event.dpid, self.poll_period)
+
+def launch (poll_period = DEFAULT_POLL_PERIOD,
+            max_poll_period = DEFAULT_MAX_POLL_PERIOD,
+            full_every = DEFAULT_FULL_EVERY):
+  stats_poller.launch()
+  core.registerNew(FlowStat, float(poll_period), float(max_poll_period),
+                   int(full_every))
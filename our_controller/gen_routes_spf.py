@@ -3,7 +3,6 @@
 # All rights reserved.
 # Licensed under the PSF license.
 
-import random
 from pox.core import core
 from pox.lib.addresses import IPAddr
 
@@ -12,9 +11,10 @@ log = core.getLogger()
 class GenRoutesSpf (object):
   """Calculate routes among hosts.
 
-     It is not efficient at all.  The goal here is to privide an
-     initial configuration to the user.  Nevertheless, connectivity is
-     a must.
+     The goal here is to privide an initial configuration to the user.
+     Nevertheless, connectivity is a must.  Routes are the shortest
+     valid paths; among paths of equal length the one that comes
+     first in the order of the nodes' ports is chosen.
   """
 
   def __init__ (self):
@@ -22,19 +22,41 @@ class GenRoutesSpf (object):
 
   def generate_routes (self, topo):
     self.t = topo
+    self._adj = self._adjacency()
     for src in self.t.nodes:
       if not src.ip:
         continue
+      trees = self._first_hop_trees(src)
       for dst in self.t.nodes:
         if src == dst or not dst.ip:
           continue
-        route = self.find_shortest_path(src, dst)
-        if not route:
-          log.warn('no route between %s-%s' % (src.name, dst.name))
-          continue
-        route = [n.name for n in route]
-        log.debug('new route: %s' % ('-'.join(route)))
-        topo.add_route(route)
+        self._add_route(src, dst, trees)
+
+  def generate_routes_for (self, topo, node):
+    """Calculate routes from and to node only.
+
+    Routes among the other nodes are left intact, even if node opens
+    a shorter path between them.
+    """
+    self.t = topo
+    self._adj = self._adjacency()
+    if not node.ip:
+      return
+    trees = self._first_hop_trees(node)
+    for other in self.t.nodes:
+      if other == node or not other.ip:
+        continue
+      self._add_route(node, other, trees)
+      self._add_route(other, node, self._first_hop_trees(other))
+
+  def _add_route (self, src, dst, trees):
+    route = self.find_shortest_path(src, dst, trees)
+    if not route:
+      log.warn('no route between %s-%s' % (src.name, dst.name))
+      return
+    route = [n.name for n in route]
+    log.debug('new route: %s' % ('-'.join(route)))
+    self.t.add_route(route)
 
   def is_path_valid (self, path, prefix_len=24):
     "True iff source and destination ip addresses are in the same network."
@@ -49,27 +71,82 @@ class GenRoutesSpf (object):
     except (AttributeError, RuntimeError):
       return False
 
-  # Adapted from: http://www.python.org/doc/essays/graphs.html
-  # Copyright (c) 1998, 2000, 2003 Python Software Foundation.
-  # All rights reserved.
-  # Licensed under the PSF license.
-  #
-  # start, end: dpid
-  def find_shortest_path(self, start, end, path=[]):
-    path = path + [start]
-    if start == end:
-      if self.is_path_valid(path):
-        return path
-      else:
+  def _adjacency (self):
+    "node -> list of neighbor nodes in port order"
+    adj = {}
+    for node in self.t.nodes:
+      neighbors = [self.t.dpid(dpid) for dpid in node.neighbors]
+      adj[node] = [n for n in neighbors if n is not None]
+    return adj
+
+  def _bfs (self, root, excluded):
+    """Breadth-first search from root avoiding the excluded nodes.
+
+    Returns {node: (parent, distance, order)}, where order is the
+    position of the node in the BFS queue.  Following the parents
+    gives the shortest path that comes first in port order.
+    """
+    tree = {root: (None, 0, 0)}
+    queue = [root]
+    for node in queue:
+      dist = tree[node][1] + 1
+      for neighbor in self._adj.get(node, []):
+        if neighbor in tree or neighbor in excluded:
+          continue
+        tree[neighbor] = (node, dist, len(queue))
+        queue.append(neighbor)
+    return tree
+
+  def _first_hop_trees (self, src):
+    return [(hop, self._bfs(hop, [src]))
+            for hop in self._adj.get(src, [])]
+
+  def _tree_path (self, tree, node):
+    path = []
+    while node is not None:
+      path.append(node)
+      node = tree[node][0]
+    path.reverse()
+    return path
+
+  def _best_last_hop (self, start, end, hop, tree):
+    """Return (distance, order, path) of the best valid path
+    start-hop-...-end, or None."""
+    best = None
+    for last in self._adj.get(end, []):
+      if last not in tree:
+        continue
+      dist, order = tree[last][1:]
+      if best and (dist, order) >= best[:2]:
+        continue
+      if not self.is_path_valid([start, hop, last, end]):
+        continue
+      path = self._tree_path(tree, last)
+      if end in path:
         return None
+      best = (dist, order, path)
+    return best
+
+  # start, end: Node
+  def find_shortest_path (self, start, end, trees=None):
+    if trees is None:
+      trees = self._first_hop_trees(start)
     shortest = None
-    for dpid in start.neighbors:
-      node = self.t.dpid(dpid)
-      if node not in path:
-        newpath = self.find_shortest_path(node, end, path)
-        if newpath:
-          if not shortest or len(newpath) < len(shortest):
-            shortest = newpath
+    for hop, tree in trees:
+      if hop == end:
+        if self.is_path_valid([start, end]):
+          return [start, end]
+        continue
+      best = self._best_last_hop(start, end, hop, tree)
+      if best is None:
+        # the tree leads through end, search again without it
+        best = self._best_last_hop(start, end, hop,
+                                   self._bfs(hop, [start, end]))
+      if best is None:
+        continue
+      path = [start] + best[2] + [end]
+      if not shortest or len(path) < len(shortest):
+        shortest = path
     return shortest
 
 def launch ():
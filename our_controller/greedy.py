@@ -90,9 +90,9 @@ class GreedyRouting (object):
     distances = [ [n, self.distance(d, n)] for n in neighbors ]
 
     distances = filter(lambda x: x[1] < current_distance, distances)
-    distances = filter(lambda x:
-                         node.port_num(core.Outband.t.dpid(x[0])) != inport,
-                       distances)
+    ports = node.ports_toward([x[0] for x in distances])
+    distances = [x for x, p in zip(distances, ports)
+                 if p is None or p.num != inport]
 
     if distances == []:
       out_dpid = None
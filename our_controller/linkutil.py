@@ -26,32 +26,126 @@ D-A == poll_period
 C-A != F-D (round-trip time may vary)
 
 We can calculate the data trasmitted between B and E, but we cannot
-measure E-B, only estimate it by D-A or F-C.  This bias may or may not
-be significant if poll_period is small.
-
-Additionally, we assume that C < D, i.e., if a stat request packet is
-eligible for sending and the previous stat reply hasn't arrived, then
-we assume it was lost.  Therefore, poll_period can't smaller than RTT.
-
+measure E-B.  The switches are polled by stats_poller, which matches
+requests and replies by XID, so we estimate B by (A+C)/2 and E by
+(D+F)/2 instead of using C and F, which would add the jitter of the
+round-trip time to the interval.  Requests unanswered for a long time
+are considered lost.
+
+The rate of a port is the larger of its rx and tx rates.  It is
+smoothed by an EWMA and its maximum over the last 'window' seconds is
+kept as well.  The utilization of a link is the smoothed rate relative
+to the peak rate of the link, which decays with a half-life of
+'peak_half_life' seconds.  Recent samples are available through
+series().
 """
 
+from collections import deque
 from pox.core import core
 from pox.lib.revent import *
-from pox.lib.recoco import Timer
-import pox.openflow.libopenflow_01 as of
+from counters import counter_delta
+import stats_poller
+from stats_poller import PORT_STATS
+import math
 import time
 
 DEFAULT_POLL_PERIOD      = 3 # seconds
+DEFAULT_EWMA_TAU         = 5 # seconds
+DEFAULT_WINDOW           = 30 # seconds
+DEFAULT_PEAK_HALF_LIFE   = 300 # seconds
+DEFAULT_HISTORY          = 600 # samples per port
+MIN_PEAK                 = 1 # bps
 
 log = core.getLogger()
 
 class LinkUtilEvent (Event):
-  def __init__ (self, dpid_1, dpid_2, utilization, bw):
+  """
+  bw is the smoothed rate, utilization is bw relative to the peak of
+  the link, rate is the last measured rate, max_bw is the maximal rate
+  in the window.
+  """
+  def __init__ (self, dpid_1, dpid_2, utilization, bw, rate = None,
+                max_bw = None):
     Event.__init__(self)
     self.dpid_1 = dpid_1
     self.dpid_2 = dpid_2
     self.utilization = utilization
     self.bw = bw
+    self.rate = rate
+    self.max_bw = max_bw
+
+class Sample (object):
+  __slots__ = ('time', 'rate', 'ewma', 'max')
+
+  def __init__ (self, time, rate, ewma, max):
+    self.time = time
+    self.rate = rate
+    self.ewma = ewma
+    self.max = max
+
+  def __repr__ (self):
+    return 'Sample(%.3f, %.1f, %.1f, %.1f)' % (self.time, self.rate,
+                                               self.ewma, self.max)
+
+class PortRate (object):
+  "Rate estimator of a switch port"
+  def __init__ (self, tau, window, history):
+    self.tau = tau
+    self.window = window
+    self.counters = None        # (time, rx_bytes, tx_bytes)
+    self.ewma = None
+    self.recent = deque()       # (time, rate) pairs of the window
+    self.samples = deque(maxlen=history)
+
+  def update (self, now, rx_bytes, tx_bytes):
+    "Return the new Sample, or None if there is no previous counter"
+    prev = self.counters
+    self.counters = (now, rx_bytes, tx_bytes)
+    if prev is None:
+      return None
+    dt = now - prev[0]
+    if dt <= 0:
+      return None
+    rx = counter_delta(rx_bytes, prev[1]) / dt
+    tx = counter_delta(tx_bytes, prev[2]) / dt
+    rate = max(rx, tx)
+
+    if self.ewma is None:
+      self.ewma = rate
+    else:
+      alpha = 1 - math.exp(-dt / self.tau)
+      self.ewma += alpha * (rate - self.ewma)
+
+    recent = self.recent
+    # keep the window's maximum at the front
+    while recent and recent[-1][1] <= rate:
+      recent.pop()
+    recent.append((now, rate))
+    while recent[0][0] < now - self.window:
+      recent.popleft()
+
+    sample = Sample(now, rate, self.ewma, recent[0][1])
+    self.samples.append(sample)
+    return sample
+
+class DecayingPeak (object):
+  "Maximum that decays exponentially with a given half-life"
+  def __init__ (self, half_life):
+    self.rate = math.log(2) / half_life
+    self.value = MIN_PEAK
+    self.time = None
+
+  def value_at (self, now):
+    "The decayed peak at 'now', without updating it"
+    if self.time is None:
+      return self.value
+    decayed = self.value * math.exp(-self.rate * (now - self.time))
+    return max(decayed, MIN_PEAK)
+
+  def update (self, now, value):
+    self.value = max(self.value_at(now), value)
+    self.time = now
+    return self.value
 
 class LinkUtil (EventMixin):
   """
@@ -61,29 +155,56 @@ class LinkUtil (EventMixin):
     LinkUtilEvent,
   ])
 
-  def __init__ (self, poll_period = DEFAULT_POLL_PERIOD):
+  def __init__ (self, poll_period = DEFAULT_POLL_PERIOD,
+                ewma_tau = DEFAULT_EWMA_TAU, window = DEFAULT_WINDOW,
+                peak_half_life = DEFAULT_PEAK_HALF_LIFE,
+                history = DEFAULT_HISTORY):
     core.listen_to_dependencies(self, ['topology', 'openflow'])
     self.poll_period = poll_period
-    self.switches = {}
-    self.peak = 1 # bps
+    self.ewma_tau = ewma_tau
+    self.window = window
+    self.peak_half_life = peak_half_life
+    self.history = history
+    self.switches = {}          # dpid -> {port_no: PortRate}
+    self.peaks = {}             # (dpid, dpid) -> DecayingPeak
     core.openflow.addListeners(self)
+    self._sub = core.StatsPoller.subscribe(poll_period,
+                                           lambda dpid: [PORT_STATS],
+                                           self._handle_stats)
     log.info("poll_period: %s", self.poll_period)
 
   def __str__ (self):
-    return "poll_period:%s, peak:%s" % (self.poll_period, self.peak)
+    return "poll_period:%s, peaks:%s" % (self.poll_period, len(self.peaks))
 
-  def _handle_timer (self, dpid):
-    sw = self.switches.get(dpid)
-    if sw is None:
-      return
-
-    # send stat request
-    body = of.ofp_port_stats_request()
-    body.port_no = of.OFPP_NONE  # request all port statics
-    msg = of.ofp_stats_request(body=body)
-    core.openflow.sendToDPID(dpid, msg.pack())
-
-    core.callDelayed(self.poll_period, self._handle_timer, dpid)
+  def series (self, dpid, port_no, since = None):
+    "Samples of a port (newer than 'since'), oldest first"
+    try:
+      samples = self.switches[dpid][port_no].samples
+    except KeyError:
+      return []
+    if since is None:
+      return list(samples)
+    return [s for s in samples if s.time > since]
+
+  def rate (self, dpid, port_no):
+    "The last Sample of a port, or None"
+    samples = self.series(dpid, port_no)
+    return samples[-1] if samples else None
+
+  def peak (self, dpid_1, dpid_2):
+    "Current peak rate of a link"
+    peak = self.peaks.get(self._link_key(dpid_1, dpid_2))
+    if peak is None:
+      return MIN_PEAK
+    return peak.value_at(time.time())
+
+  def rtt (self, dpid):
+    "Smoothed round-trip time of stats requests to dpid (or None)"
+    return core.StatsPoller.rtt(dpid)
+
+  @staticmethod
+  def _link_key (dpid_1, dpid_2):
+    return (min(dpid_1, dpid_2), max(dpid_1, dpid_2))
 
   def _get_neighbor (self, dpid, port):
     try:
@@ -96,36 +217,25 @@ class LinkUtil (EventMixin):
       pass
     return None
 
-  def _calculate_peak (self, bw):
-    self.peak = max(self.peak, bw)
-    return self.peak
-
-  def _handle_PortStatsReceived (self, event): 
-    dpid = event.connection.dpid
-    sw = self.switches.get(dpid)
-    if sw is None:
-      return # we can be more clever here
-    now = time.time()
-    for stats in event.stats:
-      current = [now, stats.rx_bytes, stats.tx_bytes]
-      if sw.has_key(stats.port_no): # TODO: check XID
-        prev = sw[stats.port_no]
-        delta = map(lambda x:x[0]-x[1], zip(current, prev))
-        bw = max([delta[1]/delta[0], delta[2]/delta[0]])
-        peak = self._calculate_peak(bw)
-        util = bw / peak
-        neighbor = self._get_neighbor(dpid, stats.port_no)
-        if neighbor:
-          self.raiseEvent(LinkUtilEvent, dpid, neighbor.dpid, util, bw)
-          #log.debug('%s %i %s->%s %s (%.2f%%)' % (now, stats.port_no, event.connection.dpid, neighbor.dpid, bw, util))
-      sw[stats.port_no] = current
-
-  def _handle_ConnectionUp (self, event):
-    sw = self.switches.get(event.dpid)
-    if sw is None:
-      # New switch
-      self.switches[event.dpid] = {}
-      core.callDelayed(1, self._handle_timer, event.dpid)
+  def _handle_stats (self, dpid, key, stats, now):
+    ports = self.switches.setdefault(dpid, {})
+    for entry in stats:
+      port = ports.get(entry.port_no)
+      if port is None:
+        port = PortRate(self.ewma_tau, self.window, self.history)
+        ports[entry.port_no] = port
+      sample = port.update(now, entry.rx_bytes, entry.tx_bytes)
+      if sample is None:
+        continue
+      neighbor = self._get_neighbor(dpid, entry.port_no)
+      if neighbor:
+        key = self._link_key(dpid, neighbor.dpid)
+        peak = self.peaks.get(key)
+        if peak is None:
+          peak = self.peaks[key] = DecayingPeak(self.peak_half_life)
+        util = sample.ewma / peak.update(now, sample.max)
+        self.raiseEvent(LinkUtilEvent, dpid, neighbor.dpid, util,
+                        sample.ewma, sample.rate, sample.max)
 
   def _handle_ConnectionDown (self, event):
     try:
@@ -133,5 +243,8 @@ class LinkUtil (EventMixin):
     except KeyError:
       pass
 
-def launch ():
-  core.registerNew(LinkUtil)
+def launch (poll_period = DEFAULT_POLL_PERIOD, ewma_tau = DEFAULT_EWMA_TAU,
+            window = DEFAULT_WINDOW):
+  stats_poller.launch()
+  core.registerNew(LinkUtil, float(poll_period), float(ewma_tau),
+                   float(window))
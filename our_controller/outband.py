@@ -28,10 +28,13 @@ import os
 import subprocess
 import re
 import multiprocessing
-import multiprocessing.dummy
+import threading
+import Queue
+import tempfile
+import shutil
+import hashlib
 import xmlrpclib
 import json
-import inspect
 import socket
 from ssl import SSLError
 
@@ -39,6 +42,8 @@ import pox.core
 from pox.core import core
 from pox.lib.addresses import *
 from pox.lib.revent import *
+from pox.lib.recoco import BlockingTask
+from file_watch import FileWatcher, valid_json
 
 log = core.getLogger()
 config = {}
@@ -77,8 +82,9 @@ class TimeoutTransport (xmlrpclib.SafeTransport):
 
 class TimeoutServerProxy (xmlrpclib.ServerProxy):
   def __init__(self,uri,timeout=socket._GLOBAL_DEFAULT_TIMEOUT, *l, **kw):
-    kw['transport']=TimeoutTransport(timeout=timeout,
-                                     use_datetime=kw.get('use_datetime',0))
+    if uri.startswith('https:'):
+      kw['transport']=TimeoutTransport(timeout=timeout,
+                                       use_datetime=kw.get('use_datetime',0))
     xmlrpclib.ServerProxy.__init__(self, uri, *l, **kw)
 #############################################################################
 
@@ -101,12 +107,34 @@ def read_var (filename, target_type = None, default=None):
       r = f.read().strip()
   return r
 
-def write_var (var, filename, target_type = None):
-  with open(filename, 'w') as f:
-    if target_type == json:
-      json.dump(var, f)
-    else:
-      f.write(var)
+def write_file (filename, data, keep_unchanged = False):
+  """Atomically replace the content of filename with data.
+
+  If keep_unchanged is set and filename already contains data, the file
+  is left untouched.  Returns True if the file has been written."""
+  if keep_unchanged:
+    try:
+      with open(filename) as f:
+        if f.read() == data:
+          return False
+    except IOError:
+      pass
+  dirname, basename = os.path.split(filename)
+  fd, tmp = tempfile.mkstemp(prefix='.%s.' % basename, dir=dirname or '.')
+  try:
+    with os.fdopen(fd, 'w') as f:
+      f.write(data)
+    os.chmod(tmp, 0644)
+    os.rename(tmp, filename)
+  except:
+    os.unlink(tmp)
+    raise
+  return True
+
+def write_var (var, filename, target_type = None, keep_unchanged = False):
+  if target_type == json:
+    var = json.dumps(var)
+  return write_file(filename, var, keep_unchanged)
 
 def call_make (*args, **kw):
   if 'conf_mk' in kw:
@@ -133,6 +161,7 @@ def ssh_cmd (hostname, identity_file, username, cmd, **kw):
     identity_file = os.path.expanduser(identity_file)
     args += ['-l', username, '-i', identity_file]
   args += kw.get('extra_args', [])
+  args += ssh_pool.control_args(hostname)
   args.append(hostname)
   if type(cmd) == list:
     args = args + cmd
@@ -159,6 +188,156 @@ def pl_ssh_cmd (hostname, cmd, **kw):
 
   return ssh_cmd(hostname, identity_file, slice_name, cmd, **kw)
 
+class SshPool (object):
+  """Runs ssh commands on many hosts at once.
+
+  Connections to the same host are multiplexed over a single master
+  connection (ssh's ControlMaster), so only the first command pays
+  for the handshake.  Configuration keys:
+    ssh_multiplex: use master connections (default: True)
+    ssh_persist: seconds an idle master connection stays open
+    ssh_concurrency: maximal number of parallel commands
+  """
+  def __init__ (self):
+    self._control_dir = None
+    self._hosts = set()
+    self._lock = threading.Lock()
+    self.timing = {}            # key -> duration of the last call
+
+  def control_args (self, hostname):
+    if not config.get('ssh_multiplex'):
+      return []
+    with self._lock:
+      if self._control_dir is None:
+        self._control_dir = tempfile.mkdtemp(prefix='allegra-ssh-')
+      self._hosts.add(hostname)
+    # A unix socket path is at most 108 bytes, and ssh appends a random
+    # suffix to it while it sets up the master, so the path is short.
+    name = hashlib.sha1(hostname).hexdigest()[:16]
+    path = os.path.join(self._control_dir, name)
+    return ['-o', 'ControlMaster=auto',
+            '-o', 'ControlPath=%s' % path,
+            '-o', 'ControlPersist=%s' % config.get('ssh_persist', 60)]
+
+  def map (self, func, items, key=str):
+    """Return [func(item) for item in items], but run the calls in
+    parallel.  The duration of each call is stored in
+    self.timing[key(item)].  If a call raises an exception, it is
+    re-raised here."""
+    items = list(items)
+    results = [None] * len(items)
+    errors = []
+    todo = Queue.Queue()
+    for i, item in enumerate(items):
+      todo.put((i, item))
+
+    def worker ():
+      while True:
+        try:
+          i, item = todo.get_nowait()
+        except Queue.Empty:
+          return
+        start = time.time()
+        try:
+          results[i] = func(item)
+        except BaseException:
+          errors.append(sys.exc_info())
+        self.timing[key(item)] = time.time() - start
+
+    start = time.time()
+    num_threads = min(len(items), int(config.get('ssh_concurrency', 10)))
+    threads = [threading.Thread(target=worker) for i in range(num_threads)]
+    for t in threads:
+      t.daemon = True
+      t.start()
+    for t in threads:
+      t.join()
+    if items:
+      slowest = max(items, key=lambda x: self.timing.get(key(x), 0))
+      log.debug('ssh: %d hosts in %.1fs, slowest: %s (%.1fs)' %
+                (len(items), time.time() - start,
+                 key(slowest), self.timing[key(slowest)]))
+    if errors:
+      raise errors[0][0], errors[0][1], errors[0][2]
+    return results
+
+  def close (self):
+    "Stop the master connections."
+    if self._control_dir is None:
+      return
+    for hostname in list(self._hosts):
+      try:
+        ssh_cmd(hostname, config['IdentityFile'], config['slice_name'],
+                [], extra_args=['-O', 'exit'], capture_stderr=True,
+                no_stdin=True)
+      except (subprocess.CalledProcessError, OSError):
+        pass
+    shutil.rmtree(self._control_dir, ignore_errors=True)
+    self._control_dir = None
+    self._hosts = set()
+
+ssh_pool = SshPool()
+
+class PlcCache (object):
+  """Persistent cache of the PlanetLab slice info and of the node
+  reachability, stored as a json file at config['plc_cache']."""
+  def __init__ (self):
+    self._data = None
+    self._lock = threading.Lock()
+    self._refreshing = False
+
+  def _load (self):
+    if self._data is None:
+      try:
+        self._data = read_var(config['plc_cache'], json, {})
+      except (ValueError, IOError) as e:
+        log.warn('cannot read %s: %s' % (config['plc_cache'], e))
+        self._data = {}
+    return self._data
+
+  def get (self, key):
+    with self._lock:
+      return copy.deepcopy(self._load().get(key))
+
+  def set (self, key, value):
+    with self._lock:
+      self._load()[key] = value
+      filename = config['plc_cache']
+      make_dir_if_needed(os.path.dirname(filename) or '.')
+      write_var(self._data, filename, json)
+
+  def refresh (self, fetch):
+    "Call fetch() in a background thread, unless it is already running."
+    with self._lock:
+      if self._refreshing:
+        return
+      self._refreshing = True
+    def run ():
+      try:
+        fetch()
+      except Exception:
+        log.exception('planetlab: refresh failed')
+      finally:
+        self._refreshing = False
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+
+plc_cache = PlcCache()
+
+def slice_cache_key ():
+  "Key of the slice info in plc_cache, which may hold many slices"
+  return 'slice %s %s' % (config['slice_name'], config['plc_api_url'])
+
+def known_host (hostname):
+  "True iff known_hosts has a key of hostname"
+  with open(os.devnull, 'w') as devnull:
+    try:
+      return subprocess.call(['ssh-keygen', '-F', hostname],
+                             stdout=devnull, stderr=devnull) == 0
+    except OSError:
+      return False
+
 def check_node_availability (hostname):
   try:
     args = ['-o', 'ConnectTimeout=4',
@@ -166,10 +345,12 @@ def check_node_availability (hostname):
             '-o', 'ServerAliveInterval=4']
     output = pl_ssh_cmd(hostname, 'hostname', extra_args=args,
                         capture_stderr=True, no_stdin=True)
-    args = ['-o', 'ConnectTimeout=4',
-            '-o', 'ServerAliveInterval=4']
-    output = pl_ssh_cmd(hostname, 'hostname', extra_args=args,
-                        capture_stderr=True, no_stdin=True)
+    # Later connections check the host key, so it must have been saved.
+    if not known_host(hostname):
+      lock.acquire()
+      log.error('host key of %s is not in known_hosts' % hostname)
+      lock.release()
+      return False
     lock.acquire()
     log.info("sucessful ssh connection to: %s" % hostname)
     lock.release()
@@ -213,103 +394,194 @@ class Downloader (object):
 
 ##############################################################################
 
-class Port (dict):
-  def __init__ (self, parent, d):
-    super(Port, self).__init__(**d)
-    for name in ['ip', 'mac', 'num', 'dpid']:
-      if name in d:
-        self.__setattr__(name, d[name])
-    self.__setattr__('parent', parent)
-
-  def __getattr__ (self, name):
-    if name in ['ip', 'mac', 'num', 'dpid', 'parent']:
-      return self.get(name)
-    else:
-      raise AttributeError('%s' % name)
-
-  def __setattr__ (self, name, value):
-    if name == 'ip':
-      value = IPAddr(value) if value else value
-      return super(Port, self).__setitem__(name, value)
-    if name == 'mac':
-      value = EthAddr(value) if value else value
-      return super(Port, self).__setitem__(name, value)
-    if name in ['num', 'dpid', 'parent']:
-      return super(Port, self).__setitem__(name, value)
-    return super(Port, self).__setattr__(name, value)
+class Port (object):
+  __slots__ = ('parent', 'num', '_dpid', '_ip', '_mac', '_extra')
+
+  def __init__ (self, parent, d, num = None):
+    self.parent = parent
+    self.num = d.get('num', num)
+    self._dpid = None
+    self._ip = None
+    self._mac = None
+    self._extra = {}            # unknown keys of the json description
+    for k, v in d.iteritems():
+      if k in ('ip', 'mac', 'dpid'):
+        setattr(self, k, v)
+      elif k not in ('num', 'parent'):
+        self._extra[k] = v
+
+  def __repr__ (self):
+    return 'P%s' % self.json_dict()
+
+  @property
+  def ip (self):
+    return self._ip
+
+  @ip.setter
+  def ip (self, value):
+    topo = self._topology()
+    if topo:
+      topo._unindex_port(self.parent, self)
+    self._ip = IPAddr(value) if value else value
+    if self.parent is not None:
+      self.parent._json = None
+    if topo:
+      topo._index_port(self.parent, self)
+
+  @property
+  def mac (self):
+    return self._mac
+
+  @mac.setter
+  def mac (self, value):
+    topo = self._topology()
+    if topo:
+      topo._unindex_port(self.parent, self)
+    self._mac = EthAddr(value) if value else value
+    if self.parent is not None:
+      self.parent._json = None
+    if topo:
+      topo._index_port(self.parent, self)
+
+  def _topology (self):
+    "The Topo whose indexes hold this port, or None"
+    return self.parent._topo if self.parent is not None else None
+
+  @property
+  def dpid (self):
+    "dpid of the neighbor connected to this port"
+    return self._dpid
+
+  @dpid.setter
+  def dpid (self, value):
+    parent = self.parent
+    if parent is not None and parent._port_of.get(self._dpid) is self:
+      del parent._port_of[self._dpid]
+    self._dpid = value
+    if parent is not None:
+      if value:
+        parent._port_of[value] = self
+      parent._neighbors = None
 
   def json_dict (self):
-    d = copy.deepcopy(self)
+    d = dict(self._extra)
     for k in ['ip', 'mac']:
-      if k in d:
-        d[k] = str(d[k])
-    for k in ['num', 'dpid', 'parent']:
-      d.pop(k, None)
+      v = getattr(self, k)
+      if v:
+        d[k] = str(v)
     return d
 
+def _dict_property (key):
+  def fget (self):
+    return self._dict.get(key)
+  def fset (self, value):
+    self._dict[key] = value
+    self._json = None
+  return property(fget, fset)
+
+# format of the saved topology files
+JSON_FORMAT = {'sort_keys': True, 'indent': 4, 'separators': (',', ': ')}
+
 class Node (object):
+  """
+  A switch or a host of the topology.
+
+  Keys of the json description are available as attributes, unknown
+  ones are None.  The DPID is parsed once.  Ports are kept in a table
+  keyed by port number and in a reverse map keyed by neighbor dpid.
+  The reverse map is maintained by Port.dpid, so every neighbor lookup
+  is a single dict access.  The serialized form is cached until the
+  node is modified.
+  """
+  __slots__ = ('_topo', '_dict', '_dpid', '_ports', '_port_of', '_neighbors',
+               '_json')
+
   def __init__ (self, d):
-    self._dict = {'ports': {}}
-    self._dict.update(d)
-    p = {}
-    for k, v in self._dict['ports'].iteritems():
-      p[int(k)] = Port(self, v)
-    self._dict['ports'] = p
-
-  def __getattribute__ (self, name):
+    self._topo = None           # set by Topo.add_node
+    self._dict = dict(d)
+    self._ports = {}            # port_num -> Port
+    self._port_of = {}          # neighbor dpid -> Port
+    self._neighbors = None      # cached list of neighbor dpids
+    self._json = None           # cached json_str(), None if dirty
+    try:
+      self._dpid = int(self._dict['DPID'], 16)
+    except KeyError:
+      log.warn("node.dpid (%s) failed" % self.name)
+      self._dpid = None
+    for k, v in self._dict.pop('ports', {}).iteritems():
+      self._ports[int(k)] = Port(self, v, int(k))
+
+  def __getattr__ (self, name):
+    # called only if 'name' is neither a slot nor a property
     if name.startswith('_'):
-      return object.__getattribute__(self, name)
-    if name in dir(self):
-      fun = object.__getattribute__(self, name)
-      if len(inspect.getargspec(fun).args) == 1:
-        return fun()
-      else:
-        return fun
+      raise AttributeError('%s' % name)
     return self._dict.get(name)
 
   def __setattr__ (self, name, value):
-    if name.startswith('_'):
+    if name.startswith('_') or hasattr(Node, name):
       return object.__setattr__(self, name, value)
     self._dict[name] = value
+    self._json = None
 
   def __str__ (self):
-    return ("N%s" % self._dict)
+    return "N%s" % dict(self._dict, ports=self._ports)
+
+  external = _dict_property('external')
+
+  @property
+  def name (self):
+    return self._dict.get('name')
 
+  @name.setter
+  def name (self, value):
+    if self._topo is not None:
+      self._topo._rename_node(self, self._dict.get('name'), value)
+    self._dict['name'] = value
+    self._json = None
+
+  @property
   def dpid (self):
-    try:
-      return int(self._dict[ 'DPID' ], 16)
-    except KeyError:
-      log.warn("node.dpid (%s) failed" % self.name)
-      return None
+    return self._dpid
+
+  @property
+  def ports (self):
+    return self._ports
 
+  @property
   def ip (self):
-    return [p.ip for p in self.ports.itervalues() if p.ip]
+    return [p.ip for p in self._ports.itervalues() if p.ip]
 
+  @property
   def mac (self):
-    return [p.mac for p in self.ports.itervalues() if p.mac]
+    return [p.mac for p in self._ports.itervalues() if p.mac]
 
+  @property
   def hostname (self):
     if 'hostname' in self._dict:
       return self._dict['hostname']
     try:
       hn = socket.gethostbyaddr(str(self.management_ip))[0]
-      self._dict['hostname'] = hn
+      self.hostname = hn
       return hn
     except (socket.herror, socket.gaierror):
       return call_make('+HOST_%s' % self.name)
 
+  @hostname.setter
+  def hostname (self, value):
+    if self._topo is not None:
+      self._topo._index_hostname(self, self._dict.get('hostname'), value)
+    self._dict['hostname'] = value
+    self._json = None
+
+  @property
   def position (self):
-    try:
-      return (self.x, self.y)
-    except (KeyError, AttributeError):
-      return None, None
+    return (self.x, self.y)
 
+  @property
   def geo_coords (self):
-    try:
-      return (str(self.latitude), str(self.longitude))
-    except (KeyError, AttributeError):
-      return None, None
+    return (str(self.latitude), str(self.longitude))
 
+  @property
   def has_geo_coords (self):
     try:
       lat, lon = self.geo_coords
@@ -331,106 +603,114 @@ class Node (object):
       else:
         lat, lon = None, None
       self._dict.update({'latitude': lat, 'longitude': lon})
+      self._json = None
 
   def add_neighbor (self, port_num, node_or_dpid):
     node_dpid = Node.get_dpid(node_or_dpid)
 
-    old_port = self.port(node_dpid)
+    old_port = self._port_of.get(node_dpid)
     if old_port:
-      try:
-        del old_port['dpid']
-      except KeyError:
-        pass
-    if port_num in self.ports.keys():
-      self.ports[port_num].dpid = node_dpid
+      old_port.dpid = None
+    if port_num in self._ports:
+      self._ports[port_num].dpid = node_dpid
       return
     if port_num < 1:
-      unset = [num for num, p in self.ports.iteritems() if not p.dpid]
+      unset = [num for num, p in self._ports.iteritems() if not p.dpid]
       if unset:
-        self.ports[unset[0]].dpid = node_dpid
+        self._ports[unset[0]].dpid = node_dpid
         return
-    self.ports[port_num] = Port(self, {'dpid': node_dpid})
+    self._ports[port_num] = Port(self, {'dpid': node_dpid}, port_num)
+    self._neighbors = None
 
+  @property
   def neighbors (self):
     '''return list of dpids of the node's neighbors'''
-    return [p.dpid for p in self.ports.itervalues() if p.dpid]
+    if self._neighbors is None:
+      self._neighbors = [p.dpid for p in self._ports.itervalues() if p.dpid]
+    return list(self._neighbors)
 
   def neighbor (self, node = None, port = None):
     if node is None and port is None:
-      return self.neighbors()
+      return self.neighbors
+    p = self._ports.get(port)
     if node and port:
-      return self.ports.get(port, {}).get('dpid') == node.dpid
+      return p is not None and p.dpid == node.dpid
     if port:
-      return self.ports.get(port, {}).get('dpid')
+      return p.dpid if p is not None else None
     if node:
       return self.port(node)
 
   @staticmethod
   def get_dpid (node_or_dpid):
-    if type(node_or_dpid) == Node:
-      return node_or_dpid.dpid
+    if isinstance(node_or_dpid, Node):
+      return node_or_dpid._dpid
     return node_or_dpid
 
   def port (self, node_or_dpid):
-    node_dpid = Node.get_dpid(node_or_dpid)
-
-    for p_num, p in self._dict['ports'].iteritems():
-      if p.dpid == node_dpid:
-        p['num'] = p_num
-        return p
-    return None
+    return self._port_of.get(Node.get_dpid(node_or_dpid))
 
   def port_num (self, node_or_dpid):
-    node_dpid = Node.get_dpid(node_or_dpid)
+    p = self._port_of.get(Node.get_dpid(node_or_dpid))
+    return p.num if p is not None else None
 
-    for p_num, p in self._dict['ports'].iteritems():
-      if p.dpid == node_dpid:
-        return p_num
-    return None
+  def ports_toward (self, nodes_or_dpids):
+    '''return the list of ports connected to the given neighbors
+
+    The list contains None for nodes that are not neighbors.'''
+    port_of = self._port_of
+    return [port_of.get(n._dpid if isinstance(n, Node) else n)
+            for n in nodes_or_dpids]
 
   def get_port (self, port_num):
-    p = self._dict['ports'].get(port_num)
-    if p:
-      p['num'] = port_num
-    return p
+    return self._ports.get(port_num)
 
   def generate_host_port (self, port_num, old_port=None):
-    if port_num in self._dict['ports'] and self.ports[port_num].ip:
+    if port_num in self._ports and self._ports[port_num].ip:
       log.warn('host(%s) has already got port_num(%s)' % (self.name, port_num))
-      port = self._dict['ports'][port_num]
-      port.num = port_num
-      return port
+      return self._ports[port_num]
     port = Port(self,
                 {'ip': '10.%d.0.%d' % (port_num, self.dpid),
                  'mac': '22:{0:02x}:00:00:00:{1:02x}'.format(port_num,
                                                              self.dpid),
-                 'num': port_num,
-                 })
-    if old_port:
-      port.dpid = old_port.dpid
-    self._dict['ports'][port_num] = port
+                 },
+                port_num)
+    neighbor_dpid = old_port.dpid if old_port else None
+    if port_num in self._ports:
+      self._ports[port_num].dpid = None
+      if self._topo:
+        self._topo._unindex_port(self, self._ports[port_num])
+    port.dpid = neighbor_dpid
+    self._ports[port_num] = port
+    self._neighbors = None
+    if self._topo:
+      self._topo._index_port(self, port)
     return port
 
   def json_dict (self):
-    d = copy.deepcopy(self._dict)
+    d = dict(self._dict)
     json_ports = {}
-    for k, v in d.get('ports').iteritems():
+    for k, v in self._ports.iteritems():
       port = v.json_dict()
       if port:
         json_ports[k] = port
     if json_ports:
       d['ports'] = json_ports
-    else:
-      d.pop('ports', None)
     d.pop('qemu', None)
     d.pop('initialized', None)
     return d
 
+  def json_str (self):
+    "json_dict() serialized according to JSON_FORMAT"
+    if self._json is None:
+      self._json = json.dumps(self.json_dict(), **JSON_FORMAT)
+    return self._json
+
 class Link (object):
   def __init__ (self, node_a, node_b, d):
     self._dict = d
     self._node_a = node_a
     self._node_b = node_b
+    self._json = (None, None)   # cache key and json_str()
 
   def is_hidden (self):
     try:
@@ -448,7 +728,7 @@ class Link (object):
       # we cannot contorol which port sliver-ovs will use, so it is
       # pointless to save the port numbers
       return '%s' % node.name
-    d = copy.deepcopy(self._dict)
+    d = dict(self._dict)
     d['name_a'] = self._node_a.name
     d['name_b'] = self._node_b.name
     port_a = d.pop('port_a', None)
@@ -458,6 +738,14 @@ class Link (object):
                         name_and_port(self._node_b, port_b))
     return d
 
+  def json_str (self):
+    "json_dict() serialized according to JSON_FORMAT"
+    a, b = self._node_a, self._node_b
+    key = (a.name, a.external, b.name, b.external)
+    if self._json[0] != key:
+      self._json = (key, json.dumps(self.json_dict(), **JSON_FORMAT))
+    return self._json[1]
+
 class Topo (object):
   def __init__ (self):
     self._nodes_dpid = {}
@@ -468,6 +756,10 @@ class Topo (object):
     self._routes = []
     self._gen_routes = True
     self._max_dpid = 0
+    # lookup indexes, keys are str() of the addresses
+    self._ip_index = {}         # ip -> (node, port)
+    self._mac_index = {}        # mac -> node
+    self._hostname_index = {}   # hostname -> node
 
   def __getattr__ (self, name):
     if name == 'nodes':
@@ -504,6 +796,9 @@ class Topo (object):
     self._nodes_dpid[node.dpid] = node
     self._nodes_name[node.name] = node
     self._max_dpid = max(self._max_dpid, node.dpid)
+    node._topo = self
+    self._index_node(node)
+    self._index_hostname(node, None, node.hostname)
 
   def add_link (self, node_a, node_b = None, l = {}):
     if node_b is None:
@@ -515,6 +810,35 @@ class Topo (object):
     self._links[dpid_1, dpid_2] = Link(node_a, node_b, l)
     node_a.add_neighbor(int(l.get('port_a', -1 * node_b.dpid)), node_b.dpid)
     node_b.add_neighbor(int(l.get('port_b', -1 * node_a.dpid)), node_a.dpid)
+    self._index_node(node_a)
+    self._index_node(node_b)
+
+  def _index_port (self, node, port):
+    if port.ip:
+      self._ip_index[str(port.ip)] = (node, port)
+    if port.mac:
+      self._mac_index[str(port.mac)] = node
+
+  def _unindex_port (self, node, port):
+    if port.ip and self._ip_index.get(str(port.ip)) == (node, port):
+      del self._ip_index[str(port.ip)]
+    if port.mac and self._mac_index.get(str(port.mac)) is node:
+      del self._mac_index[str(port.mac)]
+
+  def _index_node (self, node):
+    for port in node.ports.itervalues():
+      self._index_port(node, port)
+
+  def _index_hostname (self, node, old, new):
+    if old and type(old) != list and self._hostname_index.get(old) is node:
+      del self._hostname_index[old]
+    if new and type(new) != list:
+      self._hostname_index[new] = node
+
+  def _rename_node (self, node, old, new):
+    if self._nodes_name.get(old) is node:
+      del self._nodes_name[old]
+    self._nodes_name[new] = node
 
   def set_link_port (self, name_a, name_b, port_num):
     node_a = self.name(name_a)
@@ -562,19 +886,38 @@ class Topo (object):
   def disable_gen_routes (self):
     self._gen_routes = False
 
-  def gen_routes (self):
+  def gen_routes (self, node = None):
+    """Generate routes with the configured algorithm.
+
+    If node is given and the algorithm has generate_routes_for(), only
+    the routes from and to node are replaced, and (new_routes,
+    removed_routes) is returned.  Otherwise every route is regenerated
+    and None is returned.
+    """
     if not self._gen_routes:
-      return
+      return None
     alg = config['gen_routes']
-    attr = None
+    mod, attr = None, None
     try:
       mod = getattr(core, alg)
       attr = getattr(mod, 'generate_routes')
     except AttributeError:
       log.error('generate_routes: cannot find: %s', alg)
+    if node is not None and hasattr(mod, 'generate_routes_for'):
+      removed, kept = [], []
+      for r, prop in self._routes:
+        if node.name in (r[0], r[-1]):
+          removed.append((r, prop))
+        else:
+          kept.append((r, prop))
+      self._routes = kept
+      num_kept = len(kept)
+      mod.generate_routes_for(self, node)
+      return self._routes[num_kept:], removed
     if attr:
       self._routes = []
       attr(self)
+    return None
 
   def write_external_info (self):
     for node_a in self.nodes:
@@ -588,19 +931,17 @@ class Topo (object):
         dir = 'planetlab/%s/%s' % (node_a.hostname, node_b.name)
         make_dir_if_needed(dir)
 
-        write_var(params, dir + '/vars.json', json)
+        write_var(params, dir + '/vars.json', json, keep_unchanged=True)
         for var in params.keys():
-          write_var(params[var], dir + '/' + var)
+          write_var(params[var], dir + '/' + var, keep_unchanged=True)
 
         node_vars[node_b.name] = params
         hostnames.append(node_b.name)
 
       dir =  'planetlab/%s' % node_a.hostname
-      write_var(node_vars, dir + '/vars.json', json)
-
-      with open(dir + '/neighbors', 'w') as f:
-        for neighbor in hostnames:
-          f.write('%s\n' % neighbor)
+      write_var(node_vars, dir + '/vars.json', json, keep_unchanged=True)
+      neighbors = ''.join('%s\n' % neighbor for neighbor in hostnames)
+      write_file(dir + '/neighbors', neighbors, keep_unchanged=True)
 
   def dpid (self, id):
     return self._nodes_dpid.get(id)
@@ -609,29 +950,16 @@ class Topo (object):
     return self._nodes_name.get(n)
 
   def ip (self, ip):
-    for node in self._nodes_name.values():
-      for port in node.ports.itervalues():
-        if str(port.ip) == str(ip):
-          return node
-    return None
+    return self._ip_index.get(str(ip), (None, None))[0]
 
   def ip_and_port (self, ip):
-    for node in self._nodes_name.values():
-      for port in node.ports.itervalues():
-        if str(port.ip) == str(ip):
-            return node, port
-    return None, None
+    return self._ip_index.get(str(ip), (None, None))
 
   def mac (self, mac):
-    for node in self._nodes_name.values():
-      for port in node.ports.itervalues():
-        if str(port.mac) == str(mac):
-          return node
+    return self._mac_index.get(str(mac))
 
   def hostname (self, hostname):
-    for node in self._nodes_name.values():
-      if node.hostname == hostname:
-        return node
+    return self._hostname_index.get(hostname)
 
   def link (self, node_a, node_b):
     if not isinstance(node_a, Node):
@@ -642,7 +970,7 @@ class Topo (object):
     dpid_1, dpid_2 = sorted([node_a.dpid, node_b.dpid])
     return self._links.get((dpid_1, dpid_2))
 
-  def json_dumps (self, **kw):
+  def _json_routes (self):
     routes = []
     for r, prop in self.routes:
       r = '-'.join(r)
@@ -650,27 +978,78 @@ class Topo (object):
         routes.append((r, prop))
       else:
         routes.append(r)
-    var = {'nodes': [n.json_dict for n in self.nodes],
+    return routes
+
+  def json_dumps (self, **kw):
+    var = {'nodes': [n.json_dict() for n in self.nodes],
            'links': [l.json_dict() for l in self.links],
-           'routes': routes}
+           'routes': self._json_routes()}
     return json.dumps(var, **kw)
 
+  def iter_json (self):
+    """Yield the chunks of json_dumps(**JSON_FORMAT).
+
+    Nodes are not copied, their cached json_str() is reused."""
+    indent = ' ' * JSON_FORMAT['indent']
+    def dumps (obj):
+      return json.dumps(obj, **JSON_FORMAT)
+    def items (key, strings, last = False):
+      yield '\n%s"%s": ' % (indent, key)
+      empty = True
+      for s in strings:
+        yield '[' if empty else ','
+        yield '\n' + 2 * indent + s.replace('\n', '\n' + 2 * indent)
+        empty = False
+      yield '[]' if empty else '\n%s]' % indent
+      if not last:
+        yield ','
+    yield '{'
+    for chunk in items('links', (l.json_str() for l in self.links)):
+      yield chunk
+    for chunk in items('nodes', (n.json_str() for n in self.nodes)):
+      yield chunk
+    for chunk in items('routes', (dumps(r) for r in self._json_routes()),
+                       last=True):
+      yield chunk
+    yield '\n}'
+
 ##############################################################################
 
 class OutbandTopologyChanged (Event):
   def __init__ (self):
     Event.__init__(self)
 
+class OutbandTopologyDelta (Event):
+  """The topology has been extended without touching the rest of it.
+
+  nodes, links: the added (or re-connected) Node and Link objects
+  routes: the added (route, prop) pairs
+  removed_routes: the (route, prop) pairs they replace
+  """
+  def __init__ (self, nodes, links, routes, removed_routes):
+    Event.__init__(self)
+    self.nodes = nodes
+    self.links = links
+    self.routes = routes
+    self.removed_routes = removed_routes
+
 class Outband (EventMixin):
   _eventMixin_events = set([
     OutbandTopologyChanged,
+    OutbandTopologyDelta,
   ])
 
   def __init__ (self):
     self.ctrl_addr = None
-    self.file_timestamp = -1
+    self.t = Topo()             # replaced when the topology is loaded
+    core.addListenerByName('GoingDownEvent', lambda e: ssh_pool.close())
     self.install_poxdesk()
-    self.check_for_updates()
+    self.load_topo()
+    self._watcher = FileWatcher(config['topo_filename'],
+                                self._handle_topo_file_changed,
+                                validate=valid_json)
+    self._watcher.start()
+    core.addListenerByName('GoingDownEvent', lambda e: self._watcher.stop())
  
   def __str__ (self):
     public_config = copy.deepcopy(config)
@@ -682,7 +1061,7 @@ class Outband (EventMixin):
 
   def set_topo_filename (self, filename):
     config['topo_filename'] = filename
-    self.file_timestamp = self.get_file_timestamp(filename)
+    self._watcher.set_filename(filename)
 
   def install_poxdesk (self):
     "run setup.py for poxdesk if necessary"
@@ -704,7 +1083,9 @@ class Outband (EventMixin):
     log.info('installing poxdesk ... done')
     return
 
-  def query_links (self, node=None):
+  def query_links (self, node=None, t=None):
+    if t is None:
+      t = self.t
     if node:
       output = call_make('showports-%s' % node.name, log=False)
     else:
@@ -712,7 +1093,7 @@ class Outband (EventMixin):
     for line in output.split('\n'):
       m = re.match(r"PORT_(.*)_(.*)=(.*)", line)
       if m:
-        self.t.set_link_port(m.group(1), m.group(2), m.group(3))
+        t.set_link_port(m.group(1), m.group(2), m.group(3))
       else:
         if (re.search(r"\w", line)):
           log.error('query_links, unknown line:%s' % line)
@@ -734,7 +1115,7 @@ class Outband (EventMixin):
       return
     return
 
-  def init_node (self, node):
+  def set_datapath_id (self, node):
     if not node.external and node.neighbors:
       slice_name = config['slice_name']
       cmd=('%s sudo -A ovs-vsctl set bridge %s other-config:datapath-id=%s' %
@@ -743,6 +1124,10 @@ class Outband (EventMixin):
         log.error('cannot determine hostname for %s' % node.name)
         exit()
       pl_ssh_cmd(node.hostname, cmd, log=True)
+
+  def init_node (self, node, set_dpid=True):
+    if set_dpid:
+      self.set_datapath_id(node)
     node.update_geo_coords()
     if node.external and node.qemu and not node.initialized:
       node.initialized = True
@@ -767,36 +1152,100 @@ class Outband (EventMixin):
       subprocess.Popen(cmd)     # runs in the background
 
   def filter_available_nodes (self, hostnames):
+    """Return the hostnames we can ssh into.  Results younger than
+    config['reachability_ttl'] are taken from plc_cache."""
     if not config['check_node_availability']:
       return hostnames
-    pool =  multiprocessing.dummy.Pool(10)
-    bool_list = pool.map(check_node_availability, hostnames)
-    ok_hostnames = [n for n, b in zip(hostnames, bool_list) if b]
+    now = time.time()
+    known = plc_cache.get('reachability') or {}
+    ttl = config['reachability_ttl']
+    fresh = dict((h, ok) for h, (ok, when) in known.iteritems()
+                 if now - when < ttl)
+    probe = [h for h in hostnames if h not in fresh]
+    bool_list = ssh_pool.map(check_node_availability, probe)
+    for hostname, ok in zip(probe, bool_list):
+      fresh[hostname] = ok
+      known[hostname] = (ok, now)
+    if probe:
+      plc_cache.set('reachability', known)
+    log.debug('filter_available_nodes: %d cached, %d probed' %
+              (len(hostnames) - len(probe), len(probe)))
+    ok_hostnames = [n for n in hostnames if fresh[n]]
     return ok_hostnames
 
-  def load_topo (self):
+  def load_topo (self, reload = False):
+    """Load the topology in the background.
+
+    The expensive steps (PlanetLab RPC, make, ssh) run on a worker
+    thread, so the OpenFlow connections are served meanwhile.  The
+    finished Topo is published on the cooperative thread, and until
+    then self.t remains the previous topology.  If reload is True,
+    the running planetlab overlay is stopped first.
+    """
     filename = config['topo_filename']
-    self.file_timestamp = self.get_file_timestamp(filename)
-    self.t = Topo()
-    self.get_planetlab_info()
+    task = BlockingTask(self._build_topo,
+                        (self._publish_topo, self._load_topo_failed),
+                        args=(filename, reload))
+    task.start()
+
+  def _build_topo (self, filename, reload):
+    "Runs on a worker thread.  Holds rpc_lock until the topo is published."
+    rpc_lock.acquire()
+    start = time.time()
+    if reload:
+      # this is an overkill, probably
+      call_make('-j', 'stop', log=True)
+      call_make('-j', 'shutdown', log=True)
+      call_make('clean', log=True)
+      call_make('distclean', log=True)
+    t = Topo()
+    self.get_planetlab_info(t)
+    log.debug('load_topo: planetlab info: %.1fs' % (time.time() - start))
+
+    stage = time.time()
+    self._parse_topo(t, filename)
+    log.debug('load_topo: routes: %.1fs' % (time.time() - stage))
+
+    stage = time.time()
+    self.start_planetlab_overlay(t)
+    self.save_topo(t=t)
+    log.debug('load_topo: overlay: %.1fs' % (time.time() - stage))
+    log.info('load_topo: %s is ready in %.1fs' %
+             (filename, time.time() - start))
+    return t
+
+  def _publish_topo (self, t):
+    try:
+      self.t = t
+      self.raiseEvent(OutbandTopologyChanged)
+    finally:
+      rpc_lock.release()
+
+  def _load_topo_failed (self, exc_info):
+    rpc_lock.release()
+    if exc_info[0] is SystemExit:
+      core.quit()
+      return
+    log.error('load_topo failed', exc_info=exc_info)
 
+  def _parse_topo (self, t, filename):
     if not os.path.exists(filename):
       log.warn('file does not exist: %s' % filename)
     topo = read_var(filename, json, {})
 
     for n in topo.get('nodes', []):
-      self.t.add_node(Node(n))
-    if not self.t.nodes:
+      t.add_node(Node(n))
+    if not t.nodes:
       #generate nodes
-      for dpid, hostname in enumerate(self.t._working_ple_nodes, 1):
+      for dpid, hostname in enumerate(t._working_ple_nodes, 1):
         n = { 'name': "N%d" % dpid,
               'DPID': '{0:016x}'.format(dpid),
               'hostname': hostname }
-        self.t.add_node(Node(n))
+        t.add_node(Node(n))
 
     for l in topo.get('links', []):
       if type(l) == dict:
-        self.t.add_link(l)
+        t.add_link(l)
       else:
         #link format: name_a:port_a-name_b:port_b
         m = re.match(r"([^:-]*)(:([0-9]+))?-([^:-]*)(:([0-9]+))?", l)
@@ -804,8 +1253,8 @@ class Outband (EventMixin):
         d = {'name_a': name_a, 'name_b': name_b}
         if port_a: d['port_a'] = port_a
         if port_b: d['port_b'] = port_b
-        self.t.add_link(d)
-    if not self.t.links:
+        t.add_link(d)
+    if not t.links:
       alg = config['gen_links']
       attr = None
       try:
@@ -814,7 +1263,7 @@ class Outband (EventMixin):
       except AttributeError:
         log.error('generate_links: cannot find: %s', alg)
       if attr:
-        attr(self.t)
+        attr(t)
 
     # set pre-defined routes
     for r in topo.get('routes', []):
@@ -824,53 +1273,67 @@ class Outband (EventMixin):
       else:
         route = r
         prop  = []
-      self.t.add_route(route.split('-'), prop)
-    if len(self.t.routes) == 0:
-      self.t.gen_routes()
+      t.add_route(route.split('-'), prop)
+    if len(t.routes) == 0:
+      t.gen_routes()
     else:
-      self.t.disable_gen_routes()
-
-    self.start_planetlab_overlay()
-    self.save_topo()
-
-    self.raiseEvent(OutbandTopologyChanged)
+      t.disable_gen_routes()
 
   def reload_topo (self):
     "first stops the planetlab overlay, then loads the new topology."
-    # this is an overkill, probably
-    call_make('-j', 'stop', log=True)
-    call_make('-j', 'shutdown', log=True)
-    call_make('clean', log=True)
-    call_make('distclean', log=True)
-
+    self.load_topo(reload=True)
+
+  def save_topo (self, filename='auto_topo.json', t=None):
+    if t is None:
+      t = self.t
+    emacs = ' -' + '*-'
+    emacs = emacs + ' eval: (auto-revert-mode 1);' + emacs
+    chunks = t.iter_json()
+    chunks.next()                 # '{'
+    topo = '{   "emacs": "' + emacs + '",' + ''.join(chunks)
+    if not write_file(filename, topo, keep_unchanged=True):
+      log.debug('save_topo: %s is unchanged' % filename)
+
+  def _handle_topo_file_changed (self, filename):
+    log.info('%s has changed' % filename)
     self.load_topo()
 
-  def save_topo (self, filename='auto_topo.json'):
-    with open(filename, 'w') as f:
-      topo = self.t.json_dumps(sort_keys=True, indent=4,
-                               separators=(',', ': '))
-      emacs = ' -' + '*-'
-      emacs = emacs + ' eval: (auto-revert-mode 1);' + emacs
-      topo = topo.replace('{', '{   "emacs": "' + emacs + '",', 1)
-      f.write(topo)
+  def get_planetlab_info (self, t):
+    """Set the vnet and the (working) PlanetLab nodes of t.
+
+    Slice info comes from plc_cache if it is younger than
+    config['plc_cache_ttl'], otherwise it is downloaded.  An expired
+    cache is still used, but it is refreshed in the background.
+    """
+    info = plc_cache.get(slice_cache_key())
+    age = time.time() - info['time'] if info else None
+    if info is None:
+      info = self.fetch_planetlab_info()
+    elif age > config['plc_cache_ttl']:
+      log.info('planetlab: cached slice info is %ds old, refreshing' % age)
+      plc_cache.refresh(self.fetch_planetlab_info)
+    else:
+      log.debug('planetlab: using cached slice info (%ds old)' % age)
 
-  def get_file_timestamp (self, filename):
-    try:
-      return time.ctime(os.path.getmtime(filename))
-    except OSError:
-      return 0
+    if info is None:
+      log.error('planetlab: not authorized')
+      t.vnet = config.get('vsys_vnet')
+      nodes = config.get('ple_nodes')
+      t._ple_nodes = nodes
+      t._working_ple_nodes = self.filter_available_nodes(nodes)
+      return
 
-  def check_for_updates (self):
-    filename = config['topo_filename']
-    curr = self.get_file_timestamp(filename)
-    prev = self.file_timestamp
-    if curr != prev:
-      self.load_topo()
-    core.callDelayed(2, self.check_for_updates)
-
-  def get_planetlab_info (self):
-    plc_host='www.planet-lab.eu'
-    api_url = "https://%s:443/PLCAPI/" % plc_host
+    t.vnet = info['vnet']
+    t._ple_nodes = info['ple_nodes']
+    t._working_ple_nodes = self.filter_available_nodes(info['boot_nodes'])
+
+  def fetch_planetlab_info (self):
+    """Download the slice info from PLCAPI and store it in plc_cache.
+
+    Return None if we are not authorized, or the previously cached
+    info if the download fails halfway.
+    """
+    api_url = config['plc_api_url']
     auth = config['auth']
     slice_name = config['slice_name']
 
@@ -879,54 +1342,48 @@ class Outband (EventMixin):
     try:
       plc_api = TimeoutServerProxy(api_url, allow_none=True, timeout=5)
       res = plc_api.AuthCheck(auth)
-    except (socket.gaierror, socket.timeout, SSLError):
+    except (socket.gaierror, socket.timeout, socket.error, SSLError):
       pass
     if res:
       log.info('planetlab: we are authorized!')
     else:
-      log.error('planetlab: not authorized')
-      self.t.vnet = config.get('vsys_vnet')
-      nodes = config.get('ple_nodes')
-      self.t._ple_nodes = nodes
-      self.t._working_ple_nodes = self.filter_available_nodes(nodes)
-      
-      return
+      return None
 
-    # get 'vnet' of the slice
     try:
+      # get 'vnet' of the slice
       filter = {'name': slice_name, 'tagname': 'vsys_vnet'}
       tags = plc_api.GetSliceTags(auth, filter, ['value'])
       vnet = tags[0]['value']
-      self.t.vnet = vnet
-    except SSLError as e:
+
+      # get public ssh keys of slice's users
+      user_keys = plc_api.GetSliceKeys(auth)
+      user_keys = [k['key'] for k in user_keys if k['name'] == slice_name]
+
+      # the slice's node ids
+      node_ids = plc_api.GetSlices(auth, slice_name, ['node_ids'])
+      node_ids = node_ids[0]['node_ids']
+
+      # get hostname for these nodes
+      slice_nodes = plc_api.GetNodes(auth,node_ids,['hostname', 'run_level'])
+    except (SSLError, socket.error, xmlrpclib.Fault) as e:
       log.error('planetlab: %s' % e)
-      return
+      return plc_cache.get(slice_cache_key())
 
-    # get public ssh keys of slice's users
     dirname = os.path.dirname(pox.core.__file__)
     dir = os.path.join(dirname, '..', '..', 'tools', 'fat_dir')
     make_dir_if_needed(dir)
-    user_keys = plc_api.GetSliceKeys(auth)
-    user_keys = [k['key'] for k in user_keys if k['name'] == slice_name]
     with open(dir + '/ssh_key.pub', 'w') as f:
       f.write(''.join(user_keys))
 
-    # the slice's node ids
-    node_ids = plc_api.GetSlices(auth, slice_name, ['node_ids'])
-    node_ids = node_ids[0]['node_ids']
-
-    # get hostname for these nodes
-    try:
-      slice_nodes = plc_api.GetNodes(auth,node_ids,['hostname', 'run_level'])
-    except Fault as e:
-      log.error('planetlab: %s' % e)
-      return
-
     nodes =   [n['hostname'] for n in slice_nodes if n['run_level'] == 'boot']
     skipped = [n['hostname'] for n in slice_nodes if n['run_level'] != 'boot']
 
-    self.t._ple_nodes = [n['hostname'] for n in slice_nodes]
-    self.t._working_ple_nodes = self.filter_available_nodes(nodes)
+    info = {'time': time.time(),
+            'vnet': vnet,
+            'ple_nodes': [n['hostname'] for n in slice_nodes],
+            'boot_nodes': nodes}
+    plc_cache.set(slice_cache_key(), info)
+    return info
 
   def get_controller_ip_addr (self):
     if config.get('controller_ip_addr'):
@@ -940,9 +1397,11 @@ class Outband (EventMixin):
     s.close()
     return self.ctrl_addr
 
-  def write_makefile_config (self, filename):
+  def write_makefile_config (self, filename, t=None):
+    if t is None:
+      t = self.t
     f = open(filename, 'w')
-    vnet = re.sub(r'\.[0-9]/', '.%d/', self.t.vnet)
+    vnet = re.sub(r'\.[0-9]/', '.%d/', t.vnet)
     port = core.of_01.port
     ip_addr = self.get_controller_ip_addr()
 
@@ -960,7 +1419,7 @@ class Outband (EventMixin):
     f.write('EXTERNAL_PORT := 2222\n')
     f.write('EXTERNAL_HOSTS :=\n\n')
 
-    for i, n in enumerate(sorted(self.t.nodes, key=lambda x: x.dpid), 1):
+    for i, n in enumerate(sorted(t.nodes, key=lambda x: x.dpid), 1):
       f.write('HOST_%s=%s\n' % (n.name, n.hostname))
       if n.external:
         f.write('EXTERNAL_HOSTS += %s\n' % n.name)
@@ -968,7 +1427,7 @@ class Outband (EventMixin):
         f.write('IP_%s=%s\n' % (n.name, vnet % i))
 
     f.write('\nLINKS :=\n')
-    for link in self.t.links:
+    for link in t.links:
       node_a, node_b = link.get_nodes()
       if node_a.external:
         node_a, node_b = node_b, node_a
@@ -983,17 +1442,20 @@ class Outband (EventMixin):
         write_var(port_num, 'cache/port.%s-%s@2' % (node_a.name, node_b.name))
     f.close()
 
-  def start_planetlab_overlay (self):
-    self.write_makefile_config('auto_conf.mk')
+  def start_planetlab_overlay (self, t=None):
+    if t is None:
+      t = self.t
+    self.write_makefile_config('auto_conf.mk', t)
     call_make('init', log=True)
     call_make('-j', log=True)
-    if filter(lambda x: not x, [n.has_geo_coords for n in self.t.nodes]):
+    if filter(lambda x: not x, [n.has_geo_coords for n in t.nodes]):
       call_make('geocode.json', log=True)
-    for node in self.t.nodes:
-      self.init_node(node)
+    ssh_pool.map(self.set_datapath_id, t.nodes, key=lambda n: n.name)
+    for node in t.nodes:
+      self.init_node(node, set_dpid=False)
     call_make('-j', 'controllers')
-    self.query_links()
-    self.t.write_external_info()
+    self.query_links(t=t)
+    t.write_external_info()
 
   def get_ple_list (self):
     '''Return the list available PLE nodes that a host can connect to.'''
@@ -1037,6 +1499,7 @@ class Outband (EventMixin):
                (host_shortname, host_hostname))
 
     params = []
+    links = []
     for port_num, ple_hostname in enumerate(ple_hostnames, 1):
       node_ple = self.t.hostname(ple_hostname)
       if node_ple is None:
@@ -1062,6 +1525,7 @@ class Outband (EventMixin):
       if node_ple.port_num(node_host):
         link_param['port_a'] = node_ple.port_num(node_host)
       self.t.add_link(node_ple, node_host, link_param)
+      links.append(self.t.link(node_ple, node_host))
       self.write_makefile_config('auto_conf.mk')
       call_make('L/%s' % link, conf_mk='auto_conf.mk')
       for node in [node_host]:
@@ -1071,9 +1535,20 @@ class Outband (EventMixin):
 
     call_make('controllers')
     self.t.write_external_info()
-    self.t.gen_routes()
+    delta = None
+    if config['incremental_routes']:
+      delta = self.t.gen_routes(node_host)
+    else:
+      self.t.gen_routes()
     self.save_topo()
-    self.raiseEvent(OutbandTopologyChanged)
+    # we are on the thread of the rpc handler, the listeners expect
+    # the events on the cooperative thread
+    if delta is None:
+      core.callLater(self.raiseEvent, OutbandTopologyChanged)
+    else:
+      routes, removed_routes = delta
+      core.callLater(self.raiseEvent, OutbandTopologyDelta, [node_host],
+                     links, routes, removed_routes)
 
     return params
 
@@ -1093,6 +1568,14 @@ def set_config (config_filename, **kw):
               'qemu_overlay': 'overlay_debian_squeeze_i386_mptcp.qcow2',
               'gen_routes': 'gen_routes_spf',
               'gen_links': 'gen_links_ring',
+              'incremental_routes': True,
+              'ssh_multiplex': True,
+              'ssh_persist': 60,
+              'ssh_concurrency': 10,
+              'plc_api_url': 'https://www.planet-lab.eu:443/PLCAPI/',
+              'plc_cache': 'cache/plc_info.json',
+              'plc_cache_ttl': 3600,
+              'reachability_ttl': 600,
               'conf_mk': 'auto_conf.mk'}
     try:
       with open(config_filename) as f:
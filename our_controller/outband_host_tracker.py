@@ -57,9 +57,9 @@ class OutbandHostTracker (object):
   def _check_timeouts (self):
     for node in core.Outband.t.nodes:
       if node.external:
-        for neighbor in node.neighbors:
+        neighbors = node.neighbors
+        for neighbor, port in zip(neighbors, node.ports_toward(neighbors)):
           neighbor_port_num = core.Outband.t.dpid(neighbor).port_num(node)
-          port = node.port(neighbor)
           if port.ip and port.mac:
             self._send_ping(neighbor, neighbor_port_num, port.mac, port.ip)
 
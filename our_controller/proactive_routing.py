@@ -18,6 +18,9 @@ Installs routes proactively.  Routes are taken from the outband module
 in the from of [hostname, switchname, ..., switchname, hostname].
 This module has a lots of extra stuff and hacks which we don't use
 anymore.
+
+Failover measurements are written by a recorder.Recorder into
+'metrics_dir', a file per emulated link failure.
 """
 
 import time
@@ -30,11 +33,13 @@ from pox.lib.addresses import *
 from pox.lib.packet.ipv4 import ipv4
 from pox.lib.revent import EventHalt, EventContinue
 import pox.openflow.libopenflow_01 as of
+from recorder import Recorder
 
 # Timeout for flows
 FLOW_IDLE_TIMEOUT = 10
 FAILOVER_PRIORITY = of.OFP_DEFAULT_PRIORITY + 100
 ETH_LABEL = EthAddr(b"\xee\xee\xee\xee\xee\xee")
+DEFAULT_METRICS_DIR = '/tmp/pox_metrics'
 
 log = core.getLogger()
 reset_lock = multiprocessing.Lock()
@@ -42,12 +47,18 @@ reset_lock = multiprocessing.Lock()
 class ProactiveRouting (object):
   """Install routing tables proactively."""
 
-  def __init__ (self):
+  def __init__ (self, metrics_dir = DEFAULT_METRICS_DIR):
     self.prev_change_port = None
-    self.log_file = open("/tmp/pox_log", "w")
-    self.barrier_log_file = open("/tmp/barrier_log", "w")
+    self.recorder = Recorder(metrics_dir)
     self._pending_barriers = {}
+    self._barrier_callbacks = {}
     self._prev_barrier_arrived = {}
+    self._flow_tables = {}      # dpid -> {flow key: flow_mod}, installed
+    self._desired_flows = None  # {flow key: flow_mod} while collecting
+    self._route_index = None    # see _get_route_index()
+    self._batches = {}          # dpid -> [packed messages]
+    self._convergence = None    # state of the running reset_flowtables()
+    self.install_latency = {}   # dpid -> duration of the last batch
     self._xid_generator = of.xid_generator()
     core.openflow.addListeners(self)
     core.Outband.addListeners(self)
@@ -61,45 +72,59 @@ class ProactiveRouting (object):
   def _install_flow (self, p, c, n, port_src, port_dst = None,
                      **kw):
     """Install a flow entry at c to forward packet coming form p to n"""
+    hop = self._resolve_hop(p, c, n)
+    if hop:
+      self._install_hop(hop, port_src, port_dst, **kw)
+
+  def _resolve_hop (self, p, c, n):
+    """Look up the ports of the hop p->c->n.
 
+    Returns (c, dpid of c, inport, outport, rewrite mac, str_from,
+    str_out), or None if the hop cannot be installed.
+    """
     node_p = core.Outband.t.name(p)
     node_c = core.Outband.t.name(c)
     node_n = core.Outband.t.name(n)
-    inport  = node_c.port(node_p)
-    outport = node_c.port(node_n)
+    inport, outport = node_c.ports_toward((node_p, node_n))
     if not inport:
       log.error('%s->%s: not found' % (node_c.name, node_p.name))
-      return
+      return None
     if not outport:
       log.error('%s->%s: not found' % (node_c.name, node_n.name))
-      return
-
-    nw_src = nw_dst = None
-    info_src = info_dst = ""
-    if port_src:
-      nw_src = port_src.ip
-      info_src = "%s(%s) => " % (port_src.parent.name, nw_src)
-    if port_dst:
-      nw_dst = port_dst.ip
-      info_dst = " => %s(%s)" % (port_dst.parent.name, nw_dst)
+      return None
 
     backport = node_n.port(node_c)
     if backport:
       mac = backport.mac
     else:
       log.error('%s->%s: link not found' % (node_n.name, node_c.name))
-      return
+      return None
 
     str_from = "%s.%s" % (dpid_to_str(node_c.dpid), c)
     str_out  = "%s.%s" % (dpid_to_str(node_n.dpid), n)
-    eth_in, eth_out = '', ''
-    if mac:
-      eth_out = '!'
 
     if not outport or outport < 0 or not inport.num or inport.num < 0:
       log.error('unknown port: %s %s->%s %s' %
                 (str_from, inport.num, outport.num, str_out))
-      return
+      return None
+
+    return (c, node_c.dpid, inport, outport, mac, str_from, str_out)
+
+  def _install_hop (self, hop, port_src, port_dst = None, **kw):
+    c, dpid, inport, outport, mac, str_from, str_out = hop
+
+    nw_src = nw_dst = None
+    info_src = info_dst = ""
+    if port_src:
+      nw_src = port_src.ip
+      info_src = "%s(%s) => " % (port_src.parent.name, nw_src)
+    if port_dst:
+      nw_dst = port_dst.ip
+      info_dst = " => %s(%s)" % (port_dst.parent.name, nw_dst)
+
+    eth_in, eth_out = '', ''
+    if mac:
+      eth_out = '!'
 
     actions = []
     if not mac and 'add_eth_label' in kw:
@@ -161,49 +186,133 @@ class ProactiveRouting (object):
     if 'failover_entry' in kw:
       self._add_failover_entry(c, msg)
     else:
-      core.openflow.sendToDPID(node_c.dpid, msg.pack())
+      self._emit_flow(dpid, msg)
 
     if (not ('udp' in kw)) and outport.mac:
       #sending to destination, separte udp traffic 
-      self._install_flow(p, c, n, port_src, port_dst,
-                         udp = True, priority = of.OFP_DEFAULT_PRIORITY + 99,
-                         **kw)
+      self._install_hop(hop, port_src, port_dst,
+                        udp = True, priority = of.OFP_DEFAULT_PRIORITY + 99,
+                        **kw)
 
     return
 
+  @staticmethod
+  def _flow_key (msg):
+    return (msg.match.pack(), msg.priority)
+
+  @staticmethod
+  def _flow_value (msg):
+    return (''.join(a.pack() for a in msg.actions),
+            msg.idle_timeout, msg.hard_timeout, msg.flags)
+
+  def _emit_flow (self, dpid, msg):
+    """Collect msg while the desired flow table is being built,
+    otherwise send it and record it in the shadow flow table."""
+    key = self._flow_key(msg)
+    if self._desired_flows is not None:
+      self._desired_flows[key] = msg
+      return
+    self._record_flow(dpid, msg)
+    self._queue_msg(dpid, msg.pack())
+
+  def _record_flow (self, dpid, msg, installed = True):
+    "Add msg to (or remove it from) the shadow flow table of dpid."
+    table = self._flow_tables.get(dpid)
+    if table is None:
+      return
+    if installed:
+      table[self._flow_key(msg)] = msg
+    else:
+      table.pop(self._flow_key(msg), None)
+
+  def _queue_msg (self, dpid, data):
+    self._batches.setdefault(dpid, []).append(data)
+
+  def _flush_batch (self, dpid):
+    """Send the queued messages of dpid in a single write closed by a
+    barrier.  The barrier reply tells when the switch has applied
+    the batch."""
+    batch = self._batches.pop(dpid, [])
+    if not batch:
+      return
+    con = core.openflow.getConnection(dpid)
+    if con is None:
+      log.warn("%s: dropping %i messages, not connected" %
+               (dpid_to_str(dpid), len(batch)))
+      return
+    num = len(batch)
+    def installed (dpid, rtt):
+      self.install_latency[dpid] = rtt
+      self.recorder.record('install', rtt, dpid=dpid)
+      log.debug('%s installed %i messages in %.3fs' %
+                (dpid_to_str(dpid), num, rtt))
+      if self._convergence:
+        self._convergence['pending'].discard(dpid)
+        self._check_convergence()
+    batch.append(self._barrier_request(dpid, installed))
+    if self._convergence:
+      self._convergence['pending'].add(dpid)
+    con.send(''.join(batch))
+
+  def _flush_batches (self):
+    for dpid in self._batches.keys():
+      self._flush_batch(dpid)
+
+  def _check_convergence (self):
+    c = self._convergence
+    if c is None or c['open'] or c['pending']:
+      return
+    self._convergence = None
+    duration = time.time() - c['start']
+    self.recorder.record('convergence', duration)
+    log.info('flow tables converged on %i switches in %.3fs' %
+             (c['switches'], duration))
+
   def _add_failover_entry (self, str_node, msg):
     if not hasattr(self, '_failover_entries'):
       self._failover_entries = {}
       self._failover_del_entries = {}
+      self._failover_flows = {}
     if not str_node in self._failover_entries:
       self._failover_entries[str_node] = []
       self._failover_del_entries[str_node] = []
+      self._failover_flows[str_node] = []
 
     self._failover_entries[str_node].append(msg.pack())
+    self._failover_flows[str_node].append(msg)
     msg.command=of.OFPFC_DELETE_STRICT
     self._failover_del_entries[str_node].append(msg.pack())
 
 
+  def _send_failover_entries (self, con, entries, kind):
+    def installed (dpid, rtt):
+      self.recorder.record(kind, rtt, dpid=dpid)
+    con.send(''.join(entries + [self._barrier_request(con.dpid, installed)]))
+
   def _install_failover_entries (self, str_node):
     dpid = core.Outband.t.name(str_node).dpid
     con = core.openflow.getConnection(dpid)
-    for packed_msg in self._failover_entries[str_node]:
-      con.send(packed_msg)
+    for msg in self._failover_flows[str_node]:
+      self._record_flow(dpid, msg)
+    self._send_failover_entries(con, self._failover_entries[str_node],
+                                'reroute_install')
 
   def _delete_failover_entries (self, str_node):
     dpid = core.Outband.t.name(str_node).dpid
     con = core.openflow.getConnection(dpid)
-    for packed_msg in self._failover_del_entries[str_node]:
-      con.send(packed_msg)
+    for msg in self._failover_flows[str_node]:
+      self._record_flow(dpid, msg, installed = False)
+    self._send_failover_entries(con, self._failover_del_entries[str_node],
+                                'reroute_delete')
     #log.warn('_delete_failover_entries %s' % str_node)
 
   def _clear_flowtable (self, dpid):
     msg = of.ofp_flow_mod(match=of.ofp_match(),command=of.OFPFC_DELETE)
-    core.openflow.sendToDPID(dpid, msg.pack())
+    self._queue_msg(dpid, msg.pack())
 
-  def _install_port_down (self, dpid, port_no, down = True, duration = 60,
-                          write_log = False):
-    "Simulate port_down by dropping all incoming packets."
+  def _install_port_down (self, dpid, port_no, down = True, duration = 60):
+    """Simulate port_down by dropping all incoming packets.  The time
+    since the previous port change is recorded."""
     con = core.openflow.getConnection(dpid)
     p = con.ports[port_no]
     if down:
@@ -214,15 +323,12 @@ class ProactiveRouting (object):
       command = of.OFPFC_DELETE_STRICT
     now = time.time()
     if self.prev_change_port is None:
-      diff_str = "*"
+      diff = None
     else:
-      diff_str = now - self.prev_change_port
+      diff = now - self.prev_change_port
     self.prev_change_port = now
-    #log.info('%s CHANGE_PORT( dpid:%s, port_no:%s, dir:%s ) %s' %
-    #         (time.time(), dpid, port_no, s, diff_str))
-    if write_log:
-      self.log_file.write("%s\n" % diff_str)
-      self.log_file_last.write("%s\n" % diff_str)
+    self.recorder.record('port_' + s, diff, dpid=dpid, port=port_no,
+                         when=now)
 
     match = of.ofp_match(in_port = port_no)
     match.in_port = port_no
@@ -234,24 +340,38 @@ class ProactiveRouting (object):
                           actions=actions,
                           priority=0xffff, # maximal
                           match=match)
-    
+    # so that a reconcile removes a drop entry that is still installed
+    self._record_flow(dpid, msg, installed = down)
     con.send(msg.pack())
     self._send_barrier(con)
     return
 
-  def _send_barrier (self, con):
+  def _send_barrier (self, con, callback = None):
+    con.send(self._barrier_request(con.dpid, callback))
+    #log.info("barrier sent to %s" % con.dpid)
+
+  def _barrier_request (self, dpid, callback = None):
+    """Return a packed barrier request to dpid.  If callback is given,
+    it is called with (dpid, rtt) when the reply arrives, and the reply
+    is not logged."""
     barrier_xid = self._xid_generator()
-    self._pending_barriers[barrier_xid] = time.time()
-    con.send(of.ofp_barrier_request(xid=barrier_xid))
-    #log.info("barrier (%s) sent to %s" % (barrier_xid, con.dpid))
+    self._pending_barriers[barrier_xid] = (dpid, time.time())
+    if callback:
+      self._barrier_callbacks[barrier_xid] = callback
+    return of.ofp_barrier_request(xid=barrier_xid).pack()
 
   def _handle_BarrierIn (self, barrier):
     xid = barrier.xid
     dpid = barrier.dpid
+    if xid in self._barrier_callbacks:
+      rtt = time.time() - self._pending_barriers.pop(xid)[1]
+      self._barrier_callbacks.pop(xid)(dpid, rtt)
+      return EventHalt
     if xid in self._pending_barriers:
-      start = self._pending_barriers[xid]
+      start = self._pending_barriers[xid][1]
       end = time.time()
       rtt = end - start
+      self.recorder.record('barrier_rtt', rtt, dpid=dpid, when=end)
       #log.info('%s barrier arrived with %f, remaining: %i' %
       #         (dpid_to_str(dpid), rtt,
       #          len(self._pending_barriers)))
@@ -260,8 +380,7 @@ class ProactiveRouting (object):
         a = self._prev_barrier_arrived[dpid]
         #log.info("%s diff between barrier rtts: %f" % 
         #         (dpid_to_str(dpid), rtt2-rtt))
-        self.barrier_log_file.write("%i %s\n" % (dpid, end-a))
-        self.barrier_log_file_last.write("%i %s\n" % (dpid, end-a))
+        self.recorder.record('barrier_gap', end - a, dpid=dpid, when=end)
 
         del self._prev_barrier_arrived[dpid]
       else:
@@ -275,20 +394,17 @@ class ProactiveRouting (object):
              (time.time(), event.dpid, event.port, 
               event.ofp.desc.show()))
 
-  def _flush_logs (self):
-    self.log_file.flush()
-    self.barrier_log_file.flush()
-    self.log_file_last.close()
-    self.barrier_log_file_last.close()
-    fsync(self.log_file)
-    fsync(self.barrier_log_file)
-    log.info('logs are flushed')
+  def _end_run (self):
+    self.recorder.end_run()
+    log.info('measurements are in %s' % self.recorder.filename)
+
+  def _handle_GoingDownEvent (self, event):
+    self.recorder.close()
 
   def emulate_link_failure (self, start, duration = 0, link='nl-hr',
                             reroute = 0, restore_reroute = True):
       self.prev_change_port = None
-      self.log_file_last = open("/tmp/pox_log_last", "w")
-      self.barrier_log_file_last = open("/tmp/barrier_log_last", "w")
+      self.recorder.start_run(link)
 
       n1, n2 = link.split('-')
       node_n1 = core.Outband.t.name(n1)
@@ -304,7 +420,7 @@ class ProactiveRouting (object):
       f = self._install_port_down
       core.callDelayed(start, f, n1_dpid, n1_port_to_n2, 1, duration)
       core.callDelayed(start, f, n2_dpid, n2_port_to_n1, 1, duration)
-      core.callDelayed(end,   f, n1_dpid, n1_port_to_n2, 0, duration, True)
+      core.callDelayed(end,   f, n1_dpid, n1_port_to_n2, 0, duration)
       core.callDelayed(end,   f, n2_dpid, n2_port_to_n1, 0, duration)
       if reroute:
         core.callDelayed(start+reroute, self._install_failover_entries, n1)
@@ -312,7 +428,7 @@ class ProactiveRouting (object):
       if reroute and restore_reroute:
         core.callDelayed(end+reroute, self._delete_failover_entries, n1)
         core.callDelayed(end+reroute, self._delete_failover_entries, n2)
-      core.callDelayed(end+reroute+1, self._flush_logs)
+      core.callDelayed(end+reroute+1, self._end_run)
 
   def _handle_magic_packet (self, addr):
 
@@ -396,9 +512,14 @@ class ProactiveRouting (object):
     return
 
   def reset_flowtables (self):
-    for dpid in core.openflow.connections.iterkeys():
+    dpids = list(core.openflow.connections.iterkeys())
+    self._convergence = {'start': time.time(), 'pending': set(),
+                         'open': True, 'switches': len(dpids)}
+    for dpid in dpids:
       self._reset_flowtable(dpid)
+    self._convergence['open'] = False
     log.info("reset_flowtables")
+    self._check_convergence()
 
   def _drop_ipv6 (self, dpid):
     match = of.ofp_match(dl_type = ethernet.IPV6_TYPE)
@@ -409,7 +530,7 @@ class ProactiveRouting (object):
                           hard_timeout=of.OFP_FLOW_PERMANENT,
                           priority=0xffff, # maximal
                           match=match)
-    core.openflow.sendToDPID(dpid, msg.pack())
+    self._emit_flow(dpid, msg)
 
   def _reset_flowtable (self, dpid):
     with reset_lock:
@@ -421,22 +542,109 @@ class ProactiveRouting (object):
       log.warn('reset_flowtable, unknown dpid: %s' % dpid)
       return
     str_node = core.Outband.t.dpid(dpid).name
-    self._clear_flowtable(dpid)
-    self._drop_ipv6(dpid)
 
-    for r, prop in core.Outband.t.routes:
-      port_src = core.Outband.t.get_port_to_name(r[0], r[1])
-      port_dst = core.Outband.t.get_port_to_name(r[-1], r[-2])
+    hops, protections = self._get_route_index()
+    self._desired_flows = {}
+    try:
+      self._drop_ipv6(dpid)
+      for hop, port_src, port_dst in hops.get(str_node, []):
+        self._install_hop(hop, port_src, port_dst)
+      for protection, routes in protections:
+        self._protect_link(protection, routes, str_node)
+      desired = self._desired_flows
+    finally:
+      self._desired_flows = None
+
+    self._reconcile_flowtable(dpid, desired)
+    return
 
+  def _get_route_index (self):
+    """Return ({switch name: [(hop, port_src, port_dst)]},
+    [(protection path, [(route, index of the link)])]) compiled from
+    the routes of the outband module.  The second list has an item for
+    every protected link, with the routes that traverse the link.
+
+    The index is cached until the topology changes.
+    """
+    if self._route_index is not None:
+      return self._route_index
+    hops = {}
+    protected_links = []        # in the order of the routes
+    protection_of = {}          # link -> the first path protecting it
+    for r, prop in core.Outband.t.routes:
+      if 'protect' in prop:
+        protected_links.append(prop[-1])
+        for link in prop:
+          protection_of.setdefault(link, r)
+    traversing = dict((link, []) for link in protected_links)
+    for r, prop in core.Outband.t.routes:
       if 'protect' in prop:
-        link = prop[-1]
-        self._protect_link(link, str_node)
         continue
+      seen = set()
+      for i, (n1, n2) in enumerate(zip(r, r[1:])):
+        # only the first occurrence of a node counts
+        if n1 in seen:
+          continue
+        seen.add(n1)
+        link = '%s-%s' % (n1, n2)
+        if link in traversing:
+          traversing[link].append((r, i))
+      port_src = core.Outband.t.get_port_to_name(r[0], r[1])
+      port_dst = core.Outband.t.get_port_to_name(r[-1], r[-2])
       for p, c, n in zip(r[:-2], r[1:-1], r[2:]):
-        if c == str_node:
-          self._install_flow(p, c, n, port_src, port_dst)
-
-    return
+        hop = self._resolve_hop(p, c, n)
+        if hop:
+          hops.setdefault(c, []).append((hop, port_src, port_dst))
+    protections = []
+    for link in protected_links:
+      protection = protection_of.get(link)
+      if protection is None:
+        log.error('No protection path found for %s' % link)
+        continue
+      protections.append((protection, traversing[link]))
+    self._route_index = (hops, protections)
+    return self._route_index
+
+  def _reconcile_flowtable (self, dpid, desired):
+    """Bring the flow table of dpid to the desired state.
+
+    Only the differences from the shadow flow table are sent: new
+    entries first, then the modified ones, and deletions at the end,
+    so forwarding is not interrupted.  If the flow table is unknown,
+    it is cleared and everything is installed.
+    """
+    if core.openflow.getConnection(dpid) is None:
+      log.warn('reconcile_flowtable, not connected: %s' % dpid_to_str(dpid))
+      return
+    current = self._flow_tables.get(dpid)
+    if current is None:
+      self._clear_flowtable(dpid)
+      current = {}
+
+    added, modified, deleted = 0, 0, 0
+    for key, msg in desired.iteritems():
+      old = current.get(key)
+      if old is None:
+        msg.command = of.OFPFC_ADD
+        added += 1
+      elif self._flow_value(old) != self._flow_value(msg):
+        msg.command = of.OFPFC_MODIFY_STRICT
+        modified += 1
+      else:
+        continue
+      self._queue_msg(dpid, msg.pack())
+    for key, old in current.iteritems():
+      if key in desired:
+        continue
+      msg = of.ofp_flow_mod(command=of.OFPFC_DELETE_STRICT,
+                            match=old.match,
+                            priority=old.priority)
+      self._queue_msg(dpid, msg.pack())
+      deleted += 1
+    self._flow_tables[dpid] = desired
+    self._flush_batch(dpid)
+    log.debug('%s reconcile: %i added, %i modified, %i deleted' %
+              (dpid_to_str(dpid), added, modified, deleted))
 
   def _handle_ConnectionUp (self, event):
     try:
@@ -446,31 +654,81 @@ class ProactiveRouting (object):
       return
     log.debug("ConnectionUp: %s %s" % (event.connection, str_node))
 
+    # the flow table of a (re)connected switch is unknown
+    self._flow_tables.pop(event.dpid, None)
     core.callDelayed(4, self._reset_flowtable, event.dpid)
     return
 
+  def _handle_ConnectionDown (self, event):
+    self._flow_tables.pop(event.dpid, None)
+    self._batches.pop(event.dpid, None)
+    # the barriers of the switch will never be answered
+    for xid, (dpid, start) in self._pending_barriers.items():
+      if dpid == event.dpid:
+        del self._pending_barriers[xid]
+        self._barrier_callbacks.pop(xid, None)
+    self._prev_barrier_arrived.pop(event.dpid, None)
+    if self._convergence:
+      self._convergence['pending'].discard(event.dpid)
+      self._check_convergence()
+
   def _handle_OutbandTopologyChanged (self, event):
+    self._route_index = None
     self.reset_flowtables()
 
-  def _protect_link (self, link, str_node):
-    n1, n2 = link.split('-')
-    protection = None
-    for r, prop in core.Outband.t.routes:
-      if link in prop and 'protect' in prop:
-        protection = r
-        break
-    if protection == None:
-      log.error('No protection path found for %s' % link)
-      return
-    for r, prop in core.Outband.t.routes:
+  def _handle_OutbandTopologyDelta (self, event):
+    "Install the new routes only, keep the rest of the flow tables."
+    with reset_lock:
+      self._handle_OutbandTopologyDelta_0(event)
+
+  def _handle_OutbandTopologyDelta_0 (self, event):
+    self._route_index = None
+    # flow entries of removed routes can only be cleared by a reset
+    reset = set()
+    for r, prop in event.removed_routes:
+      for str_node in r[1:-1]:
+        node = core.Outband.t.name(str_node)
+        if node and core.openflow.getConnection(node.dpid):
+          reset.add(node.dpid)
+    for dpid in reset:
+      self._reset_flowtable_0(dpid)
+
+    def installable (str_node):
+      node = core.Outband.t.name(str_node)
+      if not node or node.dpid in reset:
+        return False
+      return core.openflow.getConnection(node.dpid) is not None
+
+    new = set()
+    for r, prop in event.routes:
+      new.add(tuple(r))
       if 'protect' in prop:
         continue
-      try:
-        start = r.index(n1)
-        if r[start+1] != n2:
-          continue
-      except (ValueError, IndexError):
+      port_src = core.Outband.t.get_port_to_name(r[0], r[1])
+      port_dst = core.Outband.t.get_port_to_name(r[-1], r[-2])
+      for p, c, n in zip(r[:-2], r[1:-1], r[2:]):
+        if installable(c):
+          self._install_flow(p, c, n, port_src, port_dst)
+
+    # Reroute the new routes that traverse a protected link (all the
+    # routes of the link if its protection path is new)
+    hops, protections = self._get_route_index()
+    for protection, routes in protections:
+      if tuple(protection) not in new:
+        routes = [(r, i) for r, i in routes if tuple(r) in new]
+      if not routes:
         continue
+      for str_node in set(protection):
+        if installable(str_node):
+          self._protect_link(protection, routes, str_node)
+    self._flush_batches()
+    log.info("installed %i new routes" % len(event.routes))
+
+  def _protect_link (self, protection, routes, str_node):
+    """Install the entries of str_node that reroute routes, the
+    (route, index of the link) pairs of a protected link, over the
+    protection path."""
+    for r, start in routes:
       port_src = core.Outband.t.get_port_to_name(r[0], r[1])
       port_dst = core.Outband.t.get_port_to_name(r[-1], r[-2])
       pp = protection
@@ -487,5 +745,5 @@ class ProactiveRouting (object):
 
     return
 
-def launch ():
-  core.register("routing", ProactiveRouting())
+def launch (metrics_dir = DEFAULT_METRICS_DIR):
+  core.register("routing", ProactiveRouting(metrics_dir))
@@ -0,0 +1,166 @@
+# Copyright (c) 2013 Felician Nemeth
+#
+# This file is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This file is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with POX.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Records experiment measurements as CSV files.
+
+  recorder = Recorder('/tmp/pox_metrics')
+  recorder.start_run('failover')
+  recorder.record('barrier_rtt', rtt, dpid=dpid)
+  recorder.end_run()
+
+A record is a line of 'time,kind,dpid,port,value'.  The time is taken
+when record() is called, but the file is written by a background
+thread, so the caller never waits for the disk.  The records in the
+queue of the writer are limited: over 'max_queue', a record is dropped
+and counted in 'dropped'.  start_run() and end_run() are never dropped
+and never wait.
+
+Every run is written to a new file (run-<date>-<time>-<n>-<label>.csv),
+'last.csv' is a symlink to the latest one.  Records before the first
+run go to a 'session' file.  See tools/metrics_summary.py for a
+summary of the files.
+"""
+
+from Queue import Queue, Empty
+from pox.core import core
+import csv
+import os
+import threading
+import time
+
+DEFAULT_MAX_QUEUE        = 10000 # records
+CLOSE_TIMEOUT            = 5 # seconds to wait for the writer
+FIELDS = ('time', 'kind', 'dpid', 'port', 'value')
+
+_ROTATE = object()
+_SYNC = object()
+_STOP = object()
+
+log = core.getLogger()
+
+def read_records (filename):
+  "Yield the records of a file as dicts with float time and value"
+  with open(filename, 'rb') as f:
+    for row in csv.DictReader(f):
+      row['time'] = float(row['time'])
+      try:
+        row['value'] = float(row['value'])
+      except ValueError:
+        row['value'] = None
+      yield row
+
+class Recorder (object):
+  def __init__ (self, directory, max_queue = DEFAULT_MAX_QUEUE):
+    self.directory = directory
+    self.dropped = 0
+    self.runs = 0
+    self.filename = None        # file of the current run
+    self.max_queue = max_queue
+    # Unbounded, so that the control items fit; see record()
+    self._queue = Queue()
+    self._name = self._new_filename('session')
+    self._thread = threading.Thread(target=self._run, name='Recorder')
+    self._thread.daemon = True
+    self._thread.start()
+
+  def _new_filename (self, kind, label = None):
+    name = '%s-%s-%d' % (kind, time.strftime('%Y%m%d-%H%M%S'), self.runs)
+    if label:
+      name += '-' + label
+    return os.path.join(self.directory, name + '.csv')
+
+  def record (self, kind, value = None, dpid = None, port = None,
+              when = None):
+    if self._queue.qsize() >= self.max_queue:
+      self.dropped += 1
+      return
+    if when is None:
+      when = time.time()
+    self._queue.put_nowait((when, kind, dpid, port, value))
+
+  def start_run (self, label = 'run'):
+    "Write the following records to a new file"
+    self.runs += 1
+    self.filename = self._new_filename('run', label)
+    self._queue.put_nowait((_ROTATE, self.filename))
+
+  def end_run (self):
+    "Make the records of the run durable"
+    self._queue.put_nowait((_SYNC, None))
+    if self.dropped:
+      log.warn('%i records dropped' % self.dropped)
+
+  def close (self):
+    self._queue.put_nowait((_STOP, None))
+    self._thread.join(CLOSE_TIMEOUT)
+
+  # The rest runs in the writer thread.
+
+  def _open (self, filename):
+    if not os.path.isdir(self.directory):
+      os.makedirs(self.directory)
+    f = open(filename, 'wb')
+    writer = csv.writer(f)
+    writer.writerow(FIELDS)
+    last = os.path.join(self.directory, 'last.csv')
+    tmp = last + '.tmp'
+    try:
+      if os.path.lexists(tmp):
+        os.remove(tmp)
+      os.symlink(os.path.basename(filename), tmp)
+      os.rename(tmp, last)
+    except OSError:
+      pass
+    return f, writer
+
+  def _close (self, f):
+    if f is not None:
+      f.flush()
+      os.fsync(f.fileno())
+      f.close()
+
+  def _run (self):
+    f = writer = None
+    while True:
+      batch = [self._queue.get()]
+      try:
+        while len(batch) < 1000:
+          batch.append(self._queue.get_nowait())
+      except Empty:
+        pass
+      try:
+        for item in batch:
+          if item[0] is _ROTATE:
+            self._close(f)
+            f, writer = self._open(item[1])
+          elif item[0] is _SYNC:
+            if f is not None:
+              f.flush()
+              os.fsync(f.fileno())
+          elif item[0] is _STOP:
+            self._close(f)
+            return
+          else:
+            if f is None:
+              f, writer = self._open(self._name)
+            when, kind, dpid, port, value = item
+            writer.writerow(('%.6f' % when, kind,
+                             '' if dpid is None else dpid,
+                             '' if port is None else port,
+                             '' if value is None else repr(value)))
+        if f is not None:
+          f.flush()
+      except (IOError, OSError) as e:
+        log.error('%s' % e)
@@ -0,0 +1,268 @@
+# Copyright (c) 2013 Felician Nemeth
+#
+# This file is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This file is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with POX.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Polls the statistics of the switches on behalf of other modules.
+
+A module subscribes with a poll period, a function telling which
+requests to send to a switch, and a handler of the replies:
+
+  sub = core.StatsPoller.subscribe(3, lambda dpid: [PORT_STATS], handler)
+
+Requests are keys: (PORT, port_no), (FLOW,) or (AGGREGATE, out_port).
+The handler is called as handler(dpid, key, stats, sample_time), where
+sample_time is the midpoint of the request and its reply.
+
+Polls are kept in a heap.  The polls of the switches are spread evenly
+over the period (with some jitter), so switches connecting at once are
+not polled at once.  A switch has at most 'max_outstanding' requests
+in flight; the rest wait in a queue.  A request that is already queued
+or in flight is not sent again if another subscriber asks for it, the
+reply is delivered to both.
+"""
+
+from collections import deque
+from pox.core import core
+from pox.lib.recoco import Timer
+import pox.openflow.libopenflow_01 as of
+import heapq
+import random
+import time
+
+PORT = 'port'
+FLOW = 'flow'
+AGGREGATE = 'aggregate'
+PORT_STATS = (PORT, of.OFPP_NONE)
+FLOW_STATS = (FLOW,)
+
+DEFAULT_MAX_OUTSTANDING  = 4
+DEFAULT_JITTER           = 0.05 # relative to the period
+MIN_TIMEOUT              = 1 # seconds
+MAX_LATE                 = 60 # seconds a late reply still counts for the rtt
+RTT_GAIN                 = 1 / 8.0 # weight of a new rtt sample
+GOLDEN_RATIO             = 0.6180339887
+
+log = core.getLogger()
+
+def make_request (key):
+  "Build the ofp_stats_request of a request key"
+  kind = key[0]
+  if kind == PORT:
+    body = of.ofp_port_stats_request(port_no=key[1])
+  elif kind == FLOW:
+    body = of.ofp_flow_stats_request()
+  elif kind == AGGREGATE:
+    body = of.ofp_aggregate_stats_request(out_port=key[1])
+  else:
+    raise ValueError('unknown stats request: %s' % (key,))
+  return of.ofp_stats_request(body=body)
+
+class Subscription (object):
+  def __init__ (self, poller, period, requests, handler):
+    self.poller = poller
+    self.period = period
+    self.requests = requests
+    self.handler = handler
+    self.periods = {}           # dpid -> period, if not the default
+
+  def set_period (self, dpid, period):
+    "Change the poll period of a switch, effective from the next poll"
+    if period == self.period:
+      self.periods.pop(dpid, None)
+    else:
+      self.periods[dpid] = period
+
+  def get_period (self, dpid):
+    return self.periods.get(dpid, self.period)
+
+  def cancel (self):
+    self.poller._subscriptions.discard(self)
+
+class Request (object):
+  __slots__ = ('key', 'xid', 'sent', 'subscribers')
+
+  def __init__ (self, key):
+    self.key = key
+    self.xid = None
+    self.sent = None
+    self.subscribers = []
+
+class Switch (object):
+  def __init__ (self, dpid, index):
+    self.dpid = dpid
+    self.index = index          # order of connection, for staggering
+    self.rtt = None
+    self.queue = deque()        # Requests waiting to be sent
+    self.by_key = {}            # key -> queued or outstanding Request
+    self.by_xid = {}            # xid -> outstanding Request
+    self.expired = {}           # xid -> send time of an expired Request
+
+class StatsPoller (object):
+  def __init__ (self, max_outstanding = DEFAULT_MAX_OUTSTANDING,
+                jitter = DEFAULT_JITTER):
+    self.max_outstanding = max_outstanding
+    self.jitter = jitter
+    self.switches = {}
+    self._subscriptions = set()
+    self._heap = []             # (time, seq, subscription, switch)
+    self._seq = 0
+    self._connections = 0
+    self._timer = None
+    self._wake = None
+    core.listen_to_dependencies(self, ['openflow'])
+
+  def subscribe (self, period, requests, handler):
+    sub = Subscription(self, period, requests, handler)
+    self._subscriptions.add(sub)
+    now = time.time()
+    for sw in self.switches.itervalues():
+      self._push(now + self._offset(sw, period), sub, sw)
+    self._schedule()
+    return sub
+
+  def rtt (self, dpid):
+    "Smoothed round-trip time of the stats requests of dpid (or None)"
+    sw = self.switches.get(dpid)
+    return sw.rtt if sw else None
+
+  def _offset (self, sw, period):
+    # a low-discrepancy sequence keeps the switches evenly spread for
+    # any number of them
+    phase = (sw.index * GOLDEN_RATIO) % 1
+    return period * (phase + random.uniform(0, self.jitter))
+
+  def _push (self, when, sub, sw):
+    self._seq += 1
+    heapq.heappush(self._heap, (when, self._seq, sub, sw))
+
+  def _schedule (self):
+    "Make sure the timer fires at the earliest poll"
+    if not self._heap:
+      return
+    when = self._heap[0][0]
+    if self._wake is None or when < self._wake:
+      if self._timer:
+        self._timer.cancel()
+      self._wake = when
+      self._timer = Timer(when, self._run_due, absoluteTime=True)
+
+  def _run_due (self):
+    self._timer = None
+    self._wake = None
+    now = time.time()
+    heap = self._heap
+    while heap and heap[0][0] <= now:
+      when, seq, sub, sw = heapq.heappop(heap)
+      if sub not in self._subscriptions:
+        continue
+      if self.switches.get(sw.dpid) is not sw:
+        continue                # disconnected
+      self._poll(sub, sw, now)
+      period = sub.get_period(sw.dpid)
+      jitter = period * random.uniform(-self.jitter, self.jitter)
+      self._push(max(when + period, now) + jitter, sub, sw)
+    self._schedule()
+
+  def _poll (self, sub, sw, now):
+    self._expire(sw, now)
+    try:
+      keys = sub.requests(sw.dpid)
+    except Exception:
+      log.exception('%s: stats subscriber failed' % sw.dpid)
+      return
+    for key in keys:
+      req = sw.by_key.get(key)
+      if req is None:
+        req = sw.by_key[key] = Request(key)
+        sw.queue.append(req)
+      if sub not in req.subscribers:
+        req.subscribers.append(sub)
+    self._send_queued(sw, now)
+
+  def _send_queued (self, sw, now):
+    while sw.queue and len(sw.by_xid) < self.max_outstanding:
+      req = sw.queue.popleft()
+      msg = make_request(req.key)
+      req.xid = msg.xid
+      req.sent = now
+      sw.by_xid[req.xid] = req
+      core.openflow.sendToDPID(sw.dpid, msg.pack())
+
+  def _update_rtt (self, sw, rtt):
+    sw.rtt = rtt if sw.rtt is None else sw.rtt + RTT_GAIN * (rtt - sw.rtt)
+
+  def _expire (self, sw, now):
+    "Forget requests the switch is not going to answer"
+    for xid, sent in sw.expired.items():
+      if now - sent > MAX_LATE:
+        del sw.expired[xid]
+    for xid, req in sw.by_xid.items():
+      period = max(sub.get_period(sw.dpid) for sub in req.subscribers)
+      timeout = max(MIN_TIMEOUT, 2 * period, 4 * (sw.rtt or 0))
+      if now - req.sent > timeout:
+        log.debug('%s: lost stats request %s' % (sw.dpid, req.key))
+        del sw.by_xid[xid]
+        del sw.by_key[req.key]
+        sw.expired[xid] = req.sent
+
+  def _handle_reply (self, event):
+    sw = self.switches.get(event.connection.dpid)
+    if sw is None:
+      return
+    ofp = event.ofp
+    if isinstance(ofp, list):
+      ofp = ofp[0]
+    req = sw.by_xid.pop(ofp.xid, None)
+    if req is None:
+      sent = sw.expired.pop(ofp.xid, None)
+      if sent is not None:
+        # Too late for the subscribers, but it tells how slow the
+        # switch is, so the next requests wait long enough.
+        self._update_rtt(sw, time.time() - sent)
+      return
+    del sw.by_key[req.key]
+    now = time.time()
+    rtt = now - req.sent
+    self._update_rtt(sw, rtt)
+    sample_time = req.sent + rtt / 2
+    for sub in req.subscribers:
+      if sub in self._subscriptions:
+        try:
+          sub.handler(sw.dpid, req.key, event.stats, sample_time)
+        except Exception:
+          log.exception('%s: stats handler failed' % sw.dpid)
+    self._send_queued(sw, now)
+
+  _handle_openflow_PortStatsReceived = _handle_reply
+  _handle_openflow_FlowStatsReceived = _handle_reply
+  _handle_openflow_AggregateFlowStatsReceived = _handle_reply
+
+  def _handle_openflow_ConnectionUp (self, event):
+    if event.dpid in self.switches:
+      return
+    sw = Switch(event.dpid, self._connections)
+    self._connections += 1
+    self.switches[event.dpid] = sw
+    now = time.time()
+    for sub in self._subscriptions:
+      self._push(now + self._offset(sw, sub.period), sub, sw)
+    self._schedule()
+
+  def _handle_openflow_ConnectionDown (self, event):
+    self.switches.pop(event.dpid, None)
+
+def launch (max_outstanding = DEFAULT_MAX_OUTSTANDING,
+            jitter = DEFAULT_JITTER):
+  if not core.hasComponent('StatsPoller'):
+    core.registerNew(StatsPoller, int(max_outstanding), float(jitter))
@@ -0,0 +1,137 @@
+# Copyright (c) 2013 Felician Nemeth
+#
+# This file is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This file is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with POX.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Fixed-size store of numeric time series.
+
+Every series is kept at several resolutions.  A resolution is a ring
+of 'size' buckets of 'resolution' seconds each, held in preallocated
+arrays, so memory does not grow with time: a bucket is reused once
+its slot is 'size' buckets old.  A sample is added to a bucket of each
+resolution, which keeps the sum, the number and the maximum of its
+samples.
+
+  store = Store()
+  store.add('S1-S2', time.time(), 1200.0)
+  store.query('S1-S2', time.time() - 600, resolution=10)
+  # -> [(bucket start, average, maximum), ...]
+"""
+
+from array import array
+
+# (seconds per bucket, number of buckets): 10 minutes, 6 hours, 1 day
+DEFAULT_RESOLUTIONS = ((1, 600), (10, 2160), (60, 1440))
+
+class Ring (object):
+  "Buckets of one resolution"
+  def __init__ (self, resolution, size):
+    self.resolution = resolution
+    self.size = size
+    self.slots = array('l', [-1]) * size  # slot number of the buckets
+    self.sums = array('d', [0.0]) * size
+    self.counts = array('I', [0]) * size
+    self.maxs = array('d', [0.0]) * size
+    self.last = -1                        # newest slot number
+
+  def add (self, when, value):
+    slot = int(when // self.resolution)
+    if slot <= self.last - self.size:
+      return                              # too old to keep
+    i = slot % self.size
+    if self.slots[i] != slot:
+      self.slots[i] = slot
+      self.sums[i] = value
+      self.counts[i] = 1
+      self.maxs[i] = value
+    else:
+      self.sums[i] += value
+      self.counts[i] += 1
+      if value > self.maxs[i]:
+        self.maxs[i] = value
+    if slot > self.last:
+      self.last = slot
+
+  def oldest (self):
+    "Start of the oldest bucket that may still be kept"
+    return (self.last - self.size + 1) * self.resolution
+
+  def query (self, start = None, end = None):
+    "List of (bucket start, average, maximum) between start and end"
+    res = self.resolution
+    first = self.last - self.size + 1
+    if start is not None:
+      first = max(first, int(start // res))
+    last = self.last
+    if end is not None:
+      last = min(last, int(end // res))
+    result = []
+    slots, sums, counts, maxs = self.slots, self.sums, self.counts, self.maxs
+    size = self.size
+    for slot in xrange(first, last + 1):
+      i = slot % size
+      if slots[i] == slot:
+        result.append((slot * res, sums[i] / counts[i], maxs[i]))
+    return result
+
+class Series (object):
+  "A time series kept at several resolutions"
+  def __init__ (self, resolutions = DEFAULT_RESOLUTIONS):
+    self.rings = [Ring(r, s) for r, s in sorted(resolutions)]
+
+  def add (self, when, value):
+    for ring in self.rings:
+      ring.add(when, value)
+
+  def ring (self, resolution = None, start = None):
+    """
+    The finest ring not finer than 'resolution' that still covers
+    'start', or the coarsest one.
+    """
+    for ring in self.rings:
+      if resolution is not None and ring.resolution < resolution:
+        continue
+      if start is None or ring.oldest() <= start:
+        return ring
+    return self.rings[-1]
+
+  def query (self, start = None, end = None, resolution = None):
+    return self.ring(resolution, start).query(start, end)
+
+class Store (object):
+  "Series by key"
+  def __init__ (self, resolutions = DEFAULT_RESOLUTIONS):
+    self.resolutions = resolutions
+    self.series = {}
+
+  def keys (self):
+    return self.series.keys()
+
+  def add (self, key, when, value):
+    series = self.series.get(key)
+    if series is None:
+      series = self.series[key] = Series(self.resolutions)
+    series.add(when, value)
+
+  def resolution (self, key, resolution = None, start = None):
+    "Bucket size that query() would use"
+    series = self.series.get(key)
+    if series is None:
+      return None
+    return series.ring(resolution, start).resolution
+
+  def query (self, key, start = None, end = None, resolution = None):
+    series = self.series.get(key)
+    if series is None:
+      return []
+    return series.query(start, end, resolution)
@@ -15,26 +15,41 @@
 
 """
 Similary to the tinytopo module, this one sends (to a poxdesk
-application) the link utilization time series.  It is called "tiny"
-because it sends every information at each update.
+application) the link utilization time series.
+
+The samples are kept in a timeseries.Store, so hours of history are
+available at 1 s, 10 s and 60 s resolution.  New samples are sent to
+the channel as incremental appends:
+
+  {'append': {key: [[time, value], ...]}}
+
+A client may query the history.  'start' and 'end' are absolute times
+or, if negative, seconds relative to now:
+
+  {'cmd': 'query', 'start': -600, 'resolution': 10, 'keys': [...]}
+  -> {'series': {key: [[time, average, maximum], ...]}, 'resolution': 10}
+
+A client joining the channel gets the last 'history' seconds.
 """
 
-from collections import deque
 from pox.core import core
-from pox.lib.util import dpidToStr
 from pox.lib.recoco import Timer
 import pox.messenger as messenger
+from timeseries import Store
+import time
+
+DEFAULT_HISTORY          = 10 # seconds sent on join
 
 log = core.getLogger()
 
 class TinyLink (messenger.ChannelBot):
-  def __init__ (self):
+  def __init__ (self, history = DEFAULT_HISTORY):
     core.listen_to_dependencies(self, components=['MessengerNexus', 'FlowStat'])
     #core.FlowStat.addListeners(self)
     self.pending = False
-    self.keys  = ['n1-nl', 'n1-de']
-    self.keys  = ['subflow 1', 'subflow 2']
-    self.data = {}
+    self.history = history
+    self.store = Store()
+    self.appends = {}           # key -> [[time, value], ...] not sent yet
 
   def _all_dependencies_met (self):
     self._startup("link_util")
@@ -47,6 +62,51 @@ class TinyLink (messenger.ChannelBot):
     except AttributeError:
       return "%i:%i" % (dpid, port)
 
+  def query (self, keys = None, start = None, end = None, resolution = None):
+    """Return (resolution, {key: [(time, average, maximum), ...]})
+
+    Every series is at the same resolution: the coarsest one that any
+    of the keys needs to cover 'start'.
+    """
+    now = time.time()
+    if start is not None and start < 0:
+      start += now
+    if end is not None and end < 0:
+      end += now
+    if keys is None:
+      keys = self.store.keys()
+    used = None
+    for key in keys:
+      r = self.store.resolution(key, resolution, start)
+      if r is not None and (used is None or r > used):
+        used = r
+    if used is None:
+      used = resolution
+    series = dict((key, self.store.query(key, start, end, used))
+                  for key in keys)
+    return used, series
+
+  def _join (self, event, connection, msg):
+    resolution, series = self.query(start=-self.history)
+    connection.send(dict(CHANNEL=self.channel.name, series=series,
+                         resolution=resolution))
+
+  def _exec_cmd_query (self, event):
+    msg = event.msg
+    try:
+      keys = msg.get('keys')
+      start = msg.get('start')
+      end = msg.get('end')
+      resolution = msg.get('resolution')
+      start = float(start) if start is not None else None
+      end = float(end) if end is not None else None
+      resolution = float(resolution) if resolution is not None else None
+    except (TypeError, ValueError):
+      log.warn('bad query: %s' % msg)
+      return
+    resolution, series = self.query(keys, start, end, resolution)
+    self.reply(event, series=series, resolution=resolution)
+
   def send_data (self):
     if self.pending: return
     self.pending = True
@@ -55,28 +115,17 @@ class TinyLink (messenger.ChannelBot):
   def _do_send_data (self):
     assert self.pending
     self.pending = False
-
-    data = []
-    keys = []
-    for key, val in iter(sorted(self.data.items())):
-      l = list(val)
-      if sum(l) != 0:
-        data.append(l)
-        keys.append(key)
-    if len(data) == 0:
-      data = [[0] * 10]
-      keys = ["no traffic"]
-
-    self.send(data=data, keys=keys)
+    appends, self.appends = self.appends, {}
+    if appends:
+      self.send(append=appends)
 
   def _handle_FlowStat_FlowStatEvent (self, event):
     util = event.bw
     key = self.get_key(event.dpid, event.port)
-    if key not in self.data:
-      self.data[key] = deque( [0] * 10, maxlen=10 );
-    self.data[key].append(util)
+    self.store.add(key, event.when, util)
+    self.appends.setdefault(key, []).append([event.when, util])
     self.send_data()
     #log.debug('dpid:%s, port:%s, bw:%s' % (event.dpid, port, util))
 
-def launch ():
-  core.registerNew(TinyLink)
+def launch (history = DEFAULT_HISTORY):
+  core.registerNew(TinyLink, float(history))
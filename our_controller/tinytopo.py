@@ -19,19 +19,37 @@
 This module extends the tinytopo of poxdesk with
   - sending link utilization information,
   - listening to host_tracker events,
+  - sending versioned deltas instead of the whole topology.
 
+A client gets a snapshot when it joins the channel or sends a refresh
+command:
+
+  {'topo': {'version': v, 'switches': {name: {...}}, 'links': [[a, b, util]]}}
+
+Then changes are coalesced and sent at most 'max_rate' times a second:
+
+  {'topo_delta': {'version': v + 1, 'base': v,
+                  'switches': {name: {...}}, 'removed_switches': [name],
+                  'links': [[a, b, util]], 'removed_links': [[a, b]]}}
+
+A client whose version differs from 'base' should ask for a refresh.
+Messages are encoded once and the same string is sent to every client.
 """
 
 from pox.core import core
 from pox.lib.util import dpidToStr
-import pox.messenger as messenger
+from pox.lib.recoco import Timer
 import poxdesk.tinytopo as parent
+import json
+import time
 
+DEFAULT_MAX_RATE         = 2 # deltas per second
+COALESCE_DELAY           = .2 # seconds
 
 log = core.getLogger()
 
 class TinyUtilTopo (parent.TinyTopo):
-  def __init__ (self):
+  def __init__ (self, max_rate = DEFAULT_MAX_RATE):
     parent.TinyTopo.__init__(self)
     core.listen_to_dependencies(self, components=['LinkUtil'])
     core.LinkUtil.addListeners(self)
@@ -39,6 +57,12 @@ class TinyUtilTopo (parent.TinyTopo):
     self.node_type = {}
     self.min = None
     self.max = None
+    self.min_interval = 1.0 / max_rate if max_rate > 0 else 0
+    self.version = 0
+    self._switches = {}         # published state: name -> dict
+    self._links = {}            # published state: (a, b) -> util
+    self._last_send = 0
+    self._snapshot = None       # (version, encoded, message)
 
   def _add_position (self, d, switch):
     try:
@@ -68,9 +92,7 @@ class TinyUtilTopo (parent.TinyTopo):
       return
     d['latitude'], d['longitude'] = lat, lon
 
-  def _do_send_table (self):
-    assert self.pending
-    self.pending = False
+  def _current_state (self):
     switches = {}
     for s in self.switches:
       d = {'label':s}
@@ -79,7 +101,7 @@ class TinyUtilTopo (parent.TinyTopo):
       #self._add_position(d, s)
       self._add_geo_coord(d, s)
       switches[s] = d
-    edges = []
+    edges = {}
     for e in self.links:
       if e[0] not in switches: continue
       if e[1] not in switches: continue
@@ -90,12 +112,59 @@ class TinyUtilTopo (parent.TinyTopo):
           continue
       except AttributeError:
         pass
-      edges.append(e + (util,))
+      edges[e] = util
+    return switches, edges
+
+  def send_table (self):
+    if self.pending: return
+    self.pending = True
+    delay = max(COALESCE_DELAY,
+                self._last_send + self.min_interval - time.time())
+    Timer(delay, self._do_send_table, recurring=False)
+
+  def _do_send_table (self):
+    assert self.pending
+    self.pending = False
+    switches, links = self._current_state()
+    delta = {
+      'switches': dict((s, d) for s, d in switches.iteritems()
+                       if self._switches.get(s) != d),
+      'removed_switches': [s for s in self._switches if s not in switches],
+      'links': [[a, b, u] for (a, b), u in links.iteritems()
+                if self._links.get((a, b)) != u],
+      'removed_links': [[a, b] for (a, b) in self._links
+                        if (a, b) not in links],
+    }
+    self._switches = switches
+    self._links = links
+    if not any(delta.itervalues()):
+      return
+    delta['base'] = self.version
+    self.version += 1
+    delta['version'] = self.version
+    self._last_send = time.time()
+    # the channel encodes it once for all the clients
+    self.send(topo_delta=delta)
+
+  def _get_snapshot (self):
+    "The encoded snapshot of the published state"
+    if self._snapshot is None or self._snapshot[0] != self.version:
+      topo = {'version': self.version,
+              'switches': self._switches,
+              'links': [[a, b, u] for (a, b), u in self._links.iteritems()]}
+      msg = {'topo': topo, 'CHANNEL': self.channel.name}
+      self._snapshot = (self.version, json.dumps(msg, default=str), msg)
+    return self._snapshot
+
+  def _send_snapshot (self, con):
+    version, data, msg = self._get_snapshot()
+    con.send_encoded(data, msg)
 
-    #print self.switches,switches
-    #print self.links,edges
+  def _join (self, event, connection, msg):
+    self._send_snapshot(connection)
 
-    self.send(topo={'links':edges,'switches':switches})
+  def _exec_cmd_refresh (self, event):
+    self._send_snapshot(event.con)
 
   def dpid_to_str (self, dpid):
     try:
@@ -211,5 +280,5 @@ class TinyUtilTopo (parent.TinyTopo):
     # refreshing poxdesk topoviewer
     self.send_table()
 
-def launch ():
-  core.registerNew(TinyUtilTopo)
+def launch (max_rate = DEFAULT_MAX_RATE):
+  core.registerNew(TinyUtilTopo, float(max_rate))
@@ -59,6 +59,7 @@ qx.Class.define("poxdesk.LinkUtilization",
       this._html.addListener("resize", this.on_resize, this);
       this.data = [[0,0,0,0,0,0,0,0,0,0]];
       this.keys = ['no traffic'];
+      this._series = {};
 
       this._messenger = new poxdesk.Messenger();
       this._messenger.start();
@@ -80,6 +81,33 @@ qx.Class.define("poxdesk.LinkUtilization",
     {
 	_myGraph : 0,
 
+	_update_data : function () {
+	    var data = [];
+	    var keys = [];
+	    var names = qx.lang.Object.getKeys(this._series).sort();
+	    for (var i = 0; i < names.length; i++) {
+		var values = this._series[names[i]];
+		var sum = 0;
+		for (var j = 0; j < values.length; j++) {
+		    sum += values[j];
+		}
+		if (sum == 0) {
+		    continue;
+		}
+		while (values.length < this._points) {
+		    values.unshift(0);
+		}
+		data.push(values);
+		keys.push(names[i]);
+	    }
+	    if (data.length == 0) {
+		data = [[0,0,0,0,0,0,0,0,0,0]];
+		keys = ['no traffic'];
+	    }
+	    this.data = data;
+	    this.keys = keys;
+	},
+
 	after_resize: function() {
 
 	    this._myGraph = new RGraph.Line(this._rgraph_id_str, this.data);
@@ -114,9 +142,37 @@ qx.Class.define("poxdesk.LinkUtilization",
 	    qx.event.Timer.once(this.after_resize, this, 20);
 	},
 
+	_points : 10,
+
+	// Latest values of the series by key
+	_series : null,
+
 	_on_message : function (msg) {
-	    this.data =  msg['data']
-	    this.keys =  msg['keys']
+	    if (msg['series']) {
+		for (var key in msg['series']) {
+		    var samples = msg['series'][key];
+		    var values = [];
+		    for (var i = 0; i < samples.length; i++) {
+			values.push(samples[i][1]);
+		    }
+		    this._series[key] = values.slice(-this._points);
+		}
+	    } else if (msg['append']) {
+		for (var key in msg['append']) {
+		    var values = this._series[key] || [];
+		    var samples = msg['append'][key];
+		    for (var i = 0; i < samples.length; i++) {
+			values.push(samples[i][1]);
+		    }
+		    this._series[key] = values.slice(-this._points);
+		}
+	    } else {
+		return;
+	    }
+	    this._update_data();
+	    if (!this._myGraph) {
+		return;
+	    }
 	    this._myGraph.original_data = this.data;
 	    this._myGraph.Set('chart.key', this.keys);
 	    RGraph.Redraw();
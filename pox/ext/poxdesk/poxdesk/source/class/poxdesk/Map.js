@@ -55,15 +55,19 @@ qx.Class.define("poxdesk.Map",
 
       this._nodes = {};
       this._edges = {};
+      this._topo_state = new poxdesk.TopoState(function () {
+	  this._messenger.send({'cmd':'refresh'}, 'poxdesk_topo');
+      }, this);
   },
 
   destruct : function() {
-    this._disposeObjects("_messenger");
+    this._disposeObjects("_messenger", "_topo_state");
   },
   
     members :
     {
 	_myGraph : 0,
+	_topo_state : null,
 
     _get_color : function (i)
     {
@@ -172,11 +176,12 @@ qx.Class.define("poxdesk.Map",
 	},
 
 	_on_message : function (data) {
-	  if (data.topo == undefined) {
+	  var topo = this._topo_state.update(data);
+	  if (!topo) {
 	    return;
 	  }
-	  var ne = data.topo.links;
-	  var nn = data.topo.switches;
+	  var ne = topo.links;
+	  var nn = topo.switches;
 
 	  var all_node_names = qx.lang.Object.clone(nn);
 	  var old_names = this._topo.get_nodes();
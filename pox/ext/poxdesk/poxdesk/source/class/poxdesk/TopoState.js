@@ -0,0 +1,107 @@
+/*
+  Copyright (c) 2013 Felician Nemeth
+  This file may be used under the terms of either the
+
+  * GNU Lesser General Public License (LGPL)
+    http://www.gnu.org/licenses/lgpl.html
+
+or the
+
+  * Eclipse Public License (EPL)
+    http://www.eclipse.org/org/documents/epl-v10.php
+*/
+
+/**
+ * The topology published on the poxdesk_topo channel, kept up to date
+ * by the snapshot and delta messages of tinytopo.
+ */
+qx.Class.define("poxdesk.TopoState",
+{
+  extend : qx.core.Object,
+
+  /**
+   * refresh is called (with context as this) to ask for a snapshot.
+   */
+  construct : function (refresh, context)
+  {
+    this.base(arguments);
+    this._refresh = refresh;
+    this._context = context;
+  },
+
+  statics :
+  {
+    // Milliseconds between two refresh requests
+    REFRESH_INTERVAL : 2000
+  },
+
+  members :
+  {
+    _state : null,      // null until a snapshot arrives
+    _refresh : null,
+    _context : null,
+    _refresh_sent : 0,  // time of the last refresh request
+
+    // Returns the whole topology after applying a snapshot or a delta
+    // message, or null if the message is not for us or a delta is
+    // missing.  Then a refresh is requested, and the deltas are
+    // ignored until the snapshot arrives.
+    update : function (data)
+    {
+      var state = this._state;
+      if (data.topo)
+      {
+        var links = {};
+        for (var i = 0; i < data.topo.links.length; i++)
+        {
+          var l = data.topo.links[i];
+          links[l[0] + " " + l[1]] = l;
+        }
+        state = {version: data.topo.version,
+                 switches: data.topo.switches, links: links};
+        this._refresh_sent = 0;
+      }
+      else if (data.topo_delta)
+      {
+        var delta = data.topo_delta;
+        if (!state || state.version !== delta.base)
+        {
+          this._state = null;
+          this._request_refresh();
+          return null;
+        }
+        qx.lang.Object.mergeWith(state.switches, delta.switches);
+        for (var i = 0; i < delta.removed_switches.length; i++)
+          delete state.switches[delta.removed_switches[i]];
+        for (var i = 0; i < delta.links.length; i++)
+        {
+          var l = delta.links[i];
+          state.links[l[0] + " " + l[1]] = l;
+        }
+        for (var i = 0; i < delta.removed_links.length; i++)
+        {
+          var l = delta.removed_links[i];
+          delete state.links[l[0] + " " + l[1]];
+        }
+        state.version = delta.version;
+      }
+      else
+      {
+        return null;
+      }
+      this._state = state;
+      return {switches: state.switches,
+              links: qx.lang.Object.getValues(state.links)};
+    },
+
+    // Asks for a snapshot, unless one was asked for recently.
+    _request_refresh : function ()
+    {
+      var now = new Date().getTime();
+      if (now - this._refresh_sent < poxdesk.TopoState.REFRESH_INTERVAL)
+        return;
+      this._refresh_sent = now;
+      this._refresh.call(this._context);
+    }
+  }
+});
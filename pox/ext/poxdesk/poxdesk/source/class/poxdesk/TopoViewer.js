@@ -87,6 +87,7 @@ this._canvas.addListener('redraw', function () {
 
 this._nodes = {};
 this._edges = {};
+this._topo_state = new poxdesk.TopoState(this.refresh, this);
 
   },
   
@@ -152,10 +153,11 @@ this._edges = {};
     _on_topo : function (data)
     {
       this.debug("LOG:" + JSON.stringify(data));
-      if (data.topo)
+      var topo = this._topo_state.update(data);
+      if (topo)
       {
-        var ne = data.topo.links;
-        var nn = data.topo.switches;
+        var ne = topo.links;
+        var nn = topo.switches;
 
         var all_node_names = qx.lang.Object.clone(nn);
         qx.lang.Object.mergeWith(all_node_names, this._nodes);
@@ -258,6 +260,7 @@ this._edges = {};
 
 
     _switches : null, // switches we know about
+    _topo_state : null, // last topology received
     _messenger : null,
     _container : null
     //_controls : null,
@@ -266,6 +269,6 @@ this._edges = {};
 
   destruct : function() {
     this._messenger.leave(this.chan);
-    this._disposeObjects("_messenger");
+    this._disposeObjects("_messenger", "_topo_state");
   }
 });
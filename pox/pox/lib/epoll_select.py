@@ -16,6 +16,7 @@
 # along with POX.  If not, see <http://www.gnu.org/licenses/>.
 
 import select
+from collections import OrderedDict
 
 class EpollSelect(object):
   """ a class that implements select.select() type behavior on top of epoll.
@@ -117,3 +118,104 @@ class EpollSelect(object):
 
   def close(self):
     self.epoll.close()
+
+
+class EpollReactor(object):
+  """ edge-triggered readiness of many objects on top of epoll.
+
+      Unlike EpollSelect, an object is registered once and stays registered
+      until unregister(), so a poll costs O(events) instead of O(objects).
+      Edge-triggered epoll reports an object only when new data arrives, so
+      poll() keeps the reported objects in 'ready' until the caller has read
+      them dry and calls idle().  Objects are watched for writability only
+      between want_write(obj) and want_write(obj, False).  The reactor
+      itself has a fileno(), so a whole set of objects can be waited for
+      with a single select() entry.
+  """
+
+  def __init__(self):
+    self.epoll = select.epoll()
+    # errors and hangups are reported as readable, the following read fails.
+    # (Not a class attribute: the module is imported where there is no epoll.)
+    self.read_mask = (select.EPOLLIN | select.EPOLLPRI | select.EPOLLERR |
+                      select.EPOLLHUP | select.EPOLLET)
+    self.fd_to_obj = {}
+    self.obj_to_fd = {}
+    # objects that may have unread data, in the order they became ready
+    self.ready = OrderedDict()
+
+  def fileno(self):
+    return self.epoll.fileno()
+
+  def register(self, obj):
+    """ watch obj for reading. It is initially ready, as data might have
+        arrived before registration.
+    """
+    fd = obj.fileno() if hasattr(obj, "fileno") else obj
+    old = self.fd_to_obj.get(fd)
+    if old is not None:
+      # a closed object that was not unregistered had this fd
+      self.ready.pop(old, None)
+      self.obj_to_fd.pop(old, None)
+    try:
+      self.epoll.register(fd, self.read_mask)
+    except (IOError, OSError):
+      self.epoll.modify(fd, self.read_mask)
+    self.fd_to_obj[fd] = obj
+    self.obj_to_fd[obj] = fd
+    self.ready[obj] = True
+
+  def unregister(self, obj):
+    """ stop watching obj. It is fine to call this for an already closed
+        object, or more than once.
+    """
+    self.ready.pop(obj, None)
+    fd = self.obj_to_fd.pop(obj, None)
+    if fd is None:
+      return
+    if self.fd_to_obj.get(fd) is not obj:
+      # obj was closed, and its fd has been reused by a newer object
+      return
+    del self.fd_to_obj[fd]
+    try:
+      self.epoll.unregister(fd)
+    except (IOError, OSError):
+      # closing the fd has already removed it
+      pass
+
+  def want_write(self, obj, on=True):
+    """ report obj in the writable list of poll() (while on is True) """
+    fd = self.obj_to_fd.get(obj)
+    if fd is None or self.fd_to_obj.get(fd) is not obj:
+      return
+    mask = self.read_mask | select.EPOLLOUT if on else self.read_mask
+    try:
+      self.epoll.modify(fd, mask)
+    except (IOError, OSError):
+      pass
+
+  def idle(self, obj):
+    """ obj has been read until it would block """
+    self.ready.pop(obj, None)
+
+  def poll(self, timeout=0):
+    """ collect the new events.
+        Returns the list of ready objects, and the list of objects that have
+        become writable.
+    """
+    writable = []
+    for (fd, event) in self.epoll.poll(timeout):
+      obj = self.fd_to_obj.get(fd)
+      if obj is None:
+        continue
+      if event & self.read_mask:
+        self.ready[obj] = True
+      if event & select.EPOLLOUT:
+        writable.append(obj)
+    return self.ready.keys(), writable
+
+  def close(self):
+    self.epoll.close()
+    self.fd_to_obj.clear()
+    self.obj_to_fd.clear()
+    self.ready.clear()
@@ -51,6 +51,14 @@ class MockSocket (object):
     """
     return self.receiving.recv(max_size)
 
+  def recv_into (self, buf, nbytes=0):
+    """
+    receive data into a writable buffer, like recv()
+    """
+    data = self.receiving.recv(nbytes or len(buf))
+    buf[:len(data)] = data
+    return len(data)
+
   def set_on_ready_to_recv (self, on_ready):
     """
     set a handler function on_ready(socket, size) to be called when
@@ -18,7 +18,7 @@
 from __future__ import print_function
 from collections import deque
 from Queue import PriorityQueue
-from Queue import Queue
+import heapq
 import time
 import threading
 from threading import Thread
@@ -27,7 +27,6 @@ import traceback
 import os
 import socket
 import pox.lib.util
-import random
 from pox.lib.epoll_select import EpollSelect
 
 CYCLE_MAXIMUM = 2
@@ -48,6 +47,7 @@ class BaseTask  (object):
   id = None
   #running = False
   priority = 1
+  _scheduled = False # In the ready queue of a scheduler
 
   @classmethod
   def new (cls, *args, **kw):
@@ -131,11 +131,64 @@ class Task (BaseTask):
     return "<" + self.__class__.__name__ + "/tid" + str(self.name) + ">"
 
 
+class ReadyQueue (object):
+  """
+  The Tasks ready to run, by priority
+
+  Tasks with a higher priority run first.  Tasks of the same priority
+  run in the order they became ready (round-robin, as a Task that yields
+  goes to the back of its class).  The SelectHub thread adds Tasks too,
+  but deque operations are atomic, so only adding a new priority class
+  takes a lock.
+  """
+  def __init__ (self):
+    self._queues = {}     # priority -> deque of Tasks
+    self._order = []      # the deques, highest priority first
+    self._lock = threading.Lock()
+
+  def __len__ (self):
+    n = 0
+    for q in self._order:
+      n += len(q)
+    return n
+
+  def _addClass (self, priority):
+    with self._lock:
+      q = self._queues.get(priority)
+      if q is None:
+        q = self._queues[priority] = deque()
+        self._order = [self._queues[p]
+                       for p in sorted(self._queues, reverse = True)]
+      return q
+
+  def push (self, task, first = False):
+    q = self._queues.get(task.priority)
+    if q is None:
+      q = self._addClass(task.priority)
+    task._scheduled = True
+    if first:
+      q.appendleft(task)
+    else:
+      q.append(task)
+
+  def pop (self):
+    """
+    Removes and returns the next Task, or None if there is none.
+    Only the thread of the scheduler pops.
+    """
+    for q in self._order:
+      if q:
+        task = q.popleft()
+        task._scheduled = False
+        return task
+    return None
+
+
 class Scheduler (object):
   """ Scheduler for Tasks """
   def __init__ (self, isDefaultScheduler = None, startInThread = True,
                 daemon = False, useEpoll=False):
-    self._ready = deque()
+    self._ready = ReadyQueue()
     self._hasQuit = False
     self._selectHub = SelectHub(self, useEpoll=useEpoll)
     self._thread = None
@@ -144,6 +197,7 @@ class Scheduler (object):
     self._lock = threading.Lock()
     self._callLaterTask = None
     self._allDone = False
+    self._afterCycle = []
 
     global defaultScheduler
     if isDefaultScheduler or (isDefaultScheduler is None and
@@ -171,6 +225,26 @@ class Scheduler (object):
 
     self._callLaterTask.callLater(func, *args, **kw)
 
+  def callAfterCycle (self, func, *args, **kw):
+    """
+    Calls func with the given arguments once the running Task yields.
+    This lets a Task batch up work done over one of its steps (e.g., the
+    messages sent while an event is handled).  Only call it from the
+    thread of the scheduler.
+    """
+    self._afterCycle.append((func, args, kw))
+
+  def _runAfterCycle (self):
+    while self._afterCycle:
+      calls = self._afterCycle
+      self._afterCycle = []
+      for func, args, kw in calls:
+        try:
+          func(*args, **kw)
+        except:
+          print("Exception after a cycle calling", func)
+          traceback.print_exc()
+
   def runThreaded (self, daemon = False):
     self._thread = Thread(target = self.run)
     self._thread.daemon = daemon
@@ -192,9 +266,7 @@ class Scheduler (object):
     if threading.current_thread() is self._thread:
       # We're know we're good.
       #TODO: Refactor the following with ScheduleTask
-      if task in self._ready:
-        # It might make sense to keep a flag on the task, since checking
-        # if it's in the ready list is not very efficient.
+      if task._scheduled:
         # Not sure if it makes sense to print out a message here or not.
         import logging
         logging.getLogger("recoco").info("Task %s scheduled multiple " +
@@ -228,25 +300,26 @@ class Scheduler (object):
     """
 
     # Sanity check.  Won't catch all cases.
-    assert task not in self._ready
+    assert not task._scheduled
 
-    if first:
-      self._ready.appendleft(task)
-    else:
-      self._ready.append(task)
+    self._ready.push(task, first)
 
     self._event.set()
 
   def quit (self):
     self._hasQuit = True
+    self._event.set()
 
   def run (self):
     try:
       while self._hasQuit == False:
         if len(self._ready) == 0:
-          self._event.wait(CYCLE_MAXIMUM) # Wait for a while
+          # Without a timeout: in Python 2, a wait with a timeout polls,
+          # and notices the event only up to 50 ms late.  Waking up a
+          # task (even by a timer of the SelectHub) sets the event.
+          self._event.wait()
           self._event.clear()
-          if self._hasQuit: break
+          continue
         r = self.cycle()
     finally:
       #print("Scheduler done")
@@ -255,19 +328,8 @@ class Scheduler (object):
       self._allDone = True
 
   def cycle (self):
-    #if len(self._ready) == 0: return False
-
-    # Patented hilarious priority system
-    #TODO: Replace it with something better
-    t = None
-    try:
-      while True:
-        t = self._ready.popleft()
-        if t.priority >= 1: break
-        if len(self._ready) <= 1: break
-        if t.priority >= random.random(): break
-        self._ready.append(t)
-    except IndexError:
+    t = self._ready.pop()
+    if t is None:
       return False
 
     #print(len(self._ready), "tasks")
@@ -283,6 +345,9 @@ class Scheduler (object):
       except:
         pass
       return True
+    finally:
+      if self._afterCycle:
+        self._runAfterCycle()
 
     if isinstance(rv, BlockingOperation):
       try:
@@ -299,7 +364,7 @@ class Scheduler (object):
       # Sleep time
       if rv == 0:
         #print "sleep 0"
-        self._ready.append(t)
+        self._ready.push(t)
       else:
         self._selectHub.registerTimer(t, rv)
     elif rv == None:
@@ -492,12 +557,16 @@ class SelectHub (object):
   a scheduler as well as timed wakes (i.e., Sleep()).
   """
   def __init__ (self, scheduler, useEpoll=False):
-    # We store tuples of (elapse-time, task)
+    # We store tuples of (elapse-time, seq, task, wait)
     self._sleepers = [] # Sleeping items stored as a heap
-    self._incoming = Queue() # Threadsafe queue for new items
+    self._incoming = deque() # New items (deque operations are atomic)
 
     self._scheduler = scheduler
     self._pinger = pox.lib.util.makePinger()
+    self._pinged = False
+    # When the wait thread wakes up next at the latest (infinity while it
+    # is not known)
+    self._wakeAt = float('inf')
     self.epoll = EpollSelect() if useEpoll else None
 
     self._ready = False
@@ -510,60 +579,72 @@ class SelectHub (object):
     #while self._ready == False:
 
   def _threadProc (self):
+    # task -> (task, rlist, wlist, xlist, timeout) of each waiting task
     tasks = {}
-    timeouts = []
-    rets = {}
+    # file-like object -> the task waiting for it
+    rl = {}
+    wl = {}
+    xl = {}
+    # The timeouts are in the heap of (time, seq, task, wait) items, where
+    # wait is what the task waited for.  An item is stale if the task has
+    # been woken up since (by IO); stale items are dropped as they come up,
+    # or all at once if there are many of them.
+    sleepers = self._sleepers
+    seq = 0
+
+    def wake (t, rv):
+      stuff = tasks.pop(t)
+      for fds, d in ((stuff[1], rl), (stuff[2], wl), (stuff[3], xl)):
+        if fds:
+          for i in fds:
+            if d.get(i) is t: del d[i]
+      self._return(t, rv)
 
     while self._scheduler._hasQuit == False:
       #print("SelectHub cycle")
 
-      if len(timeouts) == 0:
-        timeout = None
-      else:
-        timeout = self._sleepers[0][0] - time.time()
-        if timeout < 0: timeout = 0
-
-      #NOTE: Everything you select on eventually boils down to file descriptors,
-      #      which are unique, obviously.  It might be possible to leverage this
-      #      to reduce hashing cost (i.e. by picking a really good hashing
-      #      function), though this is complicated by wrappers, etc...
-      rl = {}
-      wl = {}
-      xl = {}
-
-      timeout = None
-      timeoutTask = None
-
-      now = time.time()
-
-      expired = None
-
-      for t,trl,twl,txl,tto in tasks.itervalues():
-        if tto != None:
-          if tto <= now:
-            # Already expired
-            if expired is None: expired = []
-            expired.append(t)
-            if tto-now > 0.1: print("preexpired",tto,now,tto-now)
-            continue
-          tt = tto - now
-          if tt < timeout or timeout is None:
-            timeout = tt
-            timeoutTask = t
-
+      # New items are pinged for until we know when we wake up next
+      self._wakeAt = float('inf')
+      while self._incoming:
+        stuff = self._incoming.popleft()
+        task, trl, twl, txl, tto = stuff
+        assert task not in tasks
+        tasks[task] = stuff
         if trl:
-          for i in trl: rl[i] = t
+          for i in trl: rl[i] = task
         if twl:
-          for i in twl: wl[i] = t
+          for i in twl: wl[i] = task
         if txl:
-          for i in txl: xl[i] = t
+          for i in txl: xl[i] = task
+        if tto is not None:
+          seq += 1
+          heapq.heappush(sleepers, (tto, seq, task, stuff))
 
-      if expired:
-        for t in expired:
-          del tasks[t]
-          self._return(t, ([],[],[]))
+      # Release the expired timeouts
+      now = time.time()
+      while sleepers:
+        tto, _, t, stuff = sleepers[0]
+        if tasks.get(t) is not stuff:
+          heapq.heappop(sleepers)
+        elif tto <= now:
+          heapq.heappop(sleepers)
+          wake(t, ([],[],[]))
+        else:
+          break
+      if len(sleepers) > 2 * len(tasks) + 64:
+        sleepers[:] = [s for s in sleepers if tasks.get(s[2]) is s[3]]
+        heapq.heapify(sleepers)
+
+      timeout = CYCLE_MAXIMUM
+      if sleepers:
+        timeout = min(timeout, sleepers[0][0] - now)
+      # A new timer later than this is picked up without a ping
+      self._wakeAt = now + timeout
 
-      if timeout is None: timeout = CYCLE_MAXIMUM
+      #NOTE: Everything you select on eventually boils down to file descriptors,
+      #      which are unique, obviously.  It might be possible to leverage this
+      #      to reduce hashing cost (i.e. by picking a really good hashing
+      #      function), though this is complicated by wrappers, etc...
       if self.epoll:
         ro, wo, xo = self.epoll.select( rl.keys() + [self._pinger],
                                   wl.keys(),
@@ -573,43 +654,22 @@ class SelectHub (object):
                                   wl.keys(),
                                   xl.keys(), timeout )
 
-      if len(ro) == 0 and len(wo) == 0 and len(xo) == 0 and timeoutTask != None:
-        # IO is idle - dispatch timers / release timeouts
-        del tasks[timeoutTask]
-        self._return(timeoutTask, ([],[],[]))
-      else:
-        # We have IO events
-        if self._pinger in ro:
-          self._pinger.pongAll()
-          while not self._incoming.empty():
-            stuff = self._incoming.get(True)
-            task = stuff[0]
-            assert task not in tasks
-            tasks[task] = stuff
-            self._incoming.task_done()
-          if len(ro) == 1 and len(wo) == 0 and len(xo) == 0:
-            # Just recycle
-            continue
-          ro.remove(self._pinger)
-
-        # At least one thread is going to be resumed
-        for i in ro:
-          task = rl[i]
-          if task not in rets: rets[task] = ([],[],[])
-          rets[task][0].append(i)
-        for i in wo:
-          task = wl[i]
+      if self._pinger in ro:
+        self._pinger.pongAll()
+        # Ping again for the items that come after this point
+        self._pinged = False
+        ro.remove(self._pinger)
+
+      rets = {}
+      for l, d, n in ((ro, rl, 0), (wo, wl, 1), (xo, xl, 2)):
+        for i in l:
+          task = d.get(i)
+          if task is None: continue
           if task not in rets: rets[task] = ([],[],[])
-          rets[task][1].append(i)
-        for i in xo:
-          task = xl[i]
-          if task not in rets: rets[task] = ([],[],[])
-          rets[task][2].append(i)
+          rets[task][n].append(i)
 
-        for t,v in rets.iteritems():
-          del tasks[t]
-          self._return(t, v)
-        rets.clear()
+      for t,v in rets.iteritems():
+        wake(t, v)
 
   def registerSelect (self, task, rlist = None, wlist = None, xlist = None,
                       timeout = None, timeIsAbsolute = False):
@@ -617,14 +677,19 @@ class SelectHub (object):
       if timeout != None:
         timeout += time.time()
 
-    self._incoming.put((task, rlist, wlist, xlist, timeout))
-    self._cycle()
+    self._incoming.append((task, rlist, wlist, xlist, timeout))
+    if rlist or wlist or xlist or timeout is None or timeout < self._wakeAt:
+      self._cycle()
 
   def _cycle (self):
     """
     Cycle the wait thread so that new timers or FDs can be picked up
     """
-    self._pinger.ping()
+    # If it has been pinged already, it takes the new items along with
+    # the ones it was pinged for.
+    if not self._pinged:
+      self._pinged = True
+      self._pinger.ping()
 
   def registerTimer (self, task, timeToWake, timeIsAbsolute = False):
     """
@@ -659,9 +724,7 @@ class ScheduleTask (BaseTask):
 
   def run (self):
     #TODO: Refactor the following, since it is copy/pasted from schedule().
-    if self._task in self._scheduler._ready:
-      # It might make sense to keep a flag on the task, since checking
-      # if it's in the ready list is not very efficient.
+    if self._task._scheduled:
       # Not sure if it makes sense to print out a message here or not.
       import logging
       logging.getLogger("recoco").info("Task %s scheduled multiple " +
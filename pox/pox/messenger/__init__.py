@@ -227,9 +227,18 @@ class Connection (EventMixin):
     be sent.
     """
     if self._is_connected is False: return False
-    s = json.dumps(whatever, default=str)
-    if self._newlines: s += "\n"
-    self.send_raw(s)
+    return self.send_encoded(json.dumps(whatever, default=str), whatever)
+
+  def send_encoded (self, data, msg):
+    """
+    Send msg, whose JSON encoding is data.
+
+    This lets one send the same message to many connections and encode
+    it only once.  data is sent as with send().
+    """
+    if self._is_connected is False: return False
+    if self._newlines: data += "\n"
+    self.send_raw(data)
     return True
 
   def send_raw (self, data):
@@ -381,9 +390,13 @@ class Channel (EventMixin):
   def send (self, msg):
     d = dict(msg)
     d['CHANNEL'] = self._name
+    s = None
     for r in self._members:
       if not r.is_connected: continue
-      r.send(d)
+      if s is None:
+        # Encoded once for all the members
+        s = json.dumps(d, default=str)
+      r.send_encoded(s, d)
 
   def __str__ (self):
     return "<Channel " + self.name + ">"
@@ -30,7 +30,7 @@ import select
 import threading
 
 from pox.core import core
-from pox.web.jsonrpc import JSONRPCHandler, make_error, ABORT
+from pox.web.jsonrpc import JSONRPCHandler, make_error, ABORT, RawJSON
 from pox.lib.recoco import Timer
 from pox.messenger import Connection, Transport
 
@@ -95,7 +95,7 @@ class AjaxConnection (Connection):
     self._sent_tx_seq = -1 # last seq sent
     self._rx_seq = 0
 
-    # Waiting outgoing messages as (seq, msg) pairs
+    # Waiting outgoing messages as (seq, JSON encoded msg) pairs
     self._tx_buffer = []
 
     # Out-of-order messages we've gotten (the in-order ones are dispatched
@@ -119,13 +119,15 @@ class AjaxConnection (Connection):
     #TODO: track request sockets and cancel them?
     self._quitting = True
 
-  def send (self, data):
+  def send_encoded (self, data, msg):
+    # tx() joins the encoded messages into its response
     if self._is_connected is False: return False
     self._cond.acquire()
     self._tx_buffer.append((self._next_tx_seq, data))
     self._next_tx_seq += 1
     self._cond.notify()
     self._cond.release()
+    return True
 
   def _get_tx_batch (self, seq, batch_size = None):
     """
@@ -209,7 +211,7 @@ class AjaxConnection (Connection):
         if last > self._sent_tx_seq:
           self._sent_tx_seq = last
 
-      data = [d[1] for d in data]
+      data = RawJSON("[" + ",".join(d[1] for d in data) + "]")
 
       #print "Sending",len(data),"of",len(self._tx_buffer)
 
@@ -234,6 +234,32 @@ class BarrierIn (Event):
     self.dpid = connection.dpid
     self.xid = ofp.xid
 
+class SendQueueFull (Event):
+  """
+  Fired when the data queued for sending to a switch grows over the
+  high watermark of its connection.  Until the matching
+  SendQueueDrained, further data only piles up in memory, so producers
+  of bulk data (flow installation, stats polling) should hold back.
+  queued (int) - bytes in the queue
+  """
+  def __init__ (self, connection):
+    Event.__init__(self)
+    self.connection = connection
+    self.dpid = connection.dpid
+    self.queued = connection.send_queue_bytes
+
+class SendQueueDrained (Event):
+  """
+  Fired when the send queue of a connection that was full gets below
+  the low watermark.
+  queued (int) - bytes in the queue
+  """
+  def __init__ (self, connection):
+    Event.__init__(self)
+    self.connection = connection
+    self.dpid = connection.dpid
+    self.queued = connection.send_queue_bytes
+
 class ConnectionIn (Event):
   def __init__ (self, connection):
     super(ConnectionIn,self).__init__()
@@ -314,6 +340,8 @@ class OpenFlowNexus (EventMixin):
     PortStatsReceived,
     QueueStatsReceived,
     FlowRemoved,
+    SendQueueFull,
+    SendQueueDrained,
   ])
 
   # Bytes to send to controller when a packet misses all flows
@@ -86,15 +86,26 @@ class UnderrunError (RuntimeError):
   pass
 
 def _read (data, offset, length):
+  """
+  Read length bytes at offset.  Data may be a memoryview (e.g., of a
+  receive buffer), but the result is always a copy as bytes.
+  """
   if (len(data)-offset) < length:
     raise UnderrunError("wanted %s bytes but only have %s"
                         % (length, len(data)-offset))
-  return (offset+length, data[offset:offset+length])
+  d = data[offset:offset+length]
+  if type(d) is memoryview:
+    d = d.tobytes()
+  return (offset+length, d)
+
+_structs = {}
 
 def _unpack (fmt, data, offset):
-  size = struct.calcsize(fmt)
-  if (len(data)-offset) < size: raise UnderrunError()
-  return (offset+size, struct.unpack_from(fmt, data, offset))
+  s = _structs.get(fmt)
+  if s is None:
+    s = _structs[fmt] = struct.Struct(fmt)
+  if (len(data)-offset) < s.size: raise UnderrunError()
+  return (offset+s.size, s.unpack_from(data, offset))
 
 def _skip (data, offset, num):
   offset += num
@@ -2634,29 +2645,28 @@ class ofp_stats_reply (ofp_header):
   def unpack (self, raw, offset=0):
     offset,length = self._unpack_header(raw, offset)
     offset,(self.type, self.flags) = _unpack("!HH", raw, offset)
-    offset,packed = _read(raw, offset, length - 12)
     t = _stats_type_to_class_info.get(self.type)
-    if t is None:
+    if t is None or t.reply is None:
       #FIXME: Put in a generic container?
-      self.body = packed
+      offset,self.body = _read(raw, offset, length - 12)
     else:
-      if t.reply is None:
-        #FIXME: Put in a generic container?
-        self.body = packed
+      # The parts are unpacked in place from a view that ends with the
+      # body, instead of copying the rest of the body after each part.
+      end = offset + length - 12
+      if len(raw) < end: raise UnderrunError()
+      body = memoryview(raw)[:end]
+      if not t.reply_is_list:
+        self.body = t.reply()
+        self.body.unpack(body, offset, end - offset)
       else:
-        if not t.reply_is_list:
-          self.body = t.reply()
-          self.body.unpack(packed, 0, len(packed))
-        else:
-          prev_len = len(packed)
-          self.body = []
-          while len(packed):
-            part = t.reply()
-            off = part.unpack(packed, 0, len(packed))
-            packed = packed[off:]
-            assert len(packed) != prev_len
-            prev_len = len(packed)
-            self.body.append(part)
+        self.body = []
+        while offset < end:
+          part = t.reply()
+          off = part.unpack(body, offset, end - offset)
+          assert off != offset
+          offset = off
+          self.body.append(part)
+      offset = end
 
     assert length == len(self)
     return offset,length
@@ -4123,7 +4133,7 @@ class ofp_vendor_generic (ofp_vendor_base):
     offset,(self.vendor,) = _unpack("!L", raw, offset)
     offset,self.data = _read(raw, offset, length-12)
     if self._collect_raw:
-      self.raw = raw[_offset, _offset+length]
+      self.raw = _read(raw, _offset, length)[1]
     return offset,length
 
   def __len__ (self):
@@ -36,22 +36,38 @@ log = core.getLogger()
 
 import socket
 import select
+import struct
+from collections import deque
+
+from pox.lib.epoll_select import EpollReactor
 
 # List where the index is an OpenFlow message type (OFPT_xxx), and
 # the values are unpack functions that unpack the wire format of that
 # type into a message object.
 unpackers = make_type_to_unpacker_table()
 
-try:
-  PIPE_BUF = select.PIPE_BUF
-except:
-  try:
-    # Try to get it from where PyPy (sometimes) has it
-    import IN
-    PIPE_BUF = IN.PIPE_BUF
-  except:
-    # (Hopefully) reasonable default
-    PIPE_BUF = 512
+# A Connection reads into a growable buffer.  The size of a read adapts
+# between these limits to the amount of data the socket has.
+MIN_READ_SIZE = 4096
+MAX_READ_SIZE = 1024 * 1024
+
+# Data the socket does not take is queued in the Connection, and sent
+# when the socket is writable again, at most SEND_SIZE bytes at a time.
+# Over SEND_HIGH_WATER queued bytes, the Connection raises SendQueueFull
+# (and SendQueueDrained once the queue is below SEND_LOW_WATER again).
+SEND_SIZE = 256 * 1024
+SEND_HIGH_WATER = 4 * 1024 * 1024
+SEND_LOW_WATER = 1024 * 1024
+
+# Messages sent from the thread of the scheduler are collected, and
+# written with a single send() once the running Task yields (unless
+# AUTO_CORK is False).  A Connection sends what it has collected as soon
+# as it reaches CORK_SIZE bytes.
+AUTO_CORK = True
+CORK_SIZE = SEND_SIZE
+
+# Version, type and length of the OpenFlow header
+_header = struct.Struct('!BBH')
 
 import pox.openflow.libopenflow_01 as of
 
@@ -272,114 +288,6 @@ statsHandlerMap = {
   of.OFPST_QUEUE : handle_OFPST_QUEUE,
 }
 
-# Deferred sending should be unusual, so don't worry too much about
-# efficiency
-class DeferredSender (threading.Thread):
-  """
-  Class that handles sending when a socket write didn't complete
-  """
-  def __init__ (self):
-    # Threads, not recoco?
-    threading.Thread.__init__(self)
-    self._dataForConnection = {}
-    self._lock = threading.RLock()
-    self._waker = pox.lib.util.makePinger()
-    self.daemon = True
-    self.sending = False
-
-    self.start()
-
-  def _sliceup (self, data):
-    """
-    Takes an array of data bytes, and slices into elements of
-    PIPE_BUF bytes each
-    """
-    out = []
-    while len(data) > PIPE_BUF:
-      out.append(data[0:PIPE_BUF])
-      data = data[PIPE_BUF:]
-    if len(data) > 0:
-      out.append(data)
-    return out
-
-  def send (self, con, data):
-    with self._lock:
-      self.sending = True
-
-      data = self._sliceup(data)
-
-      if con not in self._dataForConnection:
-        self._dataForConnection[con] = data
-      else:
-        self._dataForConnection[con].extend(data)
-
-      self._waker.ping()
-
-  def kill (self, con):
-    with self._lock:
-      try:
-        del self._dataForConnection[con]
-      except:
-        pass
-
-      self._waker.ping()
-
-  def run (self):
-    while core.running:
-
-      with self._lock:
-        cons = self._dataForConnection.keys()
-
-      rlist, wlist, elist = select.select([self._waker], cons, cons, 1)
-      if not core.running: break
-
-      with self._lock:
-        if len(rlist) > 0:
-          self._waker.pongAll()
-
-        for con in elist:
-          try:
-            del self._dataForConnection[con]
-          except:
-            pass
-
-        for con in wlist:
-          try:
-            alldata = self._dataForConnection[con]
-            while len(alldata):
-              data = alldata[0]
-              try:
-                l = con.sock.send(data)
-                if l != len(data):
-                  alldata[0] = data[l:]
-                  break
-                del alldata[0]
-              except socket.error as (errno, strerror):
-                if errno != EAGAIN:
-                  con.msg("DeferredSender/Socket error: " + strerror)
-                  con.disconnect()
-                  del self._dataForConnection[con]
-                break
-              except:
-                con.msg("Unknown error doing deferred sending")
-                break
-            if len(alldata) == 0:
-              try:
-                del self._dataForConnection[con]
-                if len(self._dataForConnection) == 0:
-                  self.sending = False
-                  break
-              except:
-                pass
-          except:
-            try:
-              del self._dataForConnection[con]
-            except:
-              pass
-
-# Used by the Connection class below
-deferredSender = DeferredSender()
-
 class DummyOFNexus (object):
   def raiseEventNoErrors (self, event, *args, **kw):
     log.warning("%s raised on dummy OpenFlow nexus" % event)
@@ -587,6 +495,8 @@ class Connection (EventMixin):
     PortStatsReceived,
     QueueStatsReceived,
     FlowRemoved,
+    SendQueueFull,
+    SendQueueDrained,
   ])
   
   # Globally unique identifier for the Connection instance
@@ -608,7 +518,24 @@ class Connection (EventMixin):
 
     self.ofnexus = _dummyOFNexus
     self.sock = sock
-    self.buf = ''
+    self.buf = bytearray(2 * MIN_READ_SIZE)
+    self._buf_start = 0         # first byte of buf not yet unpacked
+    self._buf_end = 0           # end of the received bytes in buf
+    self._read_size = MIN_READ_SIZE
+    self.drained = False        # the last read got all the data there was
+    # Held while the cork, the send queue or the socket is written, as
+    # send() may be called from any thread
+    self._send_lock = threading.Lock()
+    self._send_queue = deque()  # data the socket has not taken yet
+    self.send_queue_bytes = 0
+    self.send_queue_peak = 0    # the most bytes ever queued
+    self.send_queue_full = False
+    # Asked to call flush() when the socket is writable again
+    self.io_task = None
+    self._cork = []             # messages collected, not sent yet
+    self._cork_bytes = 0
+    self._corked = 0            # nesting depth of cork()
+    self._cork_flush_scheduled = False
     Connection.ID += 1
     self.ID = Connection.ID
     # TODO: dpid and features don't belong here; they should be eventually
@@ -646,6 +573,18 @@ class Connection (EventMixin):
     if self.disconnected:
       self.msg("already disconnected")
       already = True
+    elif self._cork or self._send_queue:
+      # Send what the socket takes of the queued and the collected data
+      # before the shutdown, in order
+      with self._send_lock:
+        if self._cork:
+          data = self._take_cork()
+          self._send_queue.append(data)
+          self.send_queue_bytes += len(data)
+        try:
+          self._flush()
+        except:
+          pass
     self.info(msg)
     self.disconnected = True
     try:
@@ -656,11 +595,11 @@ class Connection (EventMixin):
       self.ofnexus.raiseEventNoErrors(ConnectionDown, self)
       self.raiseEventNoErrors(ConnectionDown, self)
 
-    try:
-      #deferredSender.kill(self)
-      pass
-    except:
-      pass
+    with self._send_lock:
+      del self._cork[:]
+      self._cork_bytes = 0
+      self._send_queue.clear()
+      self.send_queue_bytes = 0
     try:
       self.sock.shutdown(socket.SHUT_RDWR)
     except:
@@ -686,78 +625,238 @@ class Connection (EventMixin):
       assert isinstance(data, of.ofp_header)
       data = data.pack()
 
-    if deferredSender.sending:
-      log.debug("deferred sender is sending!")
-      deferredSender.send(self, data)
+    if self._corked or (AUTO_CORK and
+                        threading.current_thread() is core.scheduler._thread):
+      with self._send_lock:
+        self._cork.append(data)
+        self._cork_bytes += len(data)
+        if self._cork_bytes < CORK_SIZE:
+          if not self._cork_flush_scheduled and not self._corked:
+            self._cork_flush_scheduled = True
+            core.scheduler.callAfterCycle(self._flush_cork)
+          return
+        data = self._take_cork()
+    self._send(data)
+
+  def cork (self):
+    """
+    Collect the messages sent from now on until uncork(), and send them
+    together.  Calls can be nested.
+    """
+    with self._send_lock:
+      self._corked += 1
+
+  def uncork (self):
+    """
+    Send the messages collected since the matching cork().
+    """
+    with self._send_lock:
+      if self._corked == 0:
+        return
+      self._corked -= 1
+      if self._corked or not self._cork or self.disconnected:
+        return
+      data = self._take_cork()
+    self._send(data)
+
+  def _flush_cork (self):
+    with self._send_lock:
+      self._cork_flush_scheduled = False
+      if self._corked or not self._cork or self.disconnected:
+        return
+      data = self._take_cork()
+    self._send(data)
+
+  def _take_cork (self):
+    cork = self._cork
+    data = cork[0] if len(cork) == 1 else ''.join(cork)
+    del cork[:]
+    self._cork_bytes = 0
+    return data
+
+  def _send (self, data):
+    # The events and the disconnect are raised without the lock, as
+    # their handlers may send.
+    with self._send_lock:
+      try:
+        if self._send_queue:
+          # Keep the order
+          l = 0
+        else:
+          l = self.sock.send(data)
+      except socket.error as (errno, strerror):
+        if errno != EAGAIN:
+          error = strerror
+          l = None
+        else:
+          l = 0
+      full = l is not None and l != len(data) and self._queue(data[l:])
+    if l is None:
+      self.msg("Socket error: " + error)
+      self.disconnect()
       return
-    try:
-      l = self.sock.send(data)
+    if full:
+      self.ofnexus.raiseEventNoErrors(SendQueueFull, self)
+      self.raiseEventNoErrors(SendQueueFull, self)
+
+  def _queue (self, data):
+    """
+    Queue data, with the lock held.  Returns True if the queue has just
+    become full.
+    """
+    q = self._send_queue
+    q.append(data)
+    self.send_queue_bytes += len(data)
+    if self.send_queue_bytes > self.send_queue_peak:
+      self.send_queue_peak = self.send_queue_bytes
+    if len(q) == 1:
+      self.msg("Out of send buffer space, queueing")
+      if self.io_task is not None:
+        self.io_task.want_write(self)
+    if not self.send_queue_full and self.send_queue_bytes > SEND_HIGH_WATER:
+      self.send_queue_full = True
+      return True
+    return False
+
+  def flush (self):
+    """
+    Send as much of the send queue as the socket takes.  Returns True
+    if the queue is empty.
+    """
+    with self._send_lock:
+      error, drained, empty = self._flush()
+    if error is not None:
+      self.msg("Socket error: " + error)
+      self.disconnect()
+      return True
+    if drained:
+      self.ofnexus.raiseEventNoErrors(SendQueueDrained, self)
+      self.raiseEventNoErrors(SendQueueDrained, self)
+    return empty
+
+  def _flush (self):
+    """
+    flush() with the lock held.  Returns (error, drained, empty).
+    """
+    q = self._send_queue
+    while q:
+      # No writev() in Python 2, so we join the small messages to send
+      # them with a single send().
+      data = q.popleft()
+      if len(data) < SEND_SIZE and q:
+        parts = [data]
+        size = len(data)
+        while q and size + len(q[0]) <= SEND_SIZE:
+          data = q.popleft()
+          parts.append(data)
+          size += len(data)
+        data = ''.join(parts)
+      try:
+        l = self.sock.send(data)
+      except socket.error as (errno, strerror):
+        if errno != EAGAIN:
+          return strerror, False, True
+        l = 0
+      self.send_queue_bytes -= l
       if l != len(data):
-        self.msg("Didn't send complete buffer.")
-        data = data[l:]
-        deferredSender.send(self, data)
-    except socket.error as (errno, strerror):
-      if errno == EAGAIN:
-        self.msg("Out of send buffer space.  " +
-                 "Consider increasing SO_SNDBUF.")
-        deferredSender.send(self, data)
-      else:
-        self.msg("Socket error: " + strerror)
-        self.disconnect()
+        q.appendleft(data[l:] if l else data)
+        break
+    drained = False
+    if self.send_queue_full and self.send_queue_bytes < SEND_LOW_WATER:
+      self.send_queue_full = False
+      drained = True
+    return None, drained, not q
+
+  def _make_room (self, size):
+    """
+    Make room for size bytes at the end of the receive buffer.  The
+    bytes not yet unpacked are moved to the front of the buffer if that
+    is enough, otherwise they are copied to a larger buffer.
+    """
+    start = self._buf_start
+    pending = self._buf_end - start
+    if start and len(self.buf) - pending >= size:
+      self.buf[:pending] = self.buf[start:start + pending]
+    else:
+      buf = bytearray(max(2 * len(self.buf), pending + size))
+      buf[:pending] = self.buf[start:start + pending]
+      self.buf = buf
+    self._buf_start = 0
+    self._buf_end = pending
 
   def read (self):
     """
     Read data from this connection.  Generally this is just called by the
     main OpenFlow loop below.
 
-    Note: This function will block if data is not available.
+    Note: This function will block if data is not available on a
+    blocking socket.  On a non-blocking one, it returns None.
     """
-    d = self.sock.recv(2048)
-    if len(d) == 0:
+    size = self._read_size
+    if len(self.buf) - self._buf_end < size:
+      self._make_room(size)
+    end = self._buf_end
+    try:
+      d = self.sock.recv_into(memoryview(self.buf)[end:end + size], size)
+    except socket.error as e:
+      if e.args[0] == EAGAIN:
+        return None
+      raise
+    if d == 0:
       return False
-    self.buf += d
-    buf_len = len(self.buf)
-
-
-    offset = 0
-    while buf_len - offset >= 8: # 8 bytes is minimum OF message size
-      # We pull the first four bytes of the OpenFlow header off by hand
-      # (using ord) to find the version/length/type so that we can
-      # correctly call libopenflow to unpack it.
-
-      ofp_type = ord(self.buf[offset+1])
-
-      if ord(self.buf[offset]) != of.OFP_VERSION:
+    self.drained = d < size
+    end += d
+    self._buf_end = end
+    if d == size:
+      self._read_size = min(2 * size, MAX_READ_SIZE)
+    elif d < size / 4 and size > MIN_READ_SIZE:
+      self._read_size = size / 2
+
+    buf = self.buf
+    # The unpackers get a view of the buffer, so that only the fields
+    # they keep are copied.
+    view = memoryview(buf)[:end]
+    offset = self._buf_start
+    while end - offset >= 8: # 8 bytes is minimum OF message size
+      # We unpack the first four bytes of the OpenFlow header to find
+      # the version/type/length so that we can correctly call
+      # libopenflow to unpack it.
+      version, ofp_type, msg_length = _header.unpack_from(buf, offset)
+
+      if version != of.OFP_VERSION:
         if ofp_type == of.OFPT_HELLO:
           # We let this through and hope the other side switches down.
           pass
         else:
           log.warning("Bad OpenFlow version (0x%02x) on connection %s"
-                      % (ord(self.buf[offset]), self))
+                      % (version, self))
           return False # Throw connection away
 
-      msg_length = ord(self.buf[offset+2]) << 8 | ord(self.buf[offset+3])
+      if end - offset < msg_length: break
 
-      if buf_len - offset < msg_length: break
-
-      new_offset,msg = unpackers[ofp_type](self.buf, offset)
+      new_offset,msg = unpackers[ofp_type](view, offset)
       assert new_offset - offset == msg_length
       offset = new_offset
 
-      try:
-        h = handlers[ofp_type]
-        h(self, msg)
-      except:
-        log.exception("%s: Exception while handling OpenFlow message:\n" +
-                      "%s %s", self,self,
-                      ("\n" + str(self) + " ").join(str(msg).split('\n')))
-        continue
+      self._handle_message(ofp_type, msg)
 
-    if offset != 0:
-      self.buf = self.buf[offset:]
+    if offset == end:
+      # Everything is unpacked, the next read starts at the front
+      self._buf_start = self._buf_end = 0
+    else:
+      self._buf_start = offset
 
     return True
 
+  def _handle_message (self, ofp_type, msg):
+    try:
+      h = handlers[ofp_type]
+      h(self, msg)
+    except:
+      log.exception("%s: Exception while handling OpenFlow message:\n" +
+                    "%s %s", self,self,
+                    ("\n" + str(self) + " ").join(str(msg).split('\n')))
+
   def _incoming_stats_reply (self, ofp):
     # This assumes that you don't receive multiple stats replies
     # to different requests out of order/interspersed.
@@ -819,42 +918,104 @@ def wrap_socket (new_sock):
 
 from pox.lib.recoco.recoco import *
 
+# Number of reads of a connection (or accepts of the listener) per cycle
+# of the epoll loop, so that a busy switch does not starve the others.
+# A read can be as large as MAX_READ_SIZE.
+DEFAULT_MAX_READS = 1
+
+# Switches reconnecting all at once should not overflow the listen queue
+LISTEN_BACKLOG = 1024
+
 class OpenFlow_01_Task (Task):
   """
   The main recoco thread for listening to openflow messages
+
+  Where epoll is available, the sockets are registered once with an
+  edge-triggered EpollReactor, and the task waits only for the fd of
+  the reactor (otherwise, it selects on every socket).  A connection is
+  read at most max_reads times per cycle; if it still has data, it is
+  read again after the other ready connections and the other tasks.
+
+  Connections with queued output ask for want_write(), and are flushed
+  here once their sockets are writable.
   """
-  def __init__ (self, port = 6633, address = '0.0.0.0'):
-    Task.__init__(self)
+  def __init__ (self, port = 6633, address = '0.0.0.0', epoll = None,
+                max_reads = DEFAULT_MAX_READS):
     self.port = int(port)
     self.address = address
+    if epoll is None:
+      epoll = hasattr(select, 'epoll')
+    self.epoll = epoll
+    self.max_reads = int(max_reads)
+    self._reactor = None
+    self._pinger = None
+    Task.__init__(self)
 
     core.addListener(pox.core.GoingUpEvent, self._handle_GoingUpEvent)
 
   def _handle_GoingUpEvent (self, event):
     self.start()
 
+  def want_write (self, con):
+    """ Flush con when its socket is writable """
+    if self._reactor is not None:
+      self._reactor.want_write(con)
+    elif self._pinger is not None:
+      # Select again, now with con in the write list
+      self._pinger.ping()
+
   def run (self):
-    # List of open sockets/connections to select on
-    sockets = []
+    if self.epoll:
+      return self._run_epoll()
+    return self._run_select()
 
+  def _listen (self):
     listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     listener.bind((self.address, self.port))
-    listener.listen(16)
-    sockets.append(listener)
+    listener.listen(LISTEN_BACKLOG)
 
     log.debug("Listening on %s:%s" %
               (self.address, self.port))
+    return listener
+
+  def _new_connection (self, new_sock):
+    if pox.openflow.debug.pcap_traces:
+      new_sock = wrap_socket(new_sock)
+    new_sock.setblocking(0)
+    # Note that instantiating a Connection object fires a
+    # ConnectionUp event (after negotation has completed)
+    con = Connection(new_sock)
+    con.io_task = self
+    return con
+
+  def _run_select (self):
+    # List of open sockets/connections to select on
+    sockets = []
+
+    listener = self._listen()
+    sockets.append(listener)
+    self._pinger = pox.lib.util.makePinger()
 
     con = None
     while core.running:
       try:
         while True:
           con = None
-          rlist, wlist, elist = yield Select(sockets, [], sockets, 5)
+          wlist = [s for s in sockets
+                   if s is not listener and s._send_queue]
+          rlist, wlist, elist = yield Select(sockets + [self._pinger],
+                                             wlist, sockets, 5)
           if len(rlist) == 0 and len(wlist) == 0 and len(elist) == 0:
             if not core.running: break
 
+          if self._pinger in rlist:
+            self._pinger.pongAll()
+            rlist.remove(self._pinger)
+
+          for con in wlist:
+            con.flush()
+
           for con in elist:
             if con is listener:
               raise RuntimeError("Error on listener socket")
@@ -871,13 +1032,7 @@ class OpenFlow_01_Task (Task):
           timestamp = time.time()
           for con in rlist:
             if con is listener:
-              new_sock = listener.accept()[0]
-              if pox.openflow.debug.pcap_traces:
-                new_sock = wrap_socket(new_sock)
-              new_sock.setblocking(0)
-              # Note that instantiating a Connection object fires a
-              # ConnectionUp event (after negotation has completed)
-              newcon = Connection(new_sock)
+              newcon = self._new_connection(listener.accept()[0])
               sockets.append( newcon )
               #print str(newcon) + " connected"
             else:
@@ -913,6 +1068,95 @@ class OpenFlow_01_Task (Task):
 
     #pox.core.quit()
 
+  def _run_epoll (self):
+    listener = self._listen()
+    listener.setblocking(0)
+    reactor = EpollReactor()
+    reactor.register(listener)
+    self._reactor = reactor
+
+    try:
+      while core.running:
+        if reactor.ready:
+          # Some sockets were left with data in the previous cycle.
+          # Let the other tasks run, then continue with them.
+          yield 0
+        else:
+          yield Select([reactor], [], [], 5)
+
+        ready, writable = reactor.poll(0)
+        for con in writable:
+          if con.flush():
+            reactor.want_write(con, False)
+
+        timestamp = time.time()
+        for con in ready:
+          if con is listener:
+            if not self._accept(listener, reactor):
+              log.error("Exception on OpenFlow listener.  Aborting.")
+              return
+          else:
+            con.idle_time = timestamp
+            self._read(con, reactor)
+    except exceptions.KeyboardInterrupt:
+      pass
+    finally:
+      log.debug("No longer listening for connections")
+      self._reactor = None
+      reactor.close()
+
+  def _accept (self, listener, reactor):
+    """
+    Accept at most max_reads new connections.  Returns False if the
+    listener failed.
+    """
+    for i in xrange(self.max_reads):
+      try:
+        new_sock = listener.accept()[0]
+      except socket.error as e:
+        if e.args[0] == EAGAIN:
+          reactor.idle(listener)
+          return True
+        log.exception("Exception accepting connection")
+        return False
+      try:
+        reactor.register(self._new_connection(new_sock))
+      except:
+        log.exception("Exception setting up connection")
+        try:
+          new_sock.close()
+        except:
+          pass
+    return True
+
+  def _read (self, con, reactor):
+    """
+    Read a connection at most max_reads times.  If it still has data,
+    it stays ready for the next cycle.
+    """
+    try:
+      for i in xrange(self.max_reads):
+        r = con.read()
+        if r is None or (r and con.drained):
+          reactor.idle(con)
+          return
+        if r is False:
+          break
+      else:
+        return
+    except socket.error as e:
+      if e.args[0] == ECONNRESET:
+        con.info("Connection reset")
+      else:
+        log.exception("Exception reading connection " + str(con))
+    except:
+      log.exception("Exception reading connection " + str(con))
+    reactor.unregister(con)
+    try:
+      con.close()
+    except:
+      pass
+
 
 def _set_handlers ():
   handlers.extend([None] * (1 + sorted(handlerMap.keys(),reverse=True)[0]))
@@ -922,10 +1166,14 @@ def _set_handlers ():
 _set_handlers()
 
 
-def launch (port = 6633, address = "0.0.0.0"):
+def launch (port = 6633, address = "0.0.0.0", epoll = None,
+            max_reads = DEFAULT_MAX_READS):
   if core.hasComponent('of_01'):
     return None
-  l = OpenFlow_01_Task(port = int(port), address = address)
+  if epoll is not None:
+    epoll = pox.lib.util.str_to_bool(epoll)
+  l = OpenFlow_01_Task(port = int(port), address = address, epoll = epoll,
+                       max_reads = int(max_reads))
   core.register("of_01", l)
   return l
 
@@ -0,0 +1,331 @@
+# Copyright 2013 Felician Nemeth
+#
+# This file is part of POX.
+#
+# POX is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# POX is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with POX.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+OpenFlow 1.0 front-end sharded across worker processes.
+
+Instead of of_01, run:
+
+  ./pox.py openflow.of_01_sharded --workers=4 ...
+
+Every worker (see shard_worker) accepts switch connections, does the
+hello and features request of the handshake, answers echo requests,
+and relays the other messages, unpacked, to this process over a Unix
+socket.  Messages to the switches go back on the same socket.
+
+The listening socket is opened here with SO_REUSEPORT once per worker,
+so the kernel spreads the connections among the workers; if
+SO_REUSEPORT is not supported, the workers share one socket.
+
+Here, every switch has an ordinary of_01.Connection, whose socket is a
+stand-in that writes to the channel of its worker.  The messages from
+the worker are handled by the same code as in of_01, so the listeners
+of core.openflow and of the connections see no difference.
+"""
+
+from pox.core import core
+import pox
+import pox.lib.util
+from pox.lib.recoco.recoco import *
+from pox.openflow.of_01 import Connection
+from pox.openflow.shard_worker import DATA, CONNECT, CLOSE, frame_header
+
+from errno import EAGAIN
+import cPickle
+import fcntl
+import os
+import socket
+import subprocess
+import sys
+import threading
+
+log = core.getLogger()
+
+DEFAULT_WORKERS = 2
+READ_SIZE = 256 * 1024
+LISTEN_BACKLOG = 1024
+
+# Not in the socket module of Python 2
+SO_REUSEPORT = getattr(socket, 'SO_REUSEPORT', 15)
+
+class ChannelSocket (object):
+  """
+  Stands in for the socket of a Connection whose switch is connected
+  to a worker
+  """
+  def __init__ (self, shard, id, address):
+    self.shard = shard
+    self.id = id
+    self.address = address
+    self.closed = False
+
+  def send (self, data):
+    if not self.closed:
+      self.shard.write(self.id, DATA, data)
+    return len(data)
+
+  def recv_into (self, buf, nbytes = 0):
+    raise socket.error(EAGAIN, "Messages are handed over by the shard")
+
+  def getpeername (self):
+    return self.address
+
+  def fileno (self):
+    return -1
+
+  def shutdown (self, how = socket.SHUT_RDWR):
+    self.close()
+
+  def close (self):
+    if self.closed:
+      return
+    self.closed = True
+    self.shard.connections.pop(self.id, None)
+    self.shard.write(self.id, CLOSE)
+
+
+class Shard (object):
+  """
+  The channel to a worker process and the connections of its switches
+  """
+  def __init__ (self, index, channel, process):
+    self.index = index
+    self.channel = channel
+    self.process = process
+    self.connections = {}       # connection id -> Connection
+    self.out = []               # frames the channel has not taken yet
+    # Held while out or the channel is written
+    self.lock = threading.Lock()
+    self.inbuf = ''             # start of an incomplete frame
+    self.corked = False         # collect frames, flush() sends them
+    self.wake = None            # called when output is left pending
+
+  def fileno (self):
+    return self.channel.fileno()
+
+  def write (self, id, kind, data = ''):
+    """ Send a frame; may be called from any thread """
+    with self.lock:
+      pending = bool(self.out)
+      self.out.append(frame_header.pack(id, kind, len(data)))
+      if data:
+        self.out.append(data)
+      if self.corked or pending:
+        return
+      self._flush()
+      left = bool(self.out)
+    if left and self.wake:
+      # Let the task wait until the channel takes the rest
+      self.wake()
+
+  def flush (self):
+    with self.lock:
+      self._flush()
+
+  def _flush (self):
+    if not self.out:
+      return
+    data = ''.join(self.out)
+    del self.out[:]
+    try:
+      l = self.channel.send(data)
+    except socket.error as e:
+      if e.args[0] != EAGAIN:
+        if core.running:
+          log.error("Worker %i: %s" % (self.index, e))
+        return
+      l = 0
+    if l < len(data):
+      self.out.append(data[l:])
+
+  def read (self):
+    """
+    Read the channel and handle its frames.  Returns False if the
+    worker is gone.
+    """
+    try:
+      data = self.channel.recv(READ_SIZE)
+    except socket.error as e:
+      if e.args[0] == EAGAIN:
+        return True
+      log.error("Worker %i: %s" % (self.index, e))
+      data = ''
+    if not data:
+      return False
+
+    buf = self.inbuf + data if self.inbuf else data
+    end = len(buf)
+    offset = 0
+    # Replies to the messages are sent together after the whole batch
+    self.corked = True
+    try:
+      while end - offset >= frame_header.size:
+        id, kind, length = frame_header.unpack_from(buf, offset)
+        start = offset + frame_header.size
+        if end - start < length:
+          break
+        offset = start + length
+        if kind == DATA:
+          con = self.connections.get(id)
+          if con is None:
+            continue
+          for msg in cPickle.loads(buf[start:offset]):
+            con._handle_message(msg.header_type, msg)
+        elif kind == CONNECT:
+          address = buf[start:offset].rsplit(':', 1)
+          sock = ChannelSocket(self, id, (address[0], int(address[1])))
+          self.connections[id] = Connection(sock)
+        elif kind == CLOSE:
+          con = self.connections.pop(id, None)
+          if con is not None:
+            con.sock.closed = True
+            con.close()
+    finally:
+      self.corked = False
+      self.inbuf = buf[offset:]
+      self.flush()
+    return True
+
+  def lost (self):
+    for con in self.connections.values():
+      con.sock.closed = True
+      con.close()
+    self.connections.clear()
+    try:
+      self.channel.close()
+    except:
+      pass
+
+
+class ShardedOpenFlow_01_Task (Task):
+  """
+  Relays the messages between the workers and the Connections
+  """
+  def __init__ (self, port = 6633, address = '0.0.0.0',
+                workers = DEFAULT_WORKERS):
+    self.port = int(port)
+    self.address = address
+    self.workers = int(workers)
+    self.shards = []
+    self._pinger = pox.lib.util.makePinger()
+    Task.__init__(self)
+
+    core.addListener(pox.core.GoingUpEvent, self._handle_GoingUpEvent)
+    core.addListener(pox.core.GoingDownEvent, self._handle_GoingDownEvent)
+
+  def _listen (self, reuse_port = False):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+      listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+      if reuse_port:
+        listener.setsockopt(socket.SOL_SOCKET, SO_REUSEPORT, 1)
+      listener.bind((self.address, self.port))
+      listener.listen(LISTEN_BACKLOG)
+    except socket.error:
+      listener.close()
+      raise
+    return listener
+
+  def _listeners (self):
+    listeners = []
+    try:
+      for i in range(self.workers):
+        listeners.append(self._listen(True))
+      return listeners
+    except socket.error:
+      for l in listeners:
+        l.close()
+      log.debug("No SO_REUSEPORT, the workers share the listening socket")
+      return [self._listen()] * self.workers
+
+  def _spawn (self, index, listener):
+    ours, theirs = socket.socketpair()
+    keep = (theirs.fileno(), listener.fileno())
+    def close_fds ():
+      # The worker gets only stdio and its two sockets.  The rest is
+      # closed on exec, so the error pipe of subprocess still works.
+      try:
+        fds = [int(fd) for fd in os.listdir('/proc/self/fd')]
+      except OSError:
+        fds = range(3, subprocess.MAXFD)
+      for fd in fds:
+        if fd > 2 and fd not in keep:
+          try:
+            fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.FD_CLOEXEC)
+          except IOError:
+            pass
+    env = dict(os.environ)
+    path = os.path.dirname(os.path.dirname(os.path.abspath(pox.__file__)))
+    if env.get('PYTHONPATH'):
+      path += os.pathsep + env['PYTHONPATH']
+    env['PYTHONPATH'] = path
+    process = subprocess.Popen([sys.executable, '-m',
+                                'pox.openflow.shard_worker',
+                                str(theirs.fileno()),
+                                str(listener.fileno())],
+                               preexec_fn = close_fds, env = env)
+    theirs.close()
+    ours.setblocking(0)
+    shard = Shard(index, ours, process)
+    shard.wake = self._pinger.ping
+    return shard
+
+  def _handle_GoingUpEvent (self, event):
+    listeners = self._listeners()
+    self.shards = [self._spawn(i, l) for i, l in enumerate(listeners)]
+    for l in set(listeners):
+      l.close()
+    log.debug("Listening on %s:%s with %i workers" %
+              (self.address, self.port, self.workers))
+    self.start()
+
+  def _handle_GoingDownEvent (self, event):
+    for shard in self.shards:
+      try:
+        shard.process.terminate()
+        shard.process.wait()
+      except OSError:
+        pass
+
+  def run (self):
+    while core.running and self.shards:
+      wlist = [s for s in self.shards if s.out]
+      rlist, wlist, elist = yield Select(self.shards + [self._pinger],
+                                         wlist, [], 5)
+      if self._pinger in rlist:
+        self._pinger.pongAll()
+        rlist.remove(self._pinger)
+      for shard in wlist:
+        shard.flush()
+      for shard in rlist:
+        if shard.read() is False:
+          if not core.running:
+            return
+          log.error("Worker %i is gone" % (shard.index,))
+          shard.lost()
+          self.shards.remove(shard)
+
+    log.debug("No longer listening for connections")
+
+
+def launch (port = 6633, address = "0.0.0.0", workers = DEFAULT_WORKERS):
+  if core.hasComponent('of_01'):
+    return None
+  l = ShardedOpenFlow_01_Task(port = int(port), address = address,
+                              workers = int(workers))
+  core.register("of_01", l)
+  return l
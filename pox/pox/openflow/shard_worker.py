@@ -0,0 +1,301 @@
+# Copyright 2013 Felician Nemeth
+#
+# This file is part of POX.
+#
+# POX is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# POX is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with POX.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Worker process of the sharded OpenFlow front-end (see of_01_sharded).
+
+A worker accepts switch connections, says hello and asks for the
+features of the switches, answers their echo requests, unpacks every
+other message and relays them to the controller process over a channel
+(a Unix socket).  A frame on the channel is
+
+  connection id (4 bytes) | kind (1 byte) | length (4 bytes) | payload
+
+The payload of a DATA frame from the worker is the list of messages of
+a read, pickled; unpickling them takes less than half the time of
+unpacking.  From the controller, it is OpenFlow messages in wire
+format, to be sent to the switch as they are.  The payload of a CONNECT
+frame is the address of the switch.
+
+This module does not import pox.core, it runs in a process of its own:
+
+  python -m pox.openflow.shard_worker <channel fd> <listener fd>
+"""
+
+import cPickle
+import errno
+import logging
+import os
+import select
+import socket
+import struct
+import sys
+
+import pox.openflow.libopenflow_01 as of
+from pox.openflow.util import make_type_to_unpacker_table
+
+# Kinds of frames
+DATA = 0      # OpenFlow messages
+CONNECT = 1   # a new switch connection (worker -> controller)
+CLOSE = 2     # the connection is closed
+
+frame_header = struct.Struct('!IBI')
+_of_header = struct.Struct('!BBHL')
+
+READ_SIZE = 65536
+
+unpackers = make_type_to_unpacker_table()
+
+log = logging.getLogger("openflow.shard_worker")
+
+class Switch (object):
+  """
+  A switch connection of a worker
+  """
+  def __init__ (self, id, sock):
+    self.id = id
+    self.sock = sock
+    self.buf = ''       # start of an incomplete message
+    self.out = []       # data the socket has not taken yet
+    self.greeted = False
+
+class Worker (object):
+  def __init__ (self, channel, listener):
+    self.channel = channel
+    self.listener = listener
+    self.epoll = select.epoll()
+    self.switches = {}        # fd -> Switch
+    self.by_id = {}           # connection id -> Switch
+    self.next_id = 1
+    self.frames = []          # frames to the controller
+    self.inbuf = ''           # start of an incomplete frame
+
+  def run (self):
+    lfd = self.listener.fileno()
+    cfd = self.channel.fileno()
+    self.epoll.register(lfd, select.EPOLLIN)
+    self.epoll.register(cfd, select.EPOLLIN)
+    while True:
+      try:
+        events = self.epoll.poll(5)
+      except IOError as e:
+        if e.errno == errno.EINTR:
+          continue
+        raise
+      for fd, event in events:
+        if fd == lfd:
+          self._accept()
+        elif fd == cfd:
+          if not self._read_channel():
+            return
+        else:
+          s = self.switches.get(fd)
+          if s is None:
+            continue
+          if event & select.EPOLLOUT:
+            self._flush(s)
+          if event & (select.EPOLLIN | select.EPOLLERR | select.EPOLLHUP):
+            if s.id in self.by_id:
+              self._read(s)
+      if self.frames:
+        if not self._send_frames():
+          return
+
+  def _send_frames (self):
+    """
+    Send the frames to the controller.  If it is behind, this waits,
+    and so we stop reading the switches, but we still read what the
+    controller sends.  Returns False if the controller is gone.
+    """
+    data = ''.join(self.frames)
+    del self.frames[:]
+    offset = 0
+    while offset < len(data):
+      try:
+        offset += self.channel.send(buffer(data, offset))
+      except socket.error as e:
+        if e.args[0] != errno.EAGAIN:
+          return False
+        r, w, x = select.select([self.channel], [self.channel], [], 5)
+        if r and not self._read_channel():
+          return False
+    return True
+
+  def _frame (self, id, kind, data = ''):
+    self.frames.append(frame_header.pack(id, kind, len(data)))
+    if data:
+      self.frames.append(data)
+
+  def _accept (self):
+    while True:
+      try:
+        sock, address = self.listener.accept()
+      except socket.error as e:
+        if e.args[0] in (errno.EAGAIN, errno.ECONNABORTED):
+          return
+        raise
+      sock.setblocking(0)
+      s = Switch(self.next_id, sock)
+      self.next_id += 1
+      self.switches[sock.fileno()] = s
+      self.by_id[s.id] = s
+      self.epoll.register(sock.fileno(), select.EPOLLIN)
+      self._frame(s.id, CONNECT, '%s:%i' % address[:2])
+      self._send(s, _of_header.pack(of.OFP_VERSION, of.OFPT_HELLO, 8, 0))
+
+  def _close (self, s, notify = True):
+    if self.by_id.pop(s.id, None) is None:
+      return
+    fd = s.sock.fileno()
+    del self.switches[fd]
+    try:
+      self.epoll.unregister(fd)
+    except (IOError, OSError):
+      pass
+    s.sock.close()
+    if notify:
+      self._frame(s.id, CLOSE)
+
+  def _send (self, s, data):
+    if s.out:
+      s.out.append(data)
+      return
+    try:
+      l = s.sock.send(data)
+    except socket.error as e:
+      if e.args[0] != errno.EAGAIN:
+        self._close(s)
+        return
+      l = 0
+    if l < len(data):
+      s.out.append(data[l:])
+      self.epoll.modify(s.sock.fileno(), select.EPOLLIN | select.EPOLLOUT)
+
+  def _flush (self, s):
+    data = ''.join(s.out)
+    del s.out[:]
+    try:
+      l = s.sock.send(data)
+    except socket.error as e:
+      if e.args[0] != errno.EAGAIN:
+        self._close(s)
+        return
+      l = 0
+    if l < len(data):
+      s.out.append(data[l:])
+    else:
+      self.epoll.modify(s.sock.fileno(), select.EPOLLIN)
+
+  def _read (self, s):
+    """
+    Read a switch once, and forward its complete messages but the ones
+    answered here.
+    """
+    try:
+      data = s.sock.recv(READ_SIZE)
+    except socket.error as e:
+      if e.args[0] == errno.EAGAIN:
+        return
+      data = ''
+    if not data:
+      self._close(s)
+      return
+    buf = s.buf + data if s.buf else data
+    end = len(buf)
+    offset = 0
+    msgs = []
+    while end - offset >= 8:
+      version, ofp_type, length, xid = _of_header.unpack_from(buf, offset)
+      if length < 8 or (version != of.OFP_VERSION and
+                        ofp_type != of.OFPT_HELLO):
+        log.warning("Bad OpenFlow message on connection %i" % (s.id,))
+        self._close(s)
+        return
+      if end - offset < length:
+        break
+      if ofp_type == of.OFPT_ECHO_REQUEST:
+        self._send(s, _of_header.pack(of.OFP_VERSION, of.OFPT_ECHO_REPLY,
+                                      length, xid) +
+                      buf[offset + 8:offset + length])
+      elif ofp_type == of.OFPT_HELLO:
+        if not s.greeted:
+          s.greeted = True
+          self._send(s, _of_header.pack(of.OFP_VERSION,
+                                        of.OFPT_FEATURES_REQUEST, 8, 0))
+      else:
+        try:
+          msgs.append(unpackers[ofp_type](buf, offset)[1])
+        except Exception:
+          log.exception("Can't unpack message on connection %i" % (s.id,))
+          self._close(s)
+          return
+      offset += length
+    if msgs:
+      self._frame(s.id, DATA, cPickle.dumps(msgs, 2))
+    s.buf = buf[offset:]
+
+  def _read_channel (self):
+    try:
+      data = self.channel.recv(READ_SIZE)
+    except socket.error as e:
+      if e.args[0] == errno.EAGAIN:
+        return True
+      data = ''
+    if not data:
+      return False
+    buf = self.inbuf + data if self.inbuf else data
+    end = len(buf)
+    offset = 0
+    while end - offset >= frame_header.size:
+      id, kind, length = frame_header.unpack_from(buf, offset)
+      start = offset + frame_header.size
+      if end - start < length:
+        break
+      offset = start + length
+      s = self.by_id.get(id)
+      if s is None:
+        continue
+      if kind == DATA:
+        # The controller says hello to every new connection, but we have
+        # done that already.  (The hello is the first message it sends,
+        # though it may come with others in the same frame.)
+        if ord(buf[start + 1]) == of.OFPT_HELLO:
+          start += _of_header.unpack_from(buf, start)[2]
+        if start < offset:
+          self._send(s, buf[start:offset])
+      elif kind == CLOSE:
+        self._close(s, notify = False)
+    self.inbuf = buf[offset:]
+    return True
+
+
+def main (argv):
+  logging.basicConfig()
+  channel_fd, listener_fd = int(argv[1]), int(argv[2])
+  channel = socket.fromfd(channel_fd, socket.AF_UNIX, socket.SOCK_STREAM)
+  listener = socket.fromfd(listener_fd, socket.AF_INET, socket.SOCK_STREAM)
+  os.close(channel_fd)
+  os.close(listener_fd)
+  channel.setblocking(0)
+  listener.setblocking(0)
+  try:
+    Worker(channel, listener).run()
+  except KeyboardInterrupt:
+    pass
+
+if __name__ == '__main__':
+  main(sys.argv)
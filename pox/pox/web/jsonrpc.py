@@ -30,6 +30,8 @@ Also, it has some capability for compatibility with Qooxdoo.
 
 import json
 import sys
+import os
+import re
 from pox.web.webcore import *
 from pox.core import core
 log = core.getLogger()
@@ -40,6 +42,33 @@ log = core.getLogger()
 ABORT = object()
 
 
+class RawJSON (object):
+  """
+  Already encoded JSON
+
+  A method can put this into its result to have the text sent as is,
+  without decoding and encoding it again.
+  """
+  def __init__ (self, text):
+    self.text = text
+
+
+def dumps (obj, **kw):
+  """
+  json.dumps(), but the text of RawJSON values is copied into the output
+  """
+  raw = []
+  nonce = os.urandom(8).encode('hex')
+  def default (o):
+    if not isinstance(o, RawJSON): return str(o)
+    raw.append(o.text)
+    return "\0%s %i" % (nonce, len(raw) - 1)
+  s = json.dumps(obj, default=default, **kw)
+  if not raw: return s
+  return re.sub(r'"\\u0000%s (\d+)"' % (nonce,),
+                lambda m: raw[int(m.group(1))], s)
+
+
 class JSONRPCHandler (SplitRequestHandler):
   """
   Meant for implementing JSON-RPC web services
@@ -200,7 +229,7 @@ class JSONRPCHandler (SplitRequestHandler):
         for r in response: self._translate_error(r)
       else:
         self._translate_error(response)
-      response = json.dumps(response, default=str, **dumps_opts)
+      response = dumps(response, **dumps_opts)
       response = response.strip()
       if len(response) and not response.endswith("\n"): response += "\n"
       try:
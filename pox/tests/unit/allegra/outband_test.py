@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+import unittest
+import sys
+import os.path
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+sys.path.append(os.path.dirname(__file__) + "/../../../ext")
+
+from allegra.outband import Topo, Node
+
+def make_node (name, dpid, hostname, ports = {}):
+  return Node({'name': name, 'DPID': '%x' % dpid, 'hostname': hostname,
+               'external': True, 'ports': ports})
+
+class TopoIndexTest(unittest.TestCase):
+  def setUp(self):
+    self.t = Topo()
+    self.a = make_node('A', 1, 'a.example.org',
+                       {'1': {'ip': '10.1.0.1', 'mac': '22:01:00:00:00:aa'}})
+    self.b = make_node('B', 2, 'b.example.org')
+    self.t.add_node(self.a)
+    self.t.add_node(self.b)
+    self.t.add_link(self.a, self.b, {'port_a': 1, 'port_b': 1})
+
+  def test_lookups(self):
+    t, a = self.t, self.a
+    self.assertIs(t.ip('10.1.0.1'), a)
+    self.assertEqual(t.ip_and_port('10.1.0.1'), (a, a.get_port(1)))
+    self.assertIs(t.mac('22:01:00:00:00:aa'), a)
+    self.assertIs(t.hostname('a.example.org'), a)
+    self.assertIs(t.name('B'), self.b)
+    self.assertIs(t.ip('10.9.9.9'), None)
+
+  def test_generate_host_port(self):
+    t, a = self.t, self.a
+    a.get_port(1).ip = None
+    self.assertIs(t.ip('10.1.0.1'), None)
+    port = a.generate_host_port(1, a.get_port(1))
+    self.assertIs(t.mac('22:01:00:00:00:aa'), None)
+    self.assertIs(t.ip('10.1.0.1'), a)
+    self.assertIs(t.mac(port.mac), a)
+    self.assertEqual(port.dpid, 2)
+
+  def test_port_address_change(self):
+    t, a = self.t, self.a
+    a.get_port(1).ip = '10.1.0.5'
+    a.get_port(1).mac = '22:01:00:00:00:05'
+    self.assertIs(t.ip('10.1.0.1'), None)
+    self.assertIs(t.mac('22:01:00:00:00:aa'), None)
+    self.assertIs(t.ip('10.1.0.5'), a)
+    self.assertIs(t.mac('22:01:00:00:00:05'), a)
+
+  def test_hostname_change(self):
+    t, a = self.t, self.a
+    a.hostname = 'c.example.org'
+    self.assertIs(t.hostname('a.example.org'), None)
+    self.assertIs(t.hostname('c.example.org'), a)
+
+  def test_rename(self):
+    t, a = self.t, self.a
+    a.name = 'C'
+    self.assertIs(t.name('A'), None)
+    self.assertIs(t.name('C'), a)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+import unittest
+import sys
+import os
+import os.path
+import shutil
+import tempfile
+import threading
+import time
+from SimpleXMLRPCServer import SimpleXMLRPCServer
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+sys.path.append(os.path.dirname(__file__) + "/../../../ext")
+
+import pox.core
+import allegra.outband as outband
+from allegra.outband import Outband, Topo
+
+class FakePLCAPI (object):
+  "The PLCAPI calls of fetch_planetlab_info, counting the calls"
+  def __init__ (self):
+    self.calls = 0
+    self.vnet = 'vnet1'
+
+  def _dispatch (self, method, params):
+    self.calls += 1
+    return getattr(self, 'do_' + method)(*params)
+
+  def do_AuthCheck (self, auth):
+    return 1
+
+  def do_GetSliceTags (self, auth, filter, fields):
+    return [{'value': self.vnet}]
+
+  def do_GetSliceKeys (self, auth):
+    return [{'name': 'test_slice', 'key': 'ssh-rsa AAAA test\n'}]
+
+  def do_GetSlices (self, auth, slice_name, fields):
+    return [{'node_ids': [1, 2]}]
+
+  def do_GetNodes (self, auth, node_ids, fields):
+    return [{'hostname': 'a.example.org', 'run_level': 'boot'},
+            {'hostname': 'b.example.org', 'run_level': 'safeboot'}]
+
+class PlcCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.api = FakePLCAPI()
+    self.server = SimpleXMLRPCServer(('127.0.0.1', 0), logRequests=False,
+                                     allow_none=True)
+    self.server.register_instance(self.api)
+    thread = threading.Thread(target=self.server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    # fetch_planetlab_info writes the keys of the slice here
+    dirname = os.path.dirname(pox.core.__file__)
+    self.key_file = os.path.join(dirname, '..', '..', 'tools', 'fat_dir',
+                                 'ssh_key.pub')
+    self.key = None
+    if os.path.exists(self.key_file):
+      with open(self.key_file) as f:
+        self.key = f.read()
+
+    self.dir = tempfile.mkdtemp()
+    self.config = outband.config
+    self.plc_cache = outband.plc_cache
+    outband.config = {
+      'plc_api_url': 'http://127.0.0.1:%d/' % self.server.server_address[1],
+      'auth': {'AuthMethod': 'password'},
+      'slice_name': 'test_slice',
+      'plc_cache': os.path.join(self.dir, 'plc_info.json'),
+      'plc_cache_ttl': 3600,
+      'check_node_availability': False,
+    }
+    outband.plc_cache = outband.PlcCache()
+    self.outband = Outband.__new__(Outband)
+
+  def tearDown(self):
+    self.server.shutdown()
+    self.server.server_close()
+    outband.config = self.config
+    outband.plc_cache = self.plc_cache
+    shutil.rmtree(self.dir)
+    if self.key is None:
+      os.remove(self.key_file)
+    else:
+      with open(self.key_file, 'w') as f:
+        f.write(self.key)
+
+  def get_planetlab_info(self):
+    t = Topo()
+    self.outband.get_planetlab_info(t)
+    return t
+
+  def test_fresh(self):
+    t = self.get_planetlab_info()
+    self.assertEqual(self.api.calls, 5)
+    self.assertEqual(t.vnet, 'vnet1')
+    self.assertEqual(t._ple_nodes, ['a.example.org', 'b.example.org'])
+    self.assertEqual(t._working_ple_nodes, ['a.example.org'])
+
+    self.get_planetlab_info()
+    self.assertEqual(self.api.calls, 5)
+
+    # a restarted controller reads the cache file
+    outband.plc_cache = outband.PlcCache()
+    t = self.get_planetlab_info()
+    self.assertEqual(self.api.calls, 5)
+    self.assertEqual(t._working_ple_nodes, ['a.example.org'])
+
+  def test_stale(self):
+    self.get_planetlab_info()
+    key = outband.slice_cache_key()
+    info = outband.plc_cache.get(key)
+    info['time'] -= 3601
+    outband.plc_cache.set(key, info)
+    self.api.vnet = 'vnet2'
+
+    # The stale info is used, and refreshed in the background
+    t = self.get_planetlab_info()
+    self.assertEqual(t.vnet, 'vnet1')
+    deadline = time.time() + 5
+    while outband.plc_cache._refreshing and time.time() < deadline:
+      time.sleep(0.01)
+    self.assertEqual(self.api.calls, 10)
+    self.assertEqual(outband.plc_cache.get(key)['vnet'], 'vnet2')
+
+    t = self.get_planetlab_info()
+    self.assertEqual(t.vnet, 'vnet2')
+    self.assertEqual(self.api.calls, 10)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+import unittest
+import sys
+import os.path
+import shutil
+import tempfile
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+sys.path.append(os.path.dirname(__file__) + "/../../../ext")
+
+from allegra.outband import Topo, Node
+import allegra.proactive_routing as proactive_routing
+
+class FakeConnection (object):
+  def __init__ (self, dpid):
+    self.dpid = dpid
+    self.sent = []
+
+  def send (self, data):
+    self.sent.append(data)
+
+class FakeNexus (object):
+  def addListeners (self, *args, **kw):
+    pass
+
+class FakeOpenFlow (FakeNexus):
+  def __init__ (self):
+    self.connections = {}
+
+  def getConnection (self, dpid):
+    return self.connections.get(dpid)
+
+class FakeCore (FakeNexus):
+  def __init__ (self, topo):
+    self.openflow = FakeOpenFlow()
+    self.Outband = FakeNexus()
+    self.Outband.t = topo
+
+class Event (object):
+  def __init__ (self, routes, removed_routes = []):
+    self.routes = routes
+    self.removed_routes = removed_routes
+
+def make_node (name, dpid, ports = {}):
+  return Node({'name': name, 'DPID': '%x' % dpid, 'hostname': name,
+               'external': True, 'ports': ports})
+
+class TopologyDeltaTest(unittest.TestCase):
+  """
+  H1 - S1 - S2 - H2, and S1 - S3 - S2 protects the link S1-S2
+  """
+  def setUp(self):
+    t = Topo()
+    def host (name, dpid):
+      return make_node(name, dpid, {'1': {'ip': '10.0.0.%i' % dpid,
+                                          'mac': '22:00:00:00:00:%02x' % dpid}})
+    self.nodes = dict((n.name, n) for n in [host('H1', 1), host('H2', 2),
+                                            make_node('S1', 11),
+                                            make_node('S2', 12),
+                                            make_node('S3', 13)])
+    for node in self.nodes.itervalues():
+      t.add_node(node)
+    for a, b, port_a, port_b in [('H1', 'S1', 1, 1), ('H2', 'S2', 1, 1),
+                                 ('S1', 'S2', 2, 2), ('S1', 'S3', 3, 1),
+                                 ('S3', 'S2', 2, 3)]:
+      t.add_link(self.nodes[a], self.nodes[b],
+                 {'port_a': port_a, 'port_b': port_b})
+    t.add_route(['S1', 'S3', 'S2'], ['protect', 'S1-S2'])
+    self.topo = t
+
+    self.saved_core = proactive_routing.core
+    proactive_routing.core = self.core = FakeCore(t)
+    for name in ['S1', 'S2', 'S3']:
+      dpid = self.nodes[name].dpid
+      self.core.openflow.connections[dpid] = FakeConnection(dpid)
+    self.metrics_dir = tempfile.mkdtemp()
+    self.routing = proactive_routing.ProactiveRouting(self.metrics_dir)
+
+  def tearDown(self):
+    self.routing.recorder.close()
+    proactive_routing.core = self.saved_core
+    shutil.rmtree(self.metrics_dir)
+
+  def _sent(self, name):
+    return self.core.openflow.getConnection(self.nodes[name].dpid).sent
+
+  def test_new_route_is_protected(self):
+    route = ['H1', 'S1', 'S2', 'H2']
+    self.topo.add_route(route)
+    self.routing._handle_OutbandTopologyDelta(Event([(route, [])]))
+    # the hops of the route
+    self.assertTrue(self._sent('S1'))
+    self.assertTrue(self._sent('S2'))
+    # the failover entry of S1 and the protection path over S3
+    self.assertEqual(len(self.routing._failover_entries['S1']), 1)
+    self.assertTrue(self._sent('S3'))
+
+  def test_unprotected_route(self):
+    route = ['H2', 'S2', 'S1', 'H1']
+    self.topo.add_route(route)
+    self.routing._handle_OutbandTopologyDelta(Event([(route, [])]))
+    self.assertTrue(self._sent('S1'))
+    self.assertFalse(self._sent('S3'))
+    self.assertFalse(hasattr(self.routing, '_failover_entries'))
+
+if __name__ == '__main__':
+  unittest.main()
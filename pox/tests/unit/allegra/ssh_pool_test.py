@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+import unittest
+import sys
+import os
+import os.path
+import shutil
+import tempfile
+import threading
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+sys.path.append(os.path.dirname(__file__) + "/../../../ext")
+
+import allegra.outband as outband
+
+# Logs its arguments, and prints the remote command
+FAKE_SSH = """#!/bin/sh
+echo "$@" >> "$FAKE_SSH_LOG"
+sleep 0.1
+for last; do :; done
+echo "$last"
+"""
+
+# Knows the hosts listed in $FAKE_KNOWN_HOSTS
+FAKE_SSH_KEYGEN = """#!/bin/sh
+grep -qx "$2" "$FAKE_KNOWN_HOSTS"
+"""
+
+class SshPoolTest(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    for name, script in [('ssh', FAKE_SSH), ('ssh-keygen', FAKE_SSH_KEYGEN)]:
+      filename = os.path.join(self.dir, name)
+      with open(filename, 'w') as f:
+        f.write(script)
+      os.chmod(filename, 0755)
+    self.log = os.path.join(self.dir, 'ssh.log')
+    known_hosts = os.path.join(self.dir, 'known_hosts')
+    with open(known_hosts, 'w') as f:
+      f.write('a.example.org\n')
+    self.environ = dict(os.environ)
+    os.environ['PATH'] = self.dir + os.pathsep + os.environ['PATH']
+    os.environ['FAKE_SSH_LOG'] = self.log
+    os.environ['FAKE_KNOWN_HOSTS'] = known_hosts
+
+    self.config = outband.config
+    self.ssh_pool = outband.ssh_pool
+    outband.config = {'IdentityFile': '~/.ssh/id_rsa',
+                      'slice_name': 'test_slice',
+                      'ssh_multiplex': True,
+                      'ssh_concurrency': 2}
+    self.pool = outband.ssh_pool = outband.SshPool()
+
+  def tearDown(self):
+    self.pool.close()
+    outband.config = self.config
+    outband.ssh_pool = self.ssh_pool
+    os.environ.clear()
+    os.environ.update(self.environ)
+    shutil.rmtree(self.dir)
+
+  def calls(self):
+    if not os.path.exists(self.log):
+      return []
+    with open(self.log) as f:
+      return [line.split() for line in f]
+
+  def test_control_args(self):
+    args = self.pool.control_args('a.example.org')
+    self.assertIn('ControlMaster=auto', args)
+    path = [a for a in args if a.startswith('ControlPath=')][0]
+    self.assertLess(len(path), 80)
+    self.assertNotEqual(args, self.pool.control_args('b.example.org'))
+    outband.config['ssh_multiplex'] = False
+    self.assertEqual(self.pool.control_args('a.example.org'), [])
+
+  def test_map(self):
+    hosts = ['h%d.example.org' % i for i in range(5)]
+    lock = threading.Lock()
+    running = [0, 0]              # now, max
+    def probe(hostname):
+      with lock:
+        running[0] += 1
+        running[1] = max(running)
+      try:
+        return outband.pl_ssh_cmd(hostname, hostname, no_stdin=True)
+      finally:
+        with lock:
+          running[0] -= 1
+
+    self.assertEqual(self.pool.map(probe, hosts), hosts)
+    self.assertLessEqual(running[1], 2)
+    self.assertEqual(sorted(self.pool.timing), hosts)
+    for hostname in hosts:
+      self.assertGreaterEqual(self.pool.timing[hostname], 0.1)
+    for args in self.calls():
+      self.assertIn('ControlMaster=auto', args)
+
+  def test_map_error(self):
+    def fail(item):
+      raise ValueError(item)
+    self.assertRaises(ValueError, self.pool.map, fail, ['a', 'b'])
+
+  def test_check_node_availability(self):
+    self.assertTrue(outband.check_node_availability('a.example.org'))
+    self.assertEqual(len(self.calls()), 1)
+    self.assertFalse(outband.check_node_availability('b.example.org'))
+    self.assertEqual(len(self.calls()), 2)
+
+if __name__ == '__main__':
+  unittest.main()
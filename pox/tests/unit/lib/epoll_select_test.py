@@ -7,12 +7,13 @@ import SocketServer
 import threading
 import socket
 import signal
+import select
 
 from copy import copy
 
 sys.path.append(os.path.dirname(__file__) + "/../../..")
 
-from pox.lib.epoll_select import EpollSelect
+from pox.lib.epoll_select import EpollSelect, EpollReactor
 
 class TCPEcho(SocketServer.StreamRequestHandler):
   def handle(self):
@@ -86,5 +87,93 @@ class EpollSelectTest(unittest.TestCase):
       check( ([],[],[]), self.es.select(sockets, [], sockets, 0))
       check( ([],sockets,[]), self.es.select(sockets, sockets, sockets, 0))
 
+@unittest.skipUnless(sys.platform.startswith("linux"), "requires Linux")
+class EpollReactorTest(unittest.TestCase):
+  def setUp(self):
+    self.reactor = EpollReactor()
+    self.pairs = [socket.socketpair() for i in range(3)]
+    for a, b in self.pairs:
+      b.setblocking(0)
+      self.reactor.register(b)
+
+  def tearDown(self):
+    self.reactor.close()
+    for a, b in self.pairs:
+      a.close()
+      b.close()
+
+  def test_registered_are_ready(self):
+    self.assertEqual(len(self.reactor.poll(0)[0]), 3)
+
+  def test_ready_until_idle(self):
+    (a0, b0), (a1, b1), (a2, b2) = self.pairs
+    for a, b in self.pairs:
+      self.reactor.idle(b)
+    self.assertEqual(self.reactor.poll(0)[0], [])
+    a2.send("x" * 10)
+    a0.send("y")
+    self.assertEqual(self.reactor.poll(0)[0], [b2, b0])
+    # edge triggered: no new event, but still ready
+    self.assertEqual(self.reactor.poll(0)[0], [b2, b0])
+    b2.recv(5)
+    self.reactor.idle(b2)
+    # the rest of the data does not make b2 ready again...
+    self.assertEqual(self.reactor.poll(0)[0], [b0])
+    # ...but new data does
+    a2.send("z")
+    self.assertEqual(self.reactor.poll(0)[0], [b0, b2])
+
+  def test_wait_on_reactor(self):
+    for a, b in self.pairs:
+      self.reactor.idle(b)
+    self.assertEqual(select.select([self.reactor], [], [], 0)[0], [])
+    self.pairs[1][0].send("x")
+    self.assertEqual(select.select([self.reactor], [], [], 1)[0],
+                     [self.reactor])
+    self.assertEqual(self.reactor.poll(0)[0], [self.pairs[1][1]])
+
+  def test_hangup(self):
+    a, b = self.pairs[0]
+    self.reactor.idle(b)
+    for x, y in self.pairs[1:]:
+      self.reactor.idle(y)
+    a.close()
+    self.assertEqual(self.reactor.poll(0)[0], [b])
+    self.assertEqual(b.recv(10), "")
+
+  def test_want_write(self):
+    a, b = self.pairs[0]
+    for x, y in self.pairs:
+      self.reactor.idle(y)
+    self.assertEqual(self.reactor.poll(0), ([], []))
+    self.reactor.want_write(b)
+    self.assertEqual(self.reactor.poll(0), ([], [b]))
+    self.reactor.want_write(b, False)
+    self.assertEqual(self.reactor.poll(0), ([], []))
+
+  def test_unregister(self):
+    a, b = self.pairs[0]
+    self.reactor.unregister(b)
+    self.reactor.unregister(b)
+    a.send("x")
+    self.assertTrue(b not in self.reactor.poll(0)[0])
+
+  def test_reused_fd(self):
+    a, b = self.pairs[0]
+    fd = b.fileno()
+    b.close()
+    # the new socket gets the lowest free fd, the one of b
+    x, y = socket.socketpair()
+    try:
+      self.assertEqual(x.fileno(), fd)
+      self.reactor.register(x)
+      self.reactor.unregister(b)
+      self.reactor.idle(x)
+      y.send("x")
+      self.assertTrue(x in self.reactor.poll(0)[0])
+    finally:
+      x.close()
+      y.close()
+
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+import unittest
+import sys
+import os.path
+import threading
+import time
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.lib.recoco.recoco import *
+
+class DummyTask (BaseTask):
+  def __init__ (self, name, priority = 1):
+    BaseTask.__init__(self)
+    self.name = name
+    self.priority = priority
+
+class ReadyQueueTest(unittest.TestCase):
+  def test_priority_and_order(self):
+    q = ReadyQueue()
+    tasks = [DummyTask("a"), DummyTask("b", 2), DummyTask("c"),
+             DummyTask("d", 0.5), DummyTask("e", 2)]
+    for t in tasks:
+      q.push(t)
+    self.assertTrue(all(t._scheduled for t in tasks))
+    self.assertEqual(len(q), 5)
+    order = []
+    while len(q):
+      order.append(q.pop())
+    self.assertEqual([t.name for t in order], ["b", "e", "a", "c", "d"])
+    self.assertFalse(any(t._scheduled for t in tasks))
+    self.assertEqual(q.pop(), None)
+
+  def test_first(self):
+    q = ReadyQueue()
+    a, b = DummyTask("a"), DummyTask("b")
+    q.push(a)
+    q.push(b, first = True)
+    self.assertEqual(q.pop(), b)
+
+class TimerTest(unittest.TestCase):
+  def setUp(self):
+    self.scheduler = Scheduler(isDefaultScheduler = False, daemon = True)
+
+  def tearDown(self):
+    self.scheduler.quit()
+
+  def test_timers_in_order(self):
+    fired = []
+    done = threading.Event()
+    def fire (i):
+      fired.append(i)
+      if len(fired) == 100:
+        done.set()
+    now = time.time()
+    # Started in reverse, they must fire by their time
+    for i in reversed(range(100)):
+      Timer(now + 0.1 + i * 0.002, fire, absoluteTime = True, args = (i,),
+            started = False).start(self.scheduler, fast = True)
+    self.assertTrue(done.wait(5))
+    self.assertEqual(fired, range(100))
+
+  def test_sleep_and_select(self):
+    """ a task waiting for IO with a timeout wakes up once """
+    pinger = pox.lib.util.makePinger()
+    results = []
+    done = threading.Event()
+    class Waiter (Task):
+      def run (self):
+        results.append((yield Select([pinger], [], [], 0.05)))
+        pinger.pongAll()
+        results.append((yield Select([pinger], [], [], 0.05)))
+        yield Sleep(0.1)
+        done.set()
+    Waiter().start(self.scheduler, fast = True)
+    pinger.ping()
+    self.assertTrue(done.wait(5))
+    self.assertEqual(results, [([pinger], [], []), ([], [], [])])
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+
+import unittest
+import sys
+import os.path
+import socket
+import threading
+import time
+from errno import EAGAIN
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.openflow.libopenflow_01 import *
+from pox.lib.mock_socket import MockSocket
+import pox.openflow.of_01 as of_01
+
+class ChunkedSocket (MockSocket):
+  """ MockSocket that returns at most 'chunk' bytes per read """
+  def __init__ (self, receiving, sending, chunk=None):
+    MockSocket.__init__(self, receiving, sending)
+    self.chunk = chunk
+
+  def recv_into (self, buf, nbytes=0):
+    nbytes = nbytes or len(buf)
+    if self.chunk:
+      nbytes = min(nbytes, self.chunk)
+    return MockSocket.recv_into(self, buf, nbytes)
+
+class NonBlockingSocket (ChunkedSocket):
+  """ ChunkedSocket that raises EAGAIN instead of blocking """
+  def recv_into (self, buf, nbytes=0):
+    if self.receiving.is_empty():
+      raise socket.error(EAGAIN, "Resource temporarily unavailable")
+    return ChunkedSocket.recv_into(self, buf, nbytes)
+
+class LimitedSocket (MockSocket):
+  """ MockSocket that takes at most 'room' bytes until given more """
+  def __init__ (self, receiving, sending, room=0):
+    MockSocket.__init__(self, receiving, sending)
+    self.room = room
+
+  def send (self, data):
+    if self.room == 0:
+      raise socket.error(EAGAIN, "Resource temporarily unavailable")
+    data = data[:self.room]
+    self.room -= len(data)
+    return MockSocket.send(self, data)
+
+class CountingSocket (MockSocket):
+  """ MockSocket that counts the calls of send() """
+  def __init__ (self, receiving, sending):
+    MockSocket.__init__(self, receiving, sending)
+    self.sends = 0
+
+  def send (self, data):
+    self.sends += 1
+    return MockSocket.send(self, data)
+
+class ConnectionReadTest(unittest.TestCase):
+  def setUp(self):
+    self.received = []
+    self.saved_handlers = list(of_01.handlers)
+    of_01.handlers[:] = [self._handle] * len(self.saved_handlers)
+
+  def tearDown(self):
+    of_01.handlers[:] = self.saved_handlers
+
+  def _handle(self, con, msg):
+    self.received.append(msg)
+
+  def _read_all(self, msgs, chunk=None):
+    (switch, controller) = MockSocket.pair()
+    sock = ChunkedSocket(controller.receiving, controller.sending, chunk)
+    con = of_01.Connection(sock)
+    for m in msgs:
+      switch.send(m.pack())
+    while not sock.receiving.is_empty():
+      self.assertTrue(con.read())
+    return con
+
+  def _messages(self):
+    stats = [ofp_flow_stats(match=ofp_match(in_port=i, dl_type=0x800,
+                                            nw_dst="10.0.0.%i" % i),
+                            actions=[ofp_action_output(port=2)],
+                            byte_count=i)
+             for i in range(1, 201)]
+    return [ofp_hello(),
+            ofp_packet_in(in_port=1, buffer_id=7, data="x" * 300),
+            ofp_stats_reply(type=OFPST_FLOW, body=stats),
+            ofp_echo_request(body="ping"),
+            ofp_error(type=1, code=2, data="abc")]
+
+  def test_read_whole(self):
+    msgs = self._messages()
+    self._read_all(msgs)
+    self.assertEquals(self.received, msgs)
+
+  def test_read_fragments(self):
+    """ messages split across reads are unpacked once complete """
+    msgs = self._messages()
+    for chunk in (1, 7, 1000):
+      self.received = []
+      con = self._read_all(msgs, chunk)
+      self.assertEquals(self.received, msgs)
+      self.assertEquals(con._buf_start, con._buf_end)
+
+  def test_unpacked_data_is_bytes(self):
+    """ unpacked fields do not refer to the receive buffer """
+    self._read_all([ofp_packet_in(in_port=1, data="abcd")])
+    data = self.received[0].data
+    self.assertEquals(type(data), bytes)
+    self.assertEquals(data, "abcd")
+
+  def test_bad_version(self):
+    (switch, controller) = MockSocket.pair()
+    con = of_01.Connection(controller)
+    raw = bytearray(ofp_echo_request().pack())
+    raw[0] = 0x04
+    switch.send(bytes(raw))
+    self.assertFalse(con.read())
+
+  def test_read_nonblocking(self):
+    (switch, controller) = MockSocket.pair()
+    sock = NonBlockingSocket(controller.receiving, controller.sending)
+    con = of_01.Connection(sock)
+    self.assertEquals(con.read(), None)
+    switch.send(ofp_echo_request(body="ping").pack())
+    self.assertTrue(con.read())
+    self.assertTrue(con.drained)
+    self.assertEquals([m.body for m in self.received], ["ping"])
+    self.assertEquals(con.read(), None)
+
+class ConnectionSendTest(unittest.TestCase):
+  class IOTask (object):
+    def __init__ (self):
+      self.wanted = []
+    def want_write (self, con):
+      self.wanted.append(con)
+
+  def setUp(self):
+    (self.switch, controller) = MockSocket.pair()
+    # Room for the hello only
+    self.sock = LimitedSocket(controller.receiving, controller.sending, 8)
+    self.con = of_01.Connection(self.sock)
+    self.con.io_task = self.IOTask()
+    self.events = []
+    self.con.addListener(of_01.SendQueueFull, self.events.append)
+    self.con.addListener(of_01.SendQueueDrained, self.events.append)
+    self.saved = (of_01.SEND_HIGH_WATER, of_01.SEND_LOW_WATER)
+    of_01.SEND_HIGH_WATER, of_01.SEND_LOW_WATER = 100, 50
+
+  def tearDown(self):
+    of_01.SEND_HIGH_WATER, of_01.SEND_LOW_WATER = self.saved
+
+  def _received(self):
+    data = ""
+    while not self.switch.receiving.is_empty():
+      data += self.switch.recv()
+    return data
+
+  def test_queue_and_flush(self):
+    hello = self._received()
+    self.assertEquals(len(hello), 8)
+    self.assertEquals(self.con.send_queue_bytes, 0)
+    msgs = [ofp_echo_request(body=str(i) * 10).pack() for i in range(10)]
+    for m in msgs:
+      self.con.send(m)
+    self.assertEquals(self.con.io_task.wanted, [self.con])
+    self.assertTrue(self.con.send_queue_full)
+    self.assertEquals([type(e) for e in self.events], [of_01.SendQueueFull])
+    self.assertEquals(self.con.send_queue_bytes, 18 * 10)
+
+    self.sock.room = 140
+    self.assertFalse(self.con.flush())
+    self.assertEquals(self.con.send_queue_bytes, 18 * 10 - 140)
+    self.assertEquals([type(e) for e in self.events],
+                      [of_01.SendQueueFull, of_01.SendQueueDrained])
+
+    self.sock.room = 1000
+    self.assertTrue(self.con.flush())
+    self.assertEquals(self.con.send_queue_bytes, 0)
+    self.assertEquals(self.con.send_queue_peak, 18 * 10)
+    self.assertEquals(self._received(), "".join(msgs))
+
+    # With the queue empty, send() goes straight to the socket
+    self.con.send(hello)
+    self.assertEquals(self._received(), hello)
+
+  def test_disconnect_keeps_order(self):
+    """ corked data goes after the send queue when disconnecting """
+    self._received()
+    queued = ofp_echo_request(body="queued").pack()
+    corked = ofp_echo_request(body="corked").pack()
+    self.con.send(queued)
+    self.con.cork()
+    self.con.send(corked)
+    self.sock.room = 1000
+    self.con.disconnect()
+    self.assertEquals(self._received(), queued + corked)
+    self.assertEquals(self.con.send_queue_bytes, 0)
+
+class ConnectionCorkTest(unittest.TestCase):
+  def setUp(self):
+    (self.switch, controller) = MockSocket.pair()
+    self.sock = CountingSocket(controller.receiving, controller.sending)
+    self.con = of_01.Connection(self.sock)
+    self.switch.recv()
+    self.sock.sends = 0
+    self.msgs = [ofp_echo_request(body=str(i)) for i in range(3)]
+    self.raw = "".join(m.pack() for m in self.msgs)
+
+  def test_cork(self):
+    self.con.cork()
+    self.con.cork()
+    for m in self.msgs:
+      self.con.send(m)
+    self.con.uncork()
+    self.assertEquals(self.sock.sends, 0)
+    self.con.uncork()
+    self.assertEquals(self.sock.sends, 1)
+    self.assertEquals(self.switch.recv(), self.raw)
+
+  def test_cork_size(self):
+    self.con.cork()
+    data = "x" * (of_01.CORK_SIZE // 2)
+    self.con.send(data)
+    self.assertEquals(self.sock.sends, 0)
+    self.con.send(data)
+    self.assertEquals(self.sock.sends, 1)
+    self.con.uncork()
+    self.assertEquals(self.sock.sends, 1)
+
+  def test_send_after_cycle(self):
+    """ messages sent by a Task go out together when it yields """
+    sends = []
+    done = threading.Event()
+    def send_all ():
+      for m in self.msgs:
+        self.con.send(m)
+      sends.append(self.sock.sends)
+      done.set()
+    of_01.core.callLater(send_all)
+    self.assertTrue(done.wait(5))
+    self.assertEquals(sends, [0])
+    for i in range(500):
+      if self.sock.sends: break
+      time.sleep(0.01)
+    self.assertEquals(self.sock.sends, 1)
+    self.assertEquals(self.switch.recv(), self.raw)
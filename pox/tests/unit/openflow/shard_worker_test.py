@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+import unittest
+import sys
+import os.path
+import cPickle
+import socket
+import struct
+
+sys.path.append(os.path.dirname(__file__) + "/../../..")
+
+from pox.openflow.libopenflow_01 import *
+from pox.openflow.shard_worker import *
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "requires Linux")
+class WorkerTest(unittest.TestCase):
+  def setUp(self):
+    self.controller, channel = socket.socketpair()
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    listener.setblocking(0)
+    self.worker = Worker(channel, listener)
+    self.switch = socket.create_connection(listener.getsockname())
+    self.worker._accept()
+    self.s = self.worker.by_id[1]
+
+  def tearDown(self):
+    self.switch.close()
+    self.controller.close()
+    self.worker.listener.close()
+
+  def _frames(self):
+    data = "".join(self.worker.frames)
+    del self.worker.frames[:]
+    frames = []
+    offset = 0
+    while offset < len(data):
+      id, kind, length = frame_header.unpack_from(data, offset)
+      offset += frame_header.size
+      frames.append((id, kind, data[offset:offset + length]))
+      offset += length
+    return frames
+
+  def _received(self, n = 1):
+    """ types of the next n messages to the switch """
+    data = ""
+    msgs = []
+    while len(msgs) < n:
+      data += self.switch.recv(65536)
+      while len(data) >= 8:
+        length = struct.unpack_from("!H", data, 2)[0]
+        if len(data) < length: break
+        msgs.append(ord(data[1]))
+        data = data[length:]
+    return msgs
+
+  def test_connect(self):
+    self.assertEquals(self._frames()[0][:2], (1, CONNECT))
+    self.assertEquals(self._received(), [OFPT_HELLO])
+
+  def test_handshake_and_echo(self):
+    self._frames()
+    self._received()
+    self.switch.send(ofp_hello().pack() + ofp_echo_request().pack())
+    self.worker._read(self.s)
+    self.assertEquals(self._frames(), [])
+    self.assertEquals(self._received(2),
+                      [OFPT_FEATURES_REQUEST, OFPT_ECHO_REPLY])
+
+  def test_forward(self):
+    self._frames()
+    msgs = [ofp_packet_in(in_port=1, data="abc"), ofp_barrier_reply(xid=3)]
+    raw = "".join(m.pack() for m in msgs)
+    # A message split across reads is forwarded once complete
+    self.switch.send(raw[:-3])
+    self.worker._read(self.s)
+    self.switch.send(raw[-3:])
+    self.worker._read(self.s)
+    frames = self._frames()
+    self.assertEquals([f[:2] for f in frames], [(1, DATA), (1, DATA)])
+    self.assertEquals(cPickle.loads(frames[0][2]) +
+                      cPickle.loads(frames[1][2]), msgs)
+
+  def test_hello_dropped(self):
+    self._frames()
+    self._received()
+    data = ofp_hello().pack() + ofp_barrier_request().pack()
+    self.controller.send(frame_header.pack(1, DATA, len(data)) + data)
+    self.worker._read_channel()
+    self.assertEquals(self._received(), [OFPT_BARRIER_REQUEST])
+
+  def test_close(self):
+    self._frames()
+    self.switch.close()
+    self.worker._read(self.s)
+    self.assertEquals(self._frames(), [(1, CLOSE, "")])
+    self.assertEquals(self.worker.by_id, {})
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# Copyright (c) 2013 Felician Nemeth
+#
+# This file is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This file is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with POX.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of gen_routes_spf on ring and full-mesh topologies.
+
+Every host is connected to two switches.  Usage:
+
+  bench_gen_routes.py [max_switches [hosts]]
+"""
+
+import os
+import sys
+import time
+
+pox_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pox')
+sys.path.insert(0, pox_dir)
+sys.path.insert(0, os.path.join(pox_dir, 'ext'))
+
+from allegra.outband import Topo, Node
+from allegra.gen_routes_spf import GenRoutesSpf
+
+def make_topo (num_switches, num_hosts, full_mesh):
+  t = Topo()
+  # hosts get the small dpids, because their addresses contain the dpid
+  switch_names = ['sw%d' % i for i in range(num_switches)]
+  t._ple_nodes = switch_names
+  t._working_ple_nodes = switch_names
+  switches = []
+  for i, hostname in enumerate(switch_names):
+    n = Node({'name': 'S%d' % i,
+              'DPID': '{0:016x}'.format(num_hosts + 1 + i),
+              'hostname': hostname})
+    t.add_node(n)
+    switches.append(n)
+  if full_mesh:
+    for i, node_a in enumerate(switches):
+      for node_b in switches[:i]:
+        t.add_link(node_a, node_b)
+  else:
+    for i, node_a in enumerate(switches):
+      t.add_link(node_a, switches[(i + 1) % num_switches])
+  for dpid in range(1, num_hosts + 1):
+    h = Node({'name': 'H%d' % dpid,
+              'DPID': '{0:016x}'.format(dpid),
+              'hostname': 'host%d' % dpid,
+              'external': True})
+    t.add_node(h)
+    for port_num in [1, 2]:
+      h.generate_host_port(port_num)
+      sw = switches[(dpid * 7 + port_num * 3) % num_switches]
+      t.add_link(sw, h, {'port_b': port_num})
+  return t
+
+def run (num_switches, num_hosts, full_mesh):
+  t = make_topo(num_switches, num_hosts, full_mesh)
+  start = time.time()
+  GenRoutesSpf().generate_routes(t)
+  elapsed = time.time() - start
+  print '%-9s switches:%4d hosts:%3d routes:%5d  %8.3fs' % (
+    'full-mesh' if full_mesh else 'ring', num_switches, num_hosts,
+    len(t.routes), elapsed)
+
+def main ():
+  max_switches = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+  num_hosts = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+  sizes = [s for s in [10, 20, 50, 100, 200, 500] if s <= max_switches]
+  for full_mesh in [False, True]:
+    for size in sizes:
+      run(size, num_hosts, full_mesh)
+
+if __name__ == '__main__':
+  import logging
+  logging.basicConfig(level=logging.ERROR)
+  main()
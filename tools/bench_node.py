@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# Copyright (c) 2013 Felician Nemeth
+#
+# This file is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This file is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with POX.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Micro-benchmark of the attribute lookups of outband.Node and Port.
+
+Prints the cost of a single lookup on a switch with 'ports' neighbors.
+Usage:
+
+  bench_node.py [ports [iterations]]
+"""
+
+import os
+import sys
+import timeit
+
+pox_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pox')
+sys.path.insert(0, pox_dir)
+sys.path.insert(0, os.path.join(pox_dir, 'ext'))
+
+from allegra.outband import Node
+
+LOOKUPS = [
+  ('node.dpid',                'node.dpid'),
+  ('node.name',                'node.name'),
+  ('node.external',            'node.external'),
+  ('node.ports',               'node.ports'),
+  ('node.neighbors',           'node.neighbors'),
+  ('node.port(dpid)',          'node.port(last)'),
+  ('node.port_num(dpid)',      'node.port_num(last)'),
+  ('node.ports_toward(all)',   'node.ports_toward(all_dpids)'),
+  ('port.ip',                  'port.ip'),
+  ('port.mac',                 'port.mac'),
+]
+
+def make_node (num_ports):
+  node = Node({'name': 'S1', 'DPID': '{0:016x}'.format(1000),
+               'hostname': 'sw1'})
+  for i in range(1, num_ports + 1):
+    node.add_neighbor(i, i)
+  host = Node({'name': 'H1', 'DPID': '{0:016x}'.format(1),
+               'hostname': 'host1', 'external': True})
+  port = host.generate_host_port(1)
+  return node, port
+
+def main ():
+  global node, port, last, all_dpids
+  num_ports = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+  number = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+  node, port = make_node(num_ports)
+  last = num_ports
+  all_dpids = range(1, num_ports + 1)
+  print 'ports: %d, iterations: %d' % (num_ports, number)
+  for label, stmt in LOOKUPS:
+    timer = timeit.Timer(stmt, 'from __main__ import node, port, last, all_dpids')
+    best = min(timer.repeat(3, number))
+    print '%-22s %10.3f us' % (label, best / number * 1e6)
+
+if __name__ == '__main__':
+  import logging
+  logging.basicConfig(level=logging.ERROR)
+  main()
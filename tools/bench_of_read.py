@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# Copyright (c) 2013 Felician Nemeth
+#
+# This file is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This file is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with POX.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of the receive path of pox.openflow.of_01.Connection.
+
+Replays a stream of PacketIns and multipart flow-stats replies
+through a mock socket, and prints how long Connection.read() takes to
+unpack it.  The socket returns at most 'chunk' bytes per call, like a
+kernel socket with that much data queued.  The 'framing' lines show
+the cost of the buffer handling alone, with the messages skipped
+instead of unpacked.  Usage:
+
+  bench_of_read.py [packet_ins [flow_entries [chunk]]]
+"""
+
+import os
+import struct
+import sys
+import time
+
+pox_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pox')
+sys.path.insert(0, pox_dir)
+
+import pox.openflow.libopenflow_01 as of
+import pox.openflow.of_01 as of_01
+
+ENTRIES_PER_REPLY = 600         # fits into the 64 KB of a message
+
+class StreamSocket (object):
+  "Mock socket that returns a prerecorded stream"
+  def __init__ (self, data, chunk):
+    self.data = data
+    self.pos = 0
+    self.chunk = chunk
+
+  def send (self, data):
+    return len(data)
+
+  def recv (self, size):
+    size = min(size, self.chunk)
+    d = self.data[self.pos:self.pos + size]
+    self.pos += len(d)
+    return d
+
+  def recv_into (self, buf, size = 0):
+    size = min(size or len(buf), self.chunk)
+    d = self.data[self.pos:self.pos + size]
+    buf[:len(d)] = d
+    self.pos += len(d)
+    return len(d)
+
+def make_stream (packet_ins, flow_entries):
+  parts = []
+  frame = '\x02' * 12 + '\x08\x00' + 'x' * 114
+  for i in range(packet_ins):
+    parts.append(of.ofp_packet_in(xid=i, in_port=i % 48 + 1, buffer_id=i,
+                                  data=frame).pack())
+  entries = [of.ofp_flow_stats(match=of.ofp_match(in_port=i % 48 + 1,
+                                                  dl_type=0x800,
+                                                  nw_dst='10.0.%i.%i' %
+                                                  (i / 250, i % 250)),
+                               actions=[of.ofp_action_output(port=2)],
+                               byte_count=i, packet_count=i)
+             for i in range(flow_entries)]
+  for i in range(0, flow_entries, ENTRIES_PER_REPLY):
+    body = entries[i:i + ENTRIES_PER_REPLY]
+    more = i + ENTRIES_PER_REPLY < flow_entries
+    parts.append(of.ofp_stats_reply(xid=1, type=of.OFPST_FLOW, body=body,
+                                    flags=1 if more else 0).pack())
+  return ''.join(parts)
+
+def skip (raw, offset):
+  length = struct.unpack_from('!H', raw, offset + 2)[0]
+  return offset + length, None
+
+def replay (data, chunk, unpack = True):
+  "Return (seconds, messages, reads) of reading data"
+  counts = [0]
+  def count (con, msg):
+    counts[0] += 1
+  saved = list(of_01.handlers)
+  saved_unpackers = list(of_01.unpackers)
+  of_01.handlers[:] = [count] * len(saved)
+  if not unpack:
+    of_01.unpackers[:] = [skip] * len(saved_unpackers)
+  try:
+    con = of_01.Connection(StreamSocket(data, chunk))
+    reads = 0
+    start = time.time()
+    while con.sock.pos < len(data):
+      con.read()
+      reads += 1
+    elapsed = time.time() - start
+  finally:
+    of_01.handlers[:] = saved
+    of_01.unpackers[:] = saved_unpackers
+  return elapsed, counts[0], reads
+
+def main ():
+  packet_ins = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+  flow_entries = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+  chunk = int(sys.argv[3]) if len(sys.argv) > 3 else 65536
+  streams = [('packet_in', make_stream(packet_ins, 0)),
+             ('flow stats', make_stream(0, flow_entries))]
+  for unpack in (True, False):
+    for label, stream in streams:
+      if not unpack:
+        label += ' framing'
+      best = min(replay(stream, chunk, unpack) for i in range(3))
+      elapsed, messages, reads = best
+      print '%-18s %6i msgs %6.2f MB %6i reads %7.3f s %8.1f MB/s' % (
+        label, messages, len(stream) / 1e6, reads, elapsed,
+        len(stream) / 1e6 / elapsed)
+
+if __name__ == '__main__':
+  import logging
+  logging.basicConfig(level=logging.ERROR)
+  main()
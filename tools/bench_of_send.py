@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# Copyright (c) 2013 Felician Nemeth
+#
+# This file is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This file is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with POX.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of the send path of pox.openflow.of_01.Connection.
+
+A recoco Task pushes flow-mods to a Connection, the way a module does
+after reset_flowtables().  The Task yields after every 'step'
+flow-mods, as if it handled one event per step.  The socket of the
+Connection writes to /dev/null, so every send() is a real syscall, but
+one that never blocks (over TCP, a full socket buffer would make the
+Connection queue and coalesce the data anyway).  Prints the number of
+send() syscalls and the time the Task took, with
+
+  one by one   every message sent right away (AUTO_CORK off)
+  auto cork    the messages of a step of the Task sent when it yields
+  cork()       the messages sent between cork() and uncork()
+
+Usage:
+
+  bench_of_send.py [flow_mods [step]]
+"""
+
+import os
+import sys
+import threading
+import time
+
+pox_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pox')
+sys.path.insert(0, pox_dir)
+
+import pox.openflow.libopenflow_01 as of
+import pox.openflow.of_01 as of_01
+from pox.lib.recoco import Task
+
+class NullSocket (object):
+  "Socket that writes to /dev/null and counts the calls of send()"
+  def __init__ (self):
+    self.fd = os.open(os.devnull, os.O_WRONLY)
+    self.sends = 0
+
+  def send (self, data):
+    self.sends += 1
+    return os.write(self.fd, data)
+
+  def fileno (self):
+    return self.fd
+
+  def shutdown (self, how):
+    pass
+
+  def close (self):
+    os.close(self.fd)
+
+class Sender (Task):
+  def __init__ (self, con, msgs, step, cork):
+    self.con = con
+    self.msgs = msgs
+    self.step = step
+    self.cork = cork
+    self.done = threading.Event()
+    Task.__init__(self)
+
+  def run (self):
+    con = self.con
+    for i in range(0, len(self.msgs), self.step):
+      if self.cork:
+        con.cork()
+      for msg in self.msgs[i:i + self.step]:
+        con.send(msg)
+      if self.cork:
+        con.uncork()
+      yield 0
+    self.done.set()
+
+def make_flow_mods (n):
+  return [of.ofp_flow_mod(match=of.ofp_match(dl_type=0x800,
+                                             nw_dst='10.%i.%i.%i' %
+                                             (i / 65536, i / 256 % 256,
+                                              i % 256)),
+                          actions=[of.ofp_action_output(port=i % 48 + 1)])
+          for i in range(n)]
+
+def run (msgs, step, auto_cork, cork):
+  "Return (seconds, sends) of pushing msgs"
+  saved = of_01.AUTO_CORK
+  of_01.AUTO_CORK = auto_cork
+  sock = NullSocket()
+  try:
+    con = of_01.Connection(sock)
+    sock.sends = 0
+    start = time.time()
+    sender = Sender(con, msgs, step, cork)
+    sender.start()
+    sender.done.wait(60)
+    elapsed = time.time() - start
+  finally:
+    of_01.AUTO_CORK = saved
+    sock.close()
+  return elapsed, sock.sends
+
+def main ():
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+  step = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+  msgs = make_flow_mods(n)
+  # Pack the messages once, like the modules that send raw bytes
+  msgs = [m.pack() for m in msgs]
+  for label, auto_cork, cork in (('one by one', False, False),
+                                 ('auto cork', True, False),
+                                 ('cork()', False, True)):
+    elapsed, sends = min(run(msgs, step, auto_cork, cork) for i in range(3))
+    print '%-12s %6i flow-mods %6i send() %7.1f per 10k %7.3f s' % (
+      label, n, sends, sends * 10000.0 / n, elapsed)
+
+if __name__ == '__main__':
+  import logging
+  logging.basicConfig(level=logging.ERROR)
+  main()
+  from pox.core import core
+  core.quit()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# Copyright (c) 2013 Felician Nemeth
+#
+# This file is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This file is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with POX.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark of the timers of the recoco scheduler.
+
+Runs 'timers' one-shot Timers, each of which arms a new one 'period'
+seconds later when it fires, the way core.callDelayed() is used to poll
+the statistics of every switch.  The first expiries are spread evenly
+over a period.  Prints how many timers fired, the CPU time per firing,
+and how late the callbacks were called.  Usage:
+
+  bench_recoco_timers.py [timers [period [seconds]]]
+"""
+
+import os
+import sys
+import time
+
+pox_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pox')
+sys.path.insert(0, pox_dir)
+
+from pox.lib.recoco import Scheduler, Timer
+
+def percentile (values, p):
+  if not values:
+    return 0
+  values = sorted(values)
+  return values[min(len(values) - 1, int(len(values) * p))]
+
+def main ():
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+  period = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+  duration = float(sys.argv[3]) if len(sys.argv) > 3 else 5.0
+
+  scheduler = Scheduler(daemon = True)
+  late = []
+  stopping = [False]
+
+  def fire (due):
+    now = time.time()
+    late.append(now - due)
+    if not stopping[0]:
+      Timer(due + period, fire, absoluteTime = True, args = (due + period,),
+            scheduler = scheduler)
+
+  start = time.time() + 0.5
+  for i in range(n):
+    due = start + period * i / n
+    Timer(due, fire, absoluteTime = True, args = (due,),
+          scheduler = scheduler)
+  cpu = time.clock()
+  time.sleep(start - time.time() + duration)
+  stopping[0] = True
+  cpu = time.clock() - cpu
+  fired = len(late)
+  scheduler.quit()
+
+  print '%i timers, period %.2f s: %i fired in %.1f s (%i expected)' % (
+    n, period, fired, duration, int(n * duration / period))
+  print 'cpu %.1f us per firing' % (cpu / max(fired, 1) * 1e6,)
+  print 'late: median %.1f ms, 99%% %.1f ms, max %.1f ms' % (
+    percentile(late, 0.5) * 1e3, percentile(late, 0.99) * 1e3,
+    max(late or [0]) * 1e3)
+
+if __name__ == '__main__':
+  main()
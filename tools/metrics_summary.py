@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# Copyright (c) 2013 Felician Nemeth
+#
+# This file is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This file is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with POX.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Summary of the measurements written by allegra.recorder.
+
+Prints the statistics of the values of each kind of record in each
+file.  A directory stands for its run files.  Usage:
+
+  metrics_summary.py [-k kind] [-r] [file_or_dir ...]
+
+Without arguments, /tmp/pox_metrics/last.csv is summarized.  With -r,
+the records themselves are printed, too.
+"""
+
+import glob
+import optparse
+import os
+import sys
+
+pox_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pox')
+sys.path.insert(0, pox_dir)
+sys.path.insert(0, os.path.join(pox_dir, 'ext'))
+
+from allegra.recorder import read_records
+
+DEFAULT_FILE = '/tmp/pox_metrics/last.csv'
+
+def percentile (values, p):
+  "p-th percentile of sorted values"
+  if not values:
+    return None
+  k = (len(values) - 1) * p / 100.0
+  lo = int(k)
+  hi = min(lo + 1, len(values) - 1)
+  return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+def summarize (filename, kinds = None, show_records = False):
+  values = {}
+  counts = {}
+  start = None
+  for r in read_records(filename):
+    if kinds and r['kind'] not in kinds:
+      continue
+    if start is None:
+      start = r['time']
+    if show_records:
+      print '  %10.6f %-16s %s %s %s' % (r['time'] - start, r['kind'],
+                                        r['dpid'], r['port'],
+                                        '' if r['value'] is None
+                                        else r['value'])
+    counts[r['kind']] = counts.get(r['kind'], 0) + 1
+    if r['value'] is not None:
+      values.setdefault(r['kind'], []).append(r['value'])
+  print '%s:' % filename
+  print '  %-16s %6s %10s %10s %10s %10s %10s' % ('kind', 'count', 'min',
+                                                'median', 'mean', 'p95',
+                                                'max')
+  for kind in sorted(counts):
+    v = sorted(values.get(kind, []))
+    if not v:
+      print '  %-16s %6i' % (kind, counts[kind])
+      continue
+    print '  %-16s %6i %10.6f %10.6f %10.6f %10.6f %10.6f' % (
+      kind, counts[kind], v[0], percentile(v, 50), sum(v) / len(v),
+      percentile(v, 95), v[-1])
+
+def main ():
+  parser = optparse.OptionParser(usage='%prog [-k kind] [-r] [file_or_dir ...]')
+  parser.add_option('-k', '--kind', action='append', dest='kinds',
+                    help='only records of this kind (repeatable)')
+  parser.add_option('-r', '--records', action='store_true',
+                    help='print the records, too')
+  opts, args = parser.parse_args()
+  files = []
+  for arg in args or [DEFAULT_FILE]:
+    if os.path.isdir(arg):
+      files += sorted(glob.glob(os.path.join(arg, 'run-*.csv')))
+    else:
+      files.append(arg)
+  for filename in files:
+    summarize(filename, opts.kinds, opts.records)
+
+if __name__ == '__main__':
+  main()